@@ -0,0 +1,183 @@
+"""Run the analyses of the app over a file, without Streamlit:
+
+    python AnalysisCLI.py missing Breast_Cancer_cleaned.csv
+    python AnalysisCLI.py outliers Breast_Cancer_cleaned.csv --columns Tumor_Size Age
+    python AnalysisCLI.py importance Breast_Cancer_cleaned.csv --target Status
+    python AnalysisCLI.py compare Breast_Cancer_cleaned.csv --target Status --features Age Tumor_Size
+    python AnalysisCLI.py search Breast_Cancer_cleaned.csv --target Status --features Age Tumor_Size --time-budget 300
+
+Results are printed as JSON. ``--pipeline`` replays an exported cleaning
+pipeline on the file before the analysis runs.
+"""
+import argparse
+import json
+import sys
+import time
+
+from AnalysisEngine import (
+    AnalysisConfig, OutlierBounds, missing_summary, outlier_bounds_table, apply_outlier_table, compute_correlation,
+    strongest_correlations, compute_feature_importance, run_statistical_test
+)
+from CorrelationEngine import CORRELATION_METHODS
+from DataLoader import read_dataset, write_dataset
+from HyperparameterSearch import SEARCH_METHODS, leaderboard, search_hyperparameters
+from ModelEngine import (
+    CV_FOLDS, CV_N_JOBS, RANDOM_STATE, PredictionManager, build_models, cross_validate_models, score_in_chunks, BATCH_SCORE_ROWS
+)
+from ModelRegistry import get_record, load_model
+from Pipeline import load_pipeline, run_pipeline, to_builtin
+from Resampling import IMBALANCE_STRATEGIES, make_resampler, strategy_class_weight
+
+
+def _frame_records(frame):
+    return json.loads(frame.to_json(orient="index"))
+
+
+def run_missing(df, args):
+    return _frame_records(missing_summary(df))
+
+
+def run_outliers(df, args):
+    table = outlier_bounds_table(df, args.columns, args.iqr_factor, approximate=args.approximate or None)
+    if args.method:
+        df = apply_outlier_table(df, table, args.method)
+        if args.output:
+            with open(args.output, "wb") as out:
+                write_dataset(df, out, args.output.rsplit(".", 1)[-1])
+    bounds = table.reset_index()[list(OutlierBounds._fields)]
+    return {"bounds": json.loads(bounds.to_json(orient="records")), "rows": len(df)}
+
+
+def run_correlation(df, args):
+    if args.top_pairs:
+        pairs = strongest_correlations(df, args.top_pairs, args.features, args.method)
+        return json.loads(pairs.to_json(orient="records"))
+    result = compute_correlation(df, args.features, args.method)
+    return _frame_records(result.correlation_matrix)
+
+
+def run_importance(df, args):
+    result = compute_feature_importance(df, args.target, random_state=args.seed)
+    return {"model_name": result.model_name, "importance_scores": result.importance_scores}
+
+
+def run_ttest(df, args):
+    result = run_statistical_test(df, AnalysisConfig(args.features, "t-test", args.alpha))
+    return result._asdict()
+
+
+def run_compare(df, args):
+    results_df = cross_validate_models(
+        df[args.features], df[args.target],
+        build_models(args.n_estimators, args.max_depth, probability=False, class_weight=strategy_class_weight(args.imbalance)),
+        n_splits=args.folds, n_jobs=args.n_jobs, resampler=make_resampler(args.imbalance, RANDOM_STATE)
+    )
+    return results_df.to_dict(orient="records")
+
+
+def run_search(df, args):
+    pred_manager = PredictionManager(df)
+    pred_manager.prepare_data(args.target, args.features, strategy=args.imbalance)
+    trials = list(search_hyperparameters(
+        pred_manager, args.method, args.candidates, args.time_budget, n_jobs=args.n_jobs,
+        class_weight=strategy_class_weight(args.imbalance)
+    ))
+    return {"trials": len(trials), "leaderboard": leaderboard(trials).to_dict(orient="records")}
+
+
+def run_score(df, args):
+    record = get_record(args.model)
+    model = load_model(record)
+    with open(args.output, "wb") as out:
+        for chunk_number, scored in enumerate(score_in_chunks(model, df, record.metadata["features"], args.chunksize)):
+            scored.to_csv(out, header=chunk_number == 0, index=False, encoding="utf-8")
+    return {"model_id": record.model_id, "output": args.output}
+
+
+COMMANDS = {
+    "missing": run_missing,
+    "outliers": run_outliers,
+    "correlation": run_correlation,
+    "importance": run_importance,
+    "ttest": run_ttest,
+    "compare": run_compare,
+    "search": run_search,
+    "score": run_score,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run dataset analyses without the Streamlit app.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, help_text):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("input", help="Input file (.csv, .xlsx, .parquet, .arrow)")
+        subparser.add_argument("--pipeline", help="Cleaning pipeline JSON to apply first")
+        subparser.add_argument("--streaming", action="store_true", help="Read CSV input with compact dtypes")
+        return subparser
+
+    add_command("missing", "Missing values per column")
+
+    outliers = add_command("outliers", "IQR outlier bounds, optionally clipping or dropping them")
+    outliers.add_argument("--columns", nargs="+", help="Columns to analyse (default: all numeric)")
+    outliers.add_argument("--iqr-factor", type=float, default=1.5)
+    outliers.add_argument("--method", choices=["clip", "drop"], help="Handle the outliers with this method")
+    outliers.add_argument("--approximate", action="store_true",
+                          help="Estimate the quartiles with t-digests (the default for very large files)")
+    outliers.add_argument("--output", help="Write the handled dataset here (.csv, .parquet, .arrow)")
+
+    correlation = add_command("correlation", "Correlation matrix")
+    correlation.add_argument("--features", nargs="+", help="Columns to correlate (default: all numeric)")
+    correlation.add_argument("--method", choices=list(CORRELATION_METHODS), default="pearson")
+    correlation.add_argument("--top-pairs", type=int, help="List the N most strongly correlated pairs instead of the matrix")
+
+    importance = add_command("importance", "Random forest feature importance")
+    importance.add_argument("--target", required=True)
+    importance.add_argument("--seed", type=int, default=None)
+
+    ttest = add_command("ttest", "Two-sample t-test between two columns")
+    ttest.add_argument("--features", nargs=2, required=True)
+    ttest.add_argument("--alpha", type=float, default=0.05, help="Significance level")
+
+    compare = add_command("compare", "Cross-validate the candidate models in parallel")
+    compare.add_argument("--target", required=True)
+    compare.add_argument("--features", nargs="+", required=True)
+    compare.add_argument("--folds", type=int, default=CV_FOLDS)
+    compare.add_argument("--n-jobs", type=int, default=CV_N_JOBS, help="Worker processes (-1: all cores)")
+    compare.add_argument("--imbalance", choices=IMBALANCE_STRATEGIES, default="SMOTE", help="Class imbalance strategy")
+    compare.add_argument("--n-estimators", type=int, default=100)
+    compare.add_argument("--max-depth", type=int, default=10)
+
+    search = add_command("search", "Search random forest hyperparameters in parallel")
+    search.add_argument("--target", required=True)
+    search.add_argument("--features", nargs="+", required=True)
+    search.add_argument("--method", choices=SEARCH_METHODS, default=SEARCH_METHODS[0])
+    search.add_argument("--candidates", type=int, default=27, help="Candidate settings to try")
+    search.add_argument("--time-budget", type=float, help="Stop after this many seconds")
+    search.add_argument("--n-jobs", type=int, default=CV_N_JOBS, help="Worker processes (-1: all cores)")
+    search.add_argument("--imbalance", choices=IMBALANCE_STRATEGIES, default="SMOTE", help="Class imbalance strategy")
+
+    score = add_command("score", "Score a file with a model from the registry")
+    score.add_argument("--model", required=True, help="Model id from the registry, e.g. random_forest-Status-v1")
+    score.add_argument("--output", required=True, help="CSV file for the predictions")
+    score.add_argument("--chunksize", type=int, default=BATCH_SCORE_ROWS, help="Rows scored per chunk")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    df = read_dataset(args.input, args.input, args.streaming)
+    if args.pipeline:
+        df = run_pipeline(df, load_pipeline(args.pipeline))
+
+    start = time.perf_counter()
+    result = COMMANDS[args.command](df, args)
+    elapsed = time.perf_counter() - start
+    json.dump({"command": args.command, "rows": len(df), "seconds": elapsed, "result": result},
+              sys.stdout, indent=2, default=to_builtin)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
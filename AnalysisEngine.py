@@ -0,0 +1,443 @@
+"""UI-free analysis core shared by the Streamlit app and ``AnalysisCLI.py``.
+
+Every function takes a frame and returns plain data (frames, dicts, named
+tuples); nothing here renders, logs or touches session state, so the same code
+runs in batch workers and benchmarks.
+"""
+from collections import namedtuple
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.stats import ttest_ind
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder, MinMaxScaler, StandardScaler
+from sklearn.utils.multiclass import type_of_target
+
+from CorrelationEngine import CorrelationMatrix, correlation_columns
+from Pipeline import make_step
+from Sketches import TDIGEST_CHUNK_ROWS, TDigest
+
+
+@dataclass
+class AnalysisConfig:
+    features_to_include: list
+    test_type: str
+    significance_level: float = 0.05
+
+
+# Use namedtuple to provide structured and easy-to-read analysis results.
+OutlierBounds = namedtuple('OutlierBounds', ['column', 'lower_bound', 'upper_bound', 'n_outliers'])
+CorrelationResult = namedtuple('CorrelationResult', ['correlation_matrix', 'features'])
+FeatureImportanceResult = namedtuple('FeatureImportanceResult', ['importance_scores', 'model_name'])
+StatisticalTestResult = namedtuple('StatisticalTestResult', ['test_statistic', 'p_value', 'null_hypothesis', 'alternative_hypothesis', 'significant'])
+TransformResult = namedtuple('TransformResult', ['df', 'columns', 'step', 'transformer'])
+
+OUTLIER_METHODS = ("clip", "drop")
+# From this many cells, outlier quartiles of many columns are estimated with
+# t-digests fed in chunks instead of copying all columns into one float block.
+APPROX_QUANTILE_MIN_CELLS = 50_000_000
+FILL_METHODS = ("Mean", "Median", "Mode")
+TRANSFORM_TYPES = ("one_hot", "label", "minmax", "standard", "log")
+
+# Row limit of the missing-value matrix and heatmap; larger frames are sampled
+# or aggregated into this many row bins before plotting.
+MISSING_PLOT_MAX_ROWS = 1_000
+# Widest correlation matrix shown as a table and heatmap, and widest heatmap
+# with the values written into its cells; wider frames list their strongest pairs.
+CORRELATION_MATRIX_MAX_COLUMNS = 50
+ANNOTATED_HEATMAP_MAX_COLUMNS = 20
+
+
+def missing_summary(df):
+    """Missing value count and percentage per column."""
+    missing_values = df.isnull().sum()
+    return pd.DataFrame({
+        'Missing Values': missing_values,
+        'Percentage': (missing_values / max(len(df), 1) * 100).round(2)
+    })
+
+
+def evenly_spaced_rows(df, max_rows=MISSING_PLOT_MAX_ROWS):
+    """At most ``max_rows`` rows taken at even intervals, keeping their order."""
+    if len(df) <= max_rows:
+        return df
+    return df.iloc[np.linspace(0, len(df) - 1, max_rows).astype(np.int64)]
+
+
+def missing_row_bins(df, max_bins=MISSING_PLOT_MAX_ROWS):
+    """Fraction of missing values per column in consecutive row bins.
+
+    Frames with up to ``max_bins`` rows give one bin per row (0/1 values). The
+    index holds the position of the first row of each bin.
+    """
+    missing = df.isnull().to_numpy(dtype=np.float32)
+    n_rows = len(df)
+    if n_rows <= max_bins:
+        return pd.DataFrame(missing, columns=df.columns, index=np.arange(n_rows))
+    starts = np.linspace(0, n_rows, max_bins, endpoint=False).astype(np.int64)
+    counts = np.diff(np.r_[starts, n_rows])
+    fractions = np.add.reduceat(missing, starts, axis=0) / counts[:, None]
+    return pd.DataFrame(fractions, columns=df.columns, index=starts)
+
+
+def outlier_bounds(df, column, iqr_factor=1.5):
+    """IQR outlier bounds of a numeric column and the number of rows outside them."""
+    values = df[column]
+    q1, q3 = values.quantile([0.25, 0.75])
+    iqr = q3 - q1
+    lower_bound = q1 - iqr_factor * iqr
+    upper_bound = q3 + iqr_factor * iqr
+    n_outliers = int(((values < lower_bound) | (values > upper_bound)).sum())
+    return OutlierBounds(column, float(lower_bound), float(upper_bound), n_outliers)
+
+
+def outlier_rows(df, column, lower_bound, upper_bound):
+    values = df[column]
+    return df[(values < lower_bound) | (values > upper_bound)]
+
+
+def apply_outliers(df, column, lower_bound, upper_bound, method):
+    """Clip or drop the values of ``column`` outside the bounds and return the frame."""
+    if method == 'clip':
+        df[column] = df[column].clip(lower=lower_bound, upper=upper_bound)
+        return df
+    if method == 'drop':
+        values = df[column]
+        return df[~((values < lower_bound) | (values > upper_bound))]
+    raise ValueError(f"Invalid method for handling outliers: {method}")
+
+
+def group_codes(df, by):
+    """Group number of every row for the key column(s) ``by`` and the key of each group.
+
+    Every key column is factorized once and the codes are combined into one
+    dense group number per row; rows with a missing key get -1, like the
+    groups that ``groupby`` drops.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    key_codes, key_uniques = zip(*(pd.factorize(df[key], sort=True) for key in by))
+    codes = key_codes[0].astype(np.int64)
+    for next_codes, next_uniques in zip(key_codes[1:], key_uniques[1:]):
+        complete = (codes >= 0) & (next_codes >= 0)
+        combined = codes[complete] * len(next_uniques) + next_codes[complete]
+        codes = np.full(len(codes), -1, dtype=np.int64)
+        codes[complete] = pd.factorize(combined)[0]
+
+    n_groups = codes.max() + 1 if len(codes) else 0
+    first_rows = np.zeros(n_groups, dtype=np.int64)
+    valid = codes >= 0
+    # Reversed assignment leaves the first row of every group
+    first_rows[codes[valid][::-1]] = np.flatnonzero(valid)[::-1]
+    if len(by) == 1:
+        keys = pd.Index(key_uniques[0].take(key_codes[0][first_rows]), name=by[0])
+    else:
+        keys = pd.MultiIndex.from_arrays(
+            [uniques.take(key_code[first_rows]) for key_code, uniques in zip(key_codes, key_uniques)], names=by
+        )
+    return codes, keys
+
+
+def _group_statistic(values, codes, n_groups, method):
+    """Mean, median or mode of ``values`` per group number in one vectorized pass."""
+    present = codes >= 0
+    if method == "Mode":
+        value_codes, uniques = pd.factorize(values, sort=True)
+        present &= value_codes >= 0
+        pairs = codes[present] * len(uniques) + value_codes[present]
+        pairs, counts = np.unique(pairs, return_counts=True)
+        groups, value_codes = np.divmod(pairs, len(uniques))
+        # Most frequent value per group, the smallest one on ties (as Series.mode()[0])
+        order = np.lexsort((value_codes, -counts, groups))
+        first = order[np.r_[True, groups[order][1:] != groups[order][:-1]]]
+        numeric = pd.api.types.is_numeric_dtype(uniques.dtype)
+        result = np.full(n_groups, np.nan, dtype=np.float64 if numeric else object)
+        result[groups[first]] = np.asarray(uniques.take(value_codes[first]))
+        return result
+
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        raise ValueError(f"{method} fill needs a numeric column.")
+    numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    present &= ~np.isnan(numbers)
+    groups, numbers = codes[present], numbers[present]
+    if method == "Mean":
+        counts = np.bincount(groups, minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.bincount(groups, weights=numbers, minlength=n_groups) / counts
+    if method == "Median":
+        # Grouped on the group numbers, so the keys are not factorized again
+        medians = pd.Series(numbers).groupby(groups).median()
+        result = np.full(n_groups, np.nan)
+        result[medians.index.to_numpy()] = medians.to_numpy()
+        return result
+    raise ValueError(f"Unknown fill method: {method}")
+
+
+def group_fill_values(df, columns, by, method):
+    """Per-group fill values (mean, median or mode) of ``columns`` within the groups of ``by``.
+
+    ``by`` is a key column or a list of them. Returns a frame indexed by the
+    group keys with one column per filled column, or a series for a single
+    column name; groups without any value get NaN.
+    """
+    codes, keys = group_codes(df, by)
+    names = [columns] if isinstance(columns, str) else list(columns)
+    values = pd.DataFrame({column: _group_statistic(df[column], codes, len(keys), method) for column in names}, index=keys)
+    return values[columns] if isinstance(columns, str) else values
+
+
+def fill_by_group(df, columns, by, method):
+    """Fill the missing values of ``columns`` with their per-group ``method`` value.
+
+    The groups are numbered once for all columns; each column's statistics
+    are spread to the rows with a take on the group numbers. Returns the
+    filled frame and the replayable ``fill_by_group`` step of every column.
+    """
+    by_columns = [by] if isinstance(by, str) else list(by)
+    if any(column in by_columns for column in columns):
+        raise ValueError("The group columns cannot be filled by their own groups.")
+    codes, keys = group_codes(df, by)
+    df = df.copy(deep=False)
+    steps = []
+    for column in columns:
+        statistic = _group_statistic(df[column], codes, len(keys), method)
+        fill = pd.Series(pd.api.extensions.take(statistic, codes, allow_fill=True), index=df.index)
+        df[column] = df[column].fillna(fill)
+        filled = ~pd.isna(statistic)
+        steps.append(make_step(
+            "fill_by_group", column=column, by=by,
+            values=[[list(key) if isinstance(key, tuple) else key, value]
+                    for key, value in zip(keys[filled], statistic[filled])]
+        ))
+    return df, steps
+
+
+def transform_column(df, column, transform_type):
+    """Encode or scale one column.
+
+    Returns the transformed frame, the columns it wrote, the replayable
+    pipeline step with the fitted parameters and the fitted transformer (if any).
+    """
+    if transform_type == "one_hot":
+        encoded_cols = pd.get_dummies(df[column], prefix=column)
+        step = make_step("one_hot", column=column, categories=pd.Categorical(df[column]).categories.tolist())
+        return TransformResult(pd.concat([df.drop(columns=[column]), encoded_cols], axis=1), list(encoded_cols.columns), step, None)
+
+    if transform_type == "label":
+        transformer = LabelEncoder()
+        values = transformer.fit_transform(df[column])
+        step = make_step("label_encode", column=column, classes=transformer.classes_.tolist())
+    elif transform_type == "minmax":
+        transformer = MinMaxScaler()
+        values = transformer.fit_transform(df[[column]]).flatten()
+        step = make_step("minmax_scale", column=column, scale=transformer.scale_[0], min=transformer.min_[0])
+    elif transform_type == "standard":
+        transformer = StandardScaler()
+        values = transformer.fit_transform(df[[column]]).flatten()
+        step = make_step("standard_scale", column=column, mean=transformer.mean_[0], scale=transformer.scale_[0])
+    elif transform_type == "log":
+        transformer = None
+        values = np.log1p(df[column])
+        step = make_step("log1p", column=column)
+    else:
+        raise ValueError(f"Unknown transformation: {transform_type}")
+    df[column] = values
+    return TransformResult(df, [column], step, transformer)
+
+
+def _column_quantiles(values, quantiles):
+    """Linearly interpolated quantiles of every column of a 2-D float block, ignoring NaN.
+
+    One sort of the whole block replaces a selection per column; the
+    interpolation is NumPy's, so the results equal ``Series.quantile``.
+    """
+    if len(values) == 0:
+        return np.full((len(quantiles), values.shape[1]), np.nan)
+    values = np.sort(np.asfortranarray(values), axis=0)  # NaN sorts last
+    counts = np.count_nonzero(~np.isnan(values), axis=0)
+    columns = np.arange(values.shape[1])
+    results = []
+    for q in quantiles:
+        position = q * np.maximum(counts - 1, 0)
+        below = np.floor(position).astype(np.intp)
+        above = np.minimum(below + 1, np.maximum(counts - 1, 0))
+        weight = position - below
+        low, high = values[below, columns], values[above, columns]
+        with np.errstate(invalid="ignore"):
+            diff = high - low
+            result = np.where(weight >= 0.5, high - diff * (1 - weight), low + diff * weight)
+        results.append(np.where(counts > 0, result, np.nan))
+    return np.array(results)
+
+
+def _float_chunks(series, chunk_rows=TDIGEST_CHUNK_ROWS):
+    """The values of ``series`` as float64 arrays of at most ``chunk_rows`` rows."""
+    for start in range(0, len(series), chunk_rows):
+        yield series.iloc[start:start + chunk_rows].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def outlier_bounds_table(df, columns=None, iqr_factor=1.5, approximate=None):
+    """IQR outlier bounds of many numeric columns at once (all numeric columns by default).
+
+    The quartiles of all columns come from one sort of the column block, or,
+    with ``approximate`` (by default from ``APPROX_QUANTILE_MIN_CELLS`` cells
+    on), from a t-digest per column. The approximate path handles one column
+    at a time in chunks of ``TDIGEST_CHUNK_ROWS`` rows, first for its digest
+    and then for counting its outliers, so at most one chunk is held as floats.
+    Returns a frame indexed by column with q1, q3, lower_bound, upper_bound and
+    n_outliers.
+    """
+    columns = list(df.select_dtypes(include='number').columns) if columns is None else list(columns)
+    if approximate is None:
+        approximate = len(df) * len(columns) >= APPROX_QUANTILE_MIN_CELLS
+
+    if approximate:
+        q1, q3, n_outliers = np.full(len(columns), np.nan), np.full(len(columns), np.nan), np.zeros(len(columns))
+        for position, column in enumerate(columns):
+            series = df[column]
+            digest = TDigest()
+            for chunk in _float_chunks(series):
+                digest.update(chunk)
+            q1[position], q3[position] = digest.quantile([0.25, 0.75])
+            iqr = q3[position] - q1[position]
+            lower, upper = q1[position] - iqr_factor * iqr, q3[position] + iqr_factor * iqr
+            n_outliers[position] = sum(np.count_nonzero((chunk < lower) | (chunk > upper))
+                                       for chunk in _float_chunks(series))
+    else:
+        values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        q1, q3 = _column_quantiles(values, [0.25, 0.75])
+    iqr = q3 - q1
+    lower_bound, upper_bound = q1 - iqr_factor * iqr, q3 + iqr_factor * iqr
+    if not approximate:
+        n_outliers = np.count_nonzero((values < lower_bound) | (values > upper_bound), axis=0)
+    return pd.DataFrame({
+        "q1": q1, "q3": q3, "lower_bound": lower_bound, "upper_bound": upper_bound,
+        "n_outliers": np.asarray(n_outliers, dtype=np.int64),
+    }, index=pd.Index(columns, name="column"))
+
+
+def outlier_mask(df, table):
+    """Boolean frame marking the values outside the bounds of every column in ``table``."""
+    columns = list(table.index)
+    values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = (values < table["lower_bound"].to_numpy()) | (values > table["upper_bound"].to_numpy())
+    return pd.DataFrame(mask, index=df.index, columns=columns)
+
+
+def apply_outlier_table(df, table, method):
+    """Clip every column of ``table`` to its bounds, or drop the rows with an outlier in any of them."""
+    if method == 'clip':
+        # Columns without outliers stay as they are; the others keep their dtype
+        for column, row in table[table["n_outliers"] > 0].iterrows():
+            df[column] = df[column].clip(lower=row.lower_bound, upper=row.upper_bound)
+        return df
+    if method == 'drop':
+        return df[~outlier_mask(df, table).to_numpy().any(axis=1)]
+    raise ValueError(f"Invalid method for handling outliers: {method}")
+
+
+def outlier_steps(table, method):
+    """Replayable pipeline steps of ``apply_outlier_table``, one per column."""
+    op = "clip" if method == "clip" else "drop_outliers"
+    return [make_step(op, column=column, lower=row.lower_bound, upper=row.upper_bound) for column, row in table.iterrows()]
+
+
+def describe_profiles(profiles, columns):
+    """``DataFrame.describe()`` of numeric columns, read from their ``ColumnProfile``."""
+    rows = {}
+    for column in columns:
+        profile = profiles[column]
+        q1, median, q3 = profile.quartiles()
+        rows[column] = [profile.count, profile.mean, profile.std, profile.min, q1, median, q3, profile.max]
+    return pd.DataFrame(rows, index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"], dtype=np.float64)
+
+
+def describe_categories(profiles, columns):
+    """``DataFrame.describe()`` of categorical columns, read from their ``ColumnProfile``."""
+    rows = {}
+    for column in columns:
+        profile = profiles[column]
+        top = profile.top_values.top(1)
+        rows[column] = [profile.count, profile.n_distinct, top.index[0] if len(top) else np.nan,
+                        top.iloc[0] if len(top) else np.nan]
+    return pd.DataFrame(rows, index=["count", "unique", "top", "freq"], dtype=object)
+
+
+def profile_info(profiles):
+    """Non-null count, dtype and distinct values of every profiled column."""
+    return pd.DataFrame({
+        "Column Name": list(profiles),
+        "Non-Null Count": [profile.count for profile in profiles.values()],
+        "Data Type": [profile.dtype for profile in profiles.values()],
+        "Distinct Values": [profile.n_distinct for profile in profiles.values()],
+    })
+
+
+def compute_correlation(df, features=None, method="pearson", correlations=None):
+    """Correlation of the numeric and boolean columns, or of ``features`` when given.
+
+    ``correlations`` is a ``CorrelationMatrix`` already up to date with ``df``
+    (such as ``DatasetStore.correlations``); the result is sliced from it.
+    """
+    features = list(features) if features else correlation_columns(df)
+    correlations = _up_to_date_correlations(df, features, method, correlations)
+    return CorrelationResult(correlation_matrix=correlations.matrix(features), features=features)
+
+
+def strongest_correlations(df, k=20, features=None, method="pearson", correlations=None):
+    """The ``k`` most strongly correlated pairs of columns, without building the dense matrix."""
+    features = list(features) if features else correlation_columns(df)
+    correlations = _up_to_date_correlations(df, features, method, correlations)
+    return correlations.strongest_pairs(k, features)
+
+
+def _up_to_date_correlations(df, features, method, correlations):
+    if correlations is None:
+        correlations = CorrelationMatrix(method).update({column: df[column] for column in features}, df.index)
+    return correlations
+
+
+def compute_feature_importance(df, target_column, random_state=None):
+    """Fit a random forest on all other columns and return its feature importances."""
+    X = df.drop(columns=[target_column])
+    y = df[target_column]
+
+    target_type = type_of_target(y)
+    if target_type in ["binary", "multiclass"]:
+        model = RandomForestClassifier(random_state=random_state)
+        model_name = "RandomForestClassifier"
+    elif target_type in ["continuous", "continuous-multioutput"]:
+        model = RandomForestRegressor(random_state=random_state)
+        model_name = "RandomForestRegressor"
+    else:
+        raise ValueError(f"Unsupported target type: {target_type}")
+
+    model.fit(X, y)
+    return FeatureImportanceResult(importance_scores=dict(zip(X.columns, model.feature_importances_)), model_name=model_name)
+
+
+def importance_table(result):
+    """Feature importance scores as a frame sorted from most to least important."""
+    return pd.DataFrame({
+        'Feature': list(result.importance_scores),
+        'Importance': list(result.importance_scores.values())
+    }).sort_values(by='Importance', ascending=False)
+
+
+def run_statistical_test(df, config: AnalysisConfig):
+    """Run the configured test on exactly two features."""
+    features = config.features_to_include
+    if len(features) != 2:
+        raise ValueError("Please select exactly two features for the statistical test.")
+    if config.test_type != "t-test":
+        raise ValueError(f"Unsupported test type: {config.test_type}")
+
+    feature1, feature2 = features
+    test_statistic, p_value = ttest_ind(df[feature1].dropna(), df[feature2].dropna())
+    return StatisticalTestResult(
+        test_statistic=float(test_statistic),
+        p_value=float(p_value),
+        null_hypothesis=f"There is no significant difference between {feature1} and {feature2}.",
+        alternative_hypothesis=f"There is a significant difference between {feature1} and {feature2}.",
+        significant=bool(p_value < config.significance_level)
+    )
@@ -0,0 +1,222 @@
+"""Benchmarks of the analysis and modelling hot paths, without Streamlit:
+
+    python Benchmark.py --save                       # record benchmark_baseline.json
+    python Benchmark.py                              # compare against it
+    python Benchmark.py --sizes 4024 10000000 --ops read_csv correlation
+
+Synthetic datasets are drawn column by column from the value distributions of
+``Breast_Cancer_cleaned.csv`` (with missing values added to a few columns) and
+scaled from the original 4k rows up to 10M rows. Every operation records its
+best wall-clock time over ``--repeat`` runs and the peak memory allocated
+while it runs (Python and NumPy allocations of this process, traced in a
+separate run, so the worker processes of "compare" are not included). Model
+operations are skipped above their row limit unless ``--full`` is given.
+
+Results are compared with the baseline file: an operation regresses when it
+is more than ``--tolerance`` slower or uses that much more memory. The exit
+status is 1 when any operation regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from AnalysisEngine import (
+    FILL_METHODS, missing_summary, outlier_bounds_table, apply_outlier_table, fill_by_group, transform_column,
+    compute_correlation, strongest_correlations, compute_feature_importance
+)
+from DataLoader import read_dataset
+from ModelEngine import CV_FOLDS, RANDOM_STATE, PredictionManager, build_models, cross_validate_models
+from Pipeline import to_builtin
+from Resampling import make_resampler
+from Sketches import profile_column
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Breast_Cancer_cleaned.csv")
+BASELINE_FILE = "benchmark_baseline.json"
+
+DEFAULT_SIZES = [4_024, 100_000, 1_000_000]
+MAX_ROWS = 10_000_000
+
+# Share of missing values added to these columns of the synthetic data.
+MISSING_COLUMNS = ["Tumor_Size", "Regional_Node_Examined"]
+MISSING_FRACTION = 0.05
+
+TARGET_COLUMN = "Status"
+GROUP_COLUMN = "T_Stage_"
+MODEL_FEATURES = ["Age", "Survival_Months", "Reginol_Node_Positive", "Grade", "N_Stage"]
+
+# Relative slowdown (or memory growth) that counts as a regression, and the
+# smallest absolute slowdown worth reporting.
+REGRESSION_TOLERANCE = 0.2
+MIN_REGRESSION_SECONDS = 0.05
+
+# Rows above which the model operations are skipped without --full.
+OPERATION_MAX_ROWS = {
+    "feature_importance": 100_000,
+    "prepare_data": 1_000_000,
+    "compare": 10_000,
+}
+
+
+def synthetic_dataset(n_rows, random_state=0, schema_file=SCHEMA_FILE):
+    """``n_rows`` rows drawn independently per column from the schema file's values."""
+    schema = pd.read_csv(schema_file).drop(columns=["Unnamed: 0"], errors="ignore")
+    rng = np.random.default_rng(random_state)
+    df = pd.DataFrame({column: rng.choice(schema[column].to_numpy(), size=n_rows) for column in schema.columns})
+    for column in MISSING_COLUMNS:
+        df.loc[rng.random(n_rows) < MISSING_FRACTION, column] = np.nan
+    return df
+
+
+def _outliers(df):
+    apply_outlier_table(df.copy(deep=False), outlier_bounds_table(df), "clip")
+
+
+def _group_fill(df):
+    for method in FILL_METHODS:
+        fill_by_group(df, MISSING_COLUMNS, GROUP_COLUMN, method)
+
+
+def _transform_column(df):
+    for column, transform_type in [("Age", "minmax"), ("Age", "standard"), ("Survival_Months", "log"), ("Grade", "one_hot")]:
+        transform_column(df.copy(deep=False), column, transform_type)
+
+
+def _prepare_data(df):
+    PredictionManager(df).prepare_data(TARGET_COLUMN, MODEL_FEATURES, strategy="SMOTE")
+
+
+def _compare(df):
+    cross_validate_models(
+        df[MODEL_FEATURES], df[TARGET_COLUMN], build_models(probability=False),
+        n_splits=CV_FOLDS, resampler=make_resampler("SMOTE", RANDOM_STATE)
+    )
+
+
+# Operation name -> function of (dataset, path of the dataset as CSV).
+OPERATIONS = {
+    "read_csv": lambda df, path: read_dataset(path, path),
+    "read_csv_streaming": lambda df, path: read_dataset(path, path, streaming=True),
+    "missing_summary": lambda df, path: missing_summary(df),
+    "profile": lambda df, path: [profile_column(df[column]) for column in df.columns],
+    "outliers": lambda df, path: _outliers(df),
+    "group_fill": lambda df, path: _group_fill(df),
+    "transform_column": lambda df, path: _transform_column(df),
+    "correlation": lambda df, path: compute_correlation(df),
+    "strongest_pairs": lambda df, path: strongest_correlations(df),
+    "feature_importance": lambda df, path: compute_feature_importance(df, TARGET_COLUMN, random_state=RANDOM_STATE),
+    "prepare_data": lambda df, path: _prepare_data(df),
+    "compare": lambda df, path: _compare(df),
+}
+
+
+def measure(operation, df, path, repeat=1):
+    """Best wall-clock seconds over ``repeat`` runs and peak traced MB of one more run."""
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation(df, path)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        operation(df, path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_mb": peak / 1024 ** 2}
+
+
+def run_benchmarks(sizes, operations, repeat=1, full=False, log=None):
+    """Results keyed by ``"<operation>@<rows>"``; skipped operations are left out."""
+    results = {}
+    for n_rows in sizes:
+        df = synthetic_dataset(n_rows)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, f"synthetic_{n_rows}.csv")
+            df.to_csv(path, index=False)
+            for name in operations:
+                if not full and n_rows > OPERATION_MAX_ROWS.get(name, MAX_ROWS):
+                    continue
+                results[f"{name}@{n_rows}"] = result = measure(OPERATIONS[name], df, path, repeat)
+                if log is not None:
+                    log(f"{name:>20} {n_rows:>10,} rows  {result['seconds']:9.3f}s  {result['peak_mb']:9.1f} MB")
+    return results
+
+
+def find_regressions(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Descriptions of the results that are slower or use more memory than the baseline allows."""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        slowdown = result["seconds"] - reference["seconds"]
+        if slowdown > MIN_REGRESSION_SECONDS and result["seconds"] > reference["seconds"] * (1 + tolerance):
+            regressions.append(f"{key}: {result['seconds']:.3f}s vs {reference['seconds']:.3f}s baseline")
+        if result["peak_mb"] > reference["peak_mb"] * (1 + tolerance) and result["peak_mb"] - reference["peak_mb"] > 1:
+            regressions.append(f"{key}: {result['peak_mb']:.1f} MB vs {reference['peak_mb']:.1f} MB baseline")
+    return regressions
+
+
+def environment():
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis and modelling operations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help=f"Dataset rows (up to {MAX_ROWS:,})")
+    parser.add_argument("--ops", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per operation; the best one counts")
+    parser.add_argument("--full", action="store_true", help="Run model operations at every size")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON to compare with or save to")
+    parser.add_argument("--save", action="store_true", help="Merge the results into the baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Allowed relative slowdown")
+    args = parser.parse_args(argv)
+    if max(args.sizes) > MAX_ROWS:
+        parser.error(f"Sizes are limited to {MAX_ROWS:,} rows.")
+
+    results = run_benchmarks(args.sizes, args.ops, args.repeat, args.full, log=print)
+
+    baseline = {"environment": {}, "results": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+
+    if args.save:
+        baseline["environment"] = environment()
+        baseline["results"].update(results)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(baseline, handle, indent=2, default=to_builtin)
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+
+    regressions = find_regressions(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not baseline["results"]:
+        print(f"No baseline at {args.baseline}; run with --save to record one.")
+    elif not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from DatasetStore import get_dataset_store
+from Pipeline import add_step, pipeline_to_json
+
+# Entries kept per session, number of row ranges stored per entry and rows shown
+# when an entry's before/after values are rendered.
+MAX_LOG_ENTRIES = 200
+MAX_ROW_RANGES = 20
+MAX_RENDERED_ROWS = 500
+
+
+def _row_ranges(mask):
+    """Compress a boolean row mask into inclusive (start, end) position ranges."""
+    positions = np.flatnonzero(mask)
+    if len(positions) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(positions) != 1)
+    starts = np.r_[positions[0], positions[breaks + 1]]
+    ends = np.r_[positions[breaks], positions[-1]]
+    return [(int(start), int(end)) for start, end in zip(starts[:MAX_ROW_RANGES], ends[:MAX_ROW_RANGES])]
+
+
+def _changed_mask(before, after):
+    """Rows whose value differs between two aligned columns (NaN equals NaN)."""
+    try:
+        differs = np.asarray(before.ne(after.values), dtype=bool)
+    except TypeError:
+        differs = np.asarray(before.astype(object).values != after.astype(object).values, dtype=bool)
+    both_missing = np.asarray(before.isna(), dtype=bool) & np.asarray(after.isna(), dtype=bool)
+    return differs & ~both_missing
+
+
+def _content_hash(column):
+    hashed = pd.util.hash_pandas_object(column, index=False).values
+    return hashlib.blake2b(hashed.tobytes(), digest_size=8).hexdigest()
+
+
+def _describe_delta(store, before_number, after_number, column):
+    """Compute affected row ranges and a content hash for one committed change."""
+    before_version = store.get_version(before_number)
+    after_version = store.get_version(after_number)
+    delta = {'rows': [], 'rows_changed': 0, 'content_hash': None}
+    if before_version is None or after_version is None:
+        return delta
+
+    before = store.column(before_version, column)
+    after = store.column(after_version, column)
+    before_index, after_index = store.index(before_version), store.index(after_version)
+    if not after_index.equals(before_index):
+        removed = ~before_index.isin(after_index)
+        delta['rows'] = _row_ranges(removed)
+        delta['rows_changed'] = int(removed.sum())
+    elif before is not None and after is not None:
+        changed = _changed_mask(before, after)
+        delta['rows'] = _row_ranges(changed)
+        delta['rows_changed'] = int(changed.sum())
+    elif after is not None:
+        delta['rows_changed'] = len(after_index)
+        delta['rows'] = _row_ranges(np.ones(len(after_index), dtype=bool))
+
+    if after is not None:
+        delta['content_hash'] = _content_hash(after)
+    return delta
+
+
+def log_change(operation: str, details: str, column=None, params=None, step=None):
+    """Log an operation as a compact, structured entry.
+
+    When the dataset store has a version that no entry has claimed yet, the entry
+    is linked to it: the before/after version numbers, the changed columns, the
+    affected row ranges and a content hash are recorded instead of text dumps.
+    Repeats of the same non-modifying operation are folded into one entry, and the
+    log keeps at most ``MAX_LOG_ENTRIES`` entries. ``step`` is the replayable
+    pipeline step of the change; steps are also compiled into the session's
+    ``pipeline_steps``, which is never evicted, so the exported pipeline stays
+    complete however many entries are dropped.
+    """
+    if 'change_log' not in st.session_state:
+        st.session_state.change_log = []
+    if 'pipeline_steps' not in st.session_state:
+        st.session_state.pipeline_steps = []
+    change_log = st.session_state.change_log
+    if step is not None:
+        add_step(st.session_state.pipeline_steps, step)
+
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    entry = {
+        'timestamp': timestamp,
+        'operation': operation,
+        'details': details,
+        'column': column,
+        'params': params if params is not None else {key: value for key, value in (step or {}).items() if key != 'op'},
+        'step': step,
+        'store_id': None,
+        'before_version': None,
+        'after_version': None,
+        'changed_columns': [],
+        'rows': [],
+        'rows_changed': 0,
+        'content_hash': None,
+        'count': 1,
+    }
+
+    store = get_dataset_store() if 'data' in st.session_state else None
+    if store is not None and st.session_state.get('change_log_version', 0) != store.version:
+        after_number = store.version
+        before_number = store.previous_version(after_number)
+        changed_columns = list(store.head.changed)
+        entry.update(
+            store_id=store.store_id,
+            before_version=before_number,
+            after_version=after_number,
+            changed_columns=changed_columns,
+        )
+        delta_column = column if column is not None else (changed_columns[0] if len(changed_columns) == 1 else None)
+        if before_number is not None:
+            entry.update(_describe_delta(store, before_number, after_number, delta_column))
+        st.session_state.change_log_version = after_number
+    elif change_log:
+        last = change_log[-1]
+        if last['after_version'] is None and (last['operation'], last['details']) == (operation, details):
+            last['count'] += 1
+            last['timestamp'] = timestamp
+            return
+
+    change_log.append(entry)
+    if len(change_log) > MAX_LOG_ENTRIES:
+        del change_log[:len(change_log) - MAX_LOG_ENTRIES]
+
+
+def _render_before_after(change):
+    """Render the values an entry changed, using the versions kept by the store."""
+    store = get_dataset_store()
+    if change['store_id'] != store.store_id:
+        st.info("This change belongs to a previously loaded dataset.")
+        return
+    before_version = store.get_version(change['before_version'])
+    after_version = store.get_version(change['after_version'])
+    if before_version is None or after_version is None:
+        st.info("These versions are no longer kept in memory.")
+        return
+
+    column = change['column']
+    before, after = store.column(before_version, column), store.column(after_version, column)
+    before_index, after_index = store.index(before_version), store.index(after_version)
+    if not after_index.equals(before_index):
+        removed = np.flatnonzero(~before_index.isin(after_index))
+        st.write(f"Removed rows (first {MAX_RENDERED_ROWS}):")
+        st.dataframe(store.materialize(before_version.number, rows=removed[:MAX_RENDERED_ROWS]))
+    elif before is not None and after is not None:
+        changed = _changed_mask(before, after)
+        st.write(f"Changed values (first {MAX_RENDERED_ROWS}):")
+        st.dataframe(pd.DataFrame({
+            'Before': before[changed].head(MAX_RENDERED_ROWS),
+            'After': after[changed].head(MAX_RENDERED_ROWS),
+        }))
+    else:
+        st.write(f"Changed columns: {', '.join(map(str, change['changed_columns']))}")
+
+
+def show_change_log():
+    """Display the change log; before/after values are only rendered on request"""
+    if 'change_log' in st.session_state and st.session_state.change_log:
+        st.subheader("Change Log")
+
+        steps = st.session_state.get('pipeline_steps', [])
+        if steps:
+            st.download_button(
+                label=f"Export Cleaning Pipeline ({len(steps)} steps)",
+                data=pipeline_to_json(steps),
+                file_name="cleaning_pipeline.json",
+                mime="application/json",
+                help="Replay these steps on new files with: python Pipeline.py cleaning_pipeline.json input.csv output.csv"
+            )
+
+        view_option = st.radio(
+            "View changes:",
+            ["Latest First", "Oldest First"]
+        )
+
+        changes = list(enumerate(st.session_state.change_log))
+        if view_option == "Latest First":
+            changes.reverse()
+
+        for position, change in changes:
+            repeated = f" (x{change['count']})" if change['count'] > 1 else ""
+            with st.expander(f"{change['operation']} - {change['timestamp']}{repeated}"):
+                st.write(change['details'])
+                if change['params']:
+                    st.json({key: str(value) for key, value in change['params'].items()})
+                if change['after_version'] is None:
+                    continue
+
+                st.write(
+                    f"Version {change['before_version']} → {change['after_version']}, "
+                    f"{change['rows_changed']} rows affected, content hash: {change['content_hash']}"
+                )
+                if change['rows']:
+                    st.write("Row ranges: " + ", ".join(f"{start}-{end}" for start, end in change['rows']))
+                if st.checkbox("Show before/after", key=f"change_log_render_{position}_{change['after_version']}"):
+                    _render_before_after(change)
+    else:
+        st.info("No changes logged yet")
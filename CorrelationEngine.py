@@ -0,0 +1,245 @@
+"""Correlation matrices kept up to date column by column, independent of the UI.
+
+``CorrelationMatrix`` keeps pairwise sufficient statistics of a set of numeric
+(and boolean) columns: for every pair, the number of rows where both are
+present and, over those rows, the sums, sums of squares and cross-products.
+Pearson correlations over pairwise-complete rows, as ``DataFrame.corr``
+computes them, follow from these directly, and feature subsets are sliced
+from them instead of being recomputed.
+
+``update`` compares the column objects with the ones it saw last time (the
+dataset store reuses the objects of unchanged columns) and recomputes only
+the rows and columns of the statistics that belong to replaced or new
+columns, which costs O(n*p) per edited column instead of O(n*p^2).
+
+Columns are standardized once (centred and scaled to unit variance) and
+multiplied in row blocks of ``float32``, which halves the memory of every
+block and lets the BLAS run its single-precision kernels on all cores; the
+statistics are accumulated across blocks in ``float64``. ``strongest_pairs``
+walks the statistics in blocks of rows to list the most strongly correlated
+pairs of wide frames without building the dense correlation matrix.
+
+Spearman correlation is the Pearson correlation of ranks. The ranks of every
+column are cached with it, so an edit re-ranks only that column. Ranks are
+taken over each column's own non-missing values, whereas
+``DataFrame.corr(method="spearman")`` re-ranks the rows each pair shares, so
+the two differ slightly when values are missing.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+CORRELATION_METHODS = ("pearson", "spearman")
+# Values converted to floats at a time while the statistics are accumulated.
+CORRELATION_CHUNK_CELLS = 8_000_000
+# Share of replaced columns from which all statistics are recomputed at once.
+FULL_RECOMPUTE_SHARE = 0.25
+# Precision of the standardized blocks that are multiplied.
+CORRELATION_DTYPE = np.float32
+# Rows of the statistics turned into correlations at a time by strongest_pairs.
+PAIRS_BLOCK_ROWS = 256
+
+
+def correlation_columns(df):
+    """Columns that take part in correlations: numeric ones and booleans (as 0/1)."""
+    return [column for column in df.columns if is_numeric_dtype(df[column].dtype)]
+
+
+class CorrelationMatrix:
+    """Pairwise-complete Pearson or Spearman correlations of columns, updated incrementally."""
+
+    def __init__(self, method="pearson", chunk_cells=CORRELATION_CHUNK_CELLS, dtype=CORRELATION_DTYPE):
+        if method not in CORRELATION_METHODS:
+            raise ValueError(f"Unknown correlation method: {method}")
+        self.method = method
+        self.chunk_cells = chunk_cells
+        self.dtype = dtype
+        self.columns = []
+        self.index = None
+        # Column name -> (column object, values to correlate (ranks for Spearman),
+        # their mean and scale, and the count, sum and sum of squares of the
+        # standardized non-missing values)
+        self._sources = {}
+        self._count = self._sums = self._squares = self._products = np.empty((0, 0))
+
+    def _prepare(self, series):
+        if self.method == "spearman":
+            values = series.rank().to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            # Plain NumPy columns are used as they are, and cast chunk by chunk
+            values = series.to_numpy()
+            if values.dtype.kind not in "biuf":
+                values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        present = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+        if len(present) == 0 or present.min() == present.max():
+            # Constant columns stay exactly zero, so their correlations are NaN
+            mean, scale = (present[0] if len(present) else 0.0), 1.0
+        else:
+            mean = present.mean()
+            scale = 1.0 / np.std(present)
+        standardized = (present - mean) * scale
+        return values, mean, scale, len(present), standardized.sum(), np.square(standardized).sum()
+
+    def update(self, columns, index=None):
+        """Bring the statistics up to date with ``columns``, a mapping of names to Series.
+
+        Columns whose Series object is unchanged keep their statistics, unless
+        the rows (``index``) changed; then everything is recomputed.
+        """
+        names = list(columns)
+        same_rows = self.index is not None and index is not None and (index is self.index or index.equals(self.index))
+        changed = [
+            name for name in names
+            if not same_rows or name not in self._sources or self._sources[name][0] is not columns[name]
+        ]
+        if not changed and names == self.columns:
+            return self
+
+        sources = {}
+        for name in names:
+            previous = self._sources.get(name)
+            if name in changed or previous is None:
+                sources[name] = (columns[name], *self._prepare(columns[name]))
+            else:
+                sources[name] = previous
+
+        p = len(names)
+        statistics = [np.zeros((p, p)) for _ in range(4)]
+        if len(changed) > FULL_RECOMPUTE_SHARE * p:
+            changed = names
+        else:
+            # Pairs of unchanged columns keep their statistics
+            kept = [name for name in names if name not in changed]
+            old_position = {name: position for position, name in enumerate(self.columns)}
+            new_positions = np.ix_(*[[names.index(name) for name in kept]] * 2)
+            old_positions = np.ix_(*[[old_position[name] for name in kept]] * 2)
+            for new, old in zip(statistics, (self._count, self._sums, self._squares, self._products)):
+                new[new_positions] = old[old_positions]
+
+        self._count, self._sums, self._squares, self._products = statistics
+        self.columns = names
+        self.index = index
+        self._sources = sources
+        self._accumulate([names.index(name) for name in changed])
+        return self
+
+    def _accumulate(self, positions):
+        """Recompute the rows and columns of the statistics at ``positions``.
+
+        A pair with a column without missing values shares all rows of the
+        other column, so its count and sums are that column's own; masked
+        products are only needed between columns that both miss values.
+        """
+        sources = [self._sources[name] for name in self.columns]
+        p, n_rows = len(sources), len(sources[0][1]) if sources else 0
+        positions = np.asarray(positions, dtype=np.intp)
+        full = len(positions) == p
+        counts, totals, square_totals = (np.array([source[index] for source in sources], dtype=np.float64)
+                                         for index in (4, 5, 6))
+        incomplete = np.flatnonzero(counts < n_rows)
+        changed_incomplete = np.flatnonzero(counts[positions] < n_rows)
+        incomplete_pairs = np.ix_(incomplete, changed_incomplete)
+
+        # Statistic[i, k] of the pair (column i, changed column positions[k]),
+        # and own_*[k, j] of the changed column itself over the rows shared with j
+        count = np.repeat(counts[:, None], len(positions), axis=1)
+        count[:, changed_incomplete] = counts[positions[changed_incomplete]]
+        count[incomplete_pairs] = 0
+        sums = np.repeat(totals[:, None], len(positions), axis=1)
+        squares = np.repeat(square_totals[:, None], len(positions), axis=1)
+        sums[:, changed_incomplete] = squares[:, changed_incomplete] = 0
+        own_sums = np.repeat(totals[positions][:, None], p, axis=1)
+        own_squares = np.repeat(square_totals[positions][:, None], p, axis=1)
+        own_sums[:, incomplete] = own_squares[:, incomplete] = 0
+        products = np.zeros((p, len(positions)))
+
+        chunk_rows = max(1, self.chunk_cells // max(p, 1))
+        for start in range(0, n_rows, chunk_rows):
+            stop = min(start + chunk_rows, n_rows)
+            # Column-major, so every column is written contiguously
+            block = np.empty((stop - start, p), dtype=self.dtype, order="F")
+            for column, (_, values, mean, scale, *_) in enumerate(sources):
+                np.subtract(values[start:stop], mean, out=block[:, column], casting="same_kind")
+                block[:, column] *= scale
+            present = None
+            if len(incomplete):
+                missing = np.isnan(block[:, incomplete])
+                block[:, incomplete] = np.where(missing, 0, block[:, incomplete])
+                present = (~missing).astype(self.dtype)
+            # block.T @ block is recognized as symmetric and computed in half the time
+            changed = block if full else block[:, positions]
+            products += block.T @ changed
+            if present is None:
+                continue
+            if not full:
+                own_sums[:, incomplete] += changed.T @ present
+                own_squares[:, incomplete] += np.square(changed).T @ present
+            if len(changed_incomplete):
+                changed_present = present[:, np.searchsorted(incomplete, positions[changed_incomplete])]
+                count[incomplete_pairs] += present.T @ changed_present
+                sums[:, changed_incomplete] += block.T @ changed_present
+                squares[:, changed_incomplete] += np.square(block).T @ changed_present
+
+        if full:
+            own_sums, own_squares = sums, squares
+        for statistic, column, row in ((self._count, count, count.T), (self._products, products, products.T),
+                                       (self._sums, sums, own_sums), (self._squares, squares, own_squares)):
+            statistic[:, positions] = column
+            statistic[positions, :] = row
+
+    def _positions(self, features):
+        position = {name: index for index, name in enumerate(self.columns)}
+        names = self.columns if features is None else list(features)
+        missing = [name for name in names if name not in position]
+        if missing:
+            raise ValueError(f"Columns without correlation statistics: {missing}")
+        return names, np.array([position[name] for name in names], dtype=np.intp)
+
+    def _correlations(self, rows, columns):
+        """Correlations and shared row counts between the columns at ``rows`` and at ``columns``."""
+        pairs, transposed = np.ix_(rows, columns), np.ix_(columns, rows)
+        count, products = self._count[pairs], self._products[pairs]
+        sums, other_sums = self._sums[pairs], self._sums[transposed].T
+        squares, other_squares = self._squares[pairs], self._squares[transposed].T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = (count * squares - sums ** 2) * (count * other_squares - other_sums ** 2)
+            correlation = (count * products - sums * other_sums) / np.sqrt(variance)
+        correlation[(count < 2) | ~(variance > 0)] = np.nan
+        np.clip(correlation, -1.0, 1.0, out=correlation)
+        same = rows[:, None] == columns[None, :]
+        correlation[same & ~np.isnan(correlation)] = 1.0
+        return correlation, count
+
+    def matrix(self, features=None):
+        """Correlation matrix of all columns, or of ``features``, as a DataFrame."""
+        names, positions = self._positions(features)
+        correlation, _ = self._correlations(positions, positions)
+        return pd.DataFrame(correlation, index=names, columns=names)
+
+    def strongest_pairs(self, k=20, features=None, block_rows=PAIRS_BLOCK_ROWS):
+        """The ``k`` pairs of different columns with the largest absolute correlation, strongest first.
+
+        Only one block of rows of the correlation matrix exists at a time, and
+        each block passes on its own ``k`` strongest pairs.
+        """
+        names, positions = self._positions(features)
+        candidates = [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0), np.empty(0))]
+        for start in range(0, len(positions), block_rows):
+            rows = positions[start:start + block_rows]
+            # Upper triangle only: every pair once, without the diagonal
+            correlation, count = self._correlations(rows, positions[start:])
+            first, second = np.nonzero(np.arange(len(rows))[:, None] < np.arange(len(positions) - start)[None, :])
+            values = correlation[first, second]
+            keep = np.flatnonzero(~np.isnan(values))
+            if len(keep) > k:
+                keep = keep[np.argpartition(-np.abs(values[keep]), k)[:k]]
+            candidates.append((first[keep] + start, second[keep] + start, values[keep], count[first[keep], second[keep]]))
+
+        first, second, values, shared = (np.concatenate(parts) for parts in zip(*candidates))
+        order = np.argsort(-np.abs(values), kind="stable")[:k]
+        return pd.DataFrame({
+            "Feature 1": [names[index] for index in first[order]],
+            "Feature 2": [names[index] for index in second[order]],
+            "Correlation": values[order],
+            "Rows": shared[order].astype(np.int64),
+        })
@@ -0,0 +1,450 @@
+import gzip
+import hashlib
+import io
+import os
+import time
+import uuid
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+from pandas.api.types import union_categoricals, is_bool_dtype, is_float_dtype, is_integer_dtype, is_numeric_dtype
+
+try:
+    import zstandard
+except ImportError:  # optional, enables zstd-compressed CSV downloads
+    zstandard = None
+
+# Copy-on-write lets every session work on a cheap shallow copy of the shared
+# parsed frame; it is always on from pandas 3.0 onwards.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Number of distinct uploads kept parsed in memory across all sessions.
+MAX_CACHED_DATASETS = 8
+
+# Streaming ingestion: rows parsed per chunk, and the limits under which a text
+# column of the first chunk is stored as a category.
+CSV_CHUNK_ROWS = 200_000
+CATEGORY_MAX_UNIQUE = 1_000
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Parsed uploads and saved checkpoints are kept here as Arrow IPC files so they can
+# be memory-mapped back without parsing text again. The directory is shared by all
+# sessions, so every kind of file is cleaned up when a new one is written: files
+# unused for longer than their maximum age go first, then the least recently used
+# ones until the rest fit into the size limit. Reading a file marks it as used.
+WORKING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "working_datasets")
+CHECKPOINT_DIR = os.path.join(WORKING_DIR, "checkpoints")
+WORKING_COPY_MAX_BYTES = 2 * 1024 ** 3
+WORKING_COPY_MAX_AGE = 7 * 24 * 3600
+CHECKPOINT_MAX_BYTES = 4 * 1024 ** 3
+CHECKPOINT_MAX_AGE = 30 * 24 * 3600
+
+UPLOAD_TYPES = ["csv", "xlsx", "parquet", "arrow", "feather"]
+
+# Download format label -> (file extension, mime type)
+DOWNLOAD_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+# CSV download compression label -> (file name suffix, mime type)
+CSV_COMPRESSIONS = {"None": ("", "text/csv"), "gzip": (".gz", "application/gzip")}
+if zstandard is not None:
+    CSV_COMPRESSIONS["zstd"] = (".zst", "application/zstd")
+
+# Rows serialized per step when writing CSV, Parquet row groups and Arrow batches.
+CSV_WRITE_CHUNK_ROWS = 100_000
+WRITE_CHUNK_ROWS = 1_000_000
+
+# Prepared downloads are spooled to files here, one per dataset version, format
+# and compression, and cleaned up like the working copies.
+DOWNLOAD_DIR = os.path.join(WORKING_DIR, "downloads")
+MAX_DOWNLOAD_CACHE_BYTES = 1024 ** 3
+DOWNLOAD_MAX_AGE = 24 * 3600
+
+
+def content_hash(raw):
+    """Return a hex digest identifying the uploaded bytes."""
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def infer_compact_schema(sample):
+    """Infer a compact dtype for every column of a sample frame.
+
+    Returns a dict mapping column name to one of ``"bool"`` (0/1 flags without
+    missing values), ``"integer"``, ``"float"``, ``"category"`` (low-cardinality
+    text) or ``None`` when the column is kept as parsed.
+    """
+    schema = {}
+    for column in sample.columns:
+        values = sample[column]
+        if is_bool_dtype(values.dtype):
+            schema[column] = "bool"
+        elif is_integer_dtype(values.dtype):
+            is_flag = values.isin([0, 1]).all() and values.nunique() == 2
+            schema[column] = "bool" if is_flag else "integer"
+        elif is_float_dtype(values.dtype):
+            schema[column] = "float"
+        else:
+            n_unique = values.nunique(dropna=True)
+            is_low_cardinality = (
+                n_unique <= CATEGORY_MAX_UNIQUE
+                and n_unique <= CATEGORY_MAX_UNIQUE_RATIO * max(len(values), 1)
+            )
+            schema[column] = "category" if is_low_cardinality else None
+    return schema
+
+
+def _compact_chunk(chunk, schema):
+    """Downcast one parsed chunk according to the inferred schema."""
+    for column, kind in schema.items():
+        values = chunk[column]
+        if kind in ("bool", "integer") and is_integer_dtype(values.dtype):
+            chunk[column] = pd.to_numeric(values, downcast="integer")
+        elif kind in ("integer", "float") and is_numeric_dtype(values.dtype):
+            chunk[column] = pd.to_numeric(values, downcast="float")
+        elif kind == "category" and values.dtype != "category":
+            chunk[column] = values.astype("category")
+    return chunk
+
+
+def read_csv_streaming(source, chunksize=CSV_CHUNK_ROWS):
+    """Read a CSV in chunks into a frame with compact dtypes.
+
+    The schema is inferred from the first ``chunksize`` rows; each chunk is downcast
+    before the next one is parsed, so peak memory stays near the size of the compact
+    result instead of raw bytes + decoded text + a full float64/object frame. Columns
+    whose later chunks contradict the sample (e.g. text in a numeric column) fall
+    back to the common type pandas picks when combining them.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as handle:
+            return read_csv_streaming(handle, chunksize)
+
+    start = source.tell()
+    schema = infer_compact_schema(pd.read_csv(source, nrows=chunksize, encoding="utf-8"))
+    source.seek(start)
+
+    category_dtypes = {column: "category" for column, kind in schema.items() if kind == "category"}
+    chunks = [
+        _compact_chunk(chunk, schema)
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype=category_dtypes, encoding="utf-8")
+    ]
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in schema})
+
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk.pop(column) for chunk in chunks]
+        if all(part.dtype == "category" for part in parts):
+            combined = pd.Series(union_categoricals(parts, ignore_order=True), name=column)
+        else:
+            combined = pd.concat(parts, ignore_index=True)
+        if schema.get(column) == "bool" and is_integer_dtype(combined.dtype) and combined.isin([0, 1]).all():
+            combined = combined.astype(bool)
+        columns[column] = combined
+    return pd.DataFrame(columns)
+
+
+def write_arrow(df, path):
+    """Write a frame to an Arrow IPC file, replacing any previous file atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Sessions sharing a working copy may write it at the same time
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_arrow(path):
+    """Read an Arrow IPC file through a memory map (no text parsing)."""
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def read_dataset(source, file_name, streaming=False):
+    """Read a dataset from a path or binary file object based on its extension."""
+    if file_name.endswith('.csv'):
+        if streaming:
+            return read_csv_streaming(source)
+        return pd.read_csv(source, encoding="utf-8")
+    elif file_name.endswith('.xlsx'):
+        return pd.read_excel(source)
+    elif file_name.endswith('.parquet'):
+        return pd.read_parquet(source)
+    elif file_name.endswith(('.arrow', '.feather')):
+        if isinstance(source, str):
+            return read_arrow(source)
+        return pa.ipc.open_file(source).read_all().to_pandas()
+    raise ValueError(f"Unsupported file type: {file_name}")
+
+
+def write_csv_chunks(df, stream, chunksize=CSV_WRITE_CHUNK_ROWS):
+    """Write a frame as UTF-8 CSV to a binary stream, ``chunksize`` rows at a time.
+
+    Only one chunk of text exists at any moment, so large frames never need the
+    whole CSV document in memory as a single string.
+    """
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8", newline="", write_through=True)
+    try:
+        if len(df) == 0:
+            df.to_csv(text_stream, index=False)
+        for start in range(0, len(df), chunksize):
+            df.iloc[start:start + chunksize].to_csv(text_stream, index=False, header=start == 0)
+    finally:
+        # Keep the underlying stream open for the caller
+        text_stream.detach()
+
+
+def write_dataset(df, stream, file_format, compression="None"):
+    """Serialize a frame as ``"csv"``, ``"parquet"`` or ``"arrow"`` to a binary stream.
+
+    Rows are converted and written in chunks, so only one chunk exists as text
+    or as an Arrow table at a time. ``compression`` (one of ``CSV_COMPRESSIONS``)
+    only applies to CSV; the columnar formats use their own encodings.
+    """
+    if file_format == "csv":
+        if compression == "gzip":
+            with gzip.GzipFile(fileobj=stream, mode="wb", compresslevel=6) as compressed:
+                write_csv_chunks(df, compressed)
+        elif compression == "zstd" and zstandard is not None:
+            with zstandard.ZstdCompressor().stream_writer(stream, closefd=False) as compressed:
+                write_csv_chunks(df, compressed)
+        else:
+            write_csv_chunks(df, stream)
+    elif file_format in ("parquet", "arrow"):
+        # Every chunk is converted with the schema of the whole frame, so the batches line up
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        writer = pq.ParquetWriter(stream, schema) if file_format == "parquet" else pa.ipc.new_file(stream, schema)
+        with writer:
+            for start in range(0, max(len(df), 1), WRITE_CHUNK_ROWS):
+                writer.write_table(pa.Table.from_pandas(df.iloc[start:start + WRITE_CHUNK_ROWS], schema=schema,
+                                                        preserve_index=False))
+    else:
+        raise ValueError(f"Unsupported download format: {file_format}")
+
+
+def dataset_to_bytes(df, file_format, compression="None"):
+    """Serialize a frame to ``"csv"``, ``"parquet"`` or ``"arrow"`` bytes (see ``write_dataset``)."""
+    buffer = BytesIO()
+    write_dataset(df, buffer, file_format, compression)
+    return buffer.getvalue()
+
+
+def evict_files(directory, max_bytes, max_age, keep=None):
+    """Remove the files of ``directory`` unused for ``max_age`` seconds, then the least recently used beyond ``max_bytes``.
+
+    ``keep`` is never removed, and neither are temporary files still being
+    written (``.tmp`` files younger than ``max_age``). Files removed by another
+    process in the meantime are skipped.
+    """
+    if not os.path.isdir(directory):
+        return
+    now = time.time()
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.path == keep or not entry.is_file():
+            continue
+        try:
+            info = entry.stat()
+            if now - info.st_mtime > max_age:
+                os.remove(entry.path)
+            elif not entry.name.endswith(".tmp"):
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in entries) + (os.path.getsize(keep) if keep else 0)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _spool(path, write):
+    """Write a download file through ``write(handle)``, atomically, and return its path."""
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as handle:
+            write(handle)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict_files(DOWNLOAD_DIR, MAX_DOWNLOAD_CACHE_BYTES, DOWNLOAD_MAX_AGE, keep=path)
+    return path
+
+
+def _download_path(version, file_format, compression="None"):
+    key = hashlib.blake2b(f"{version}|{file_format}|{compression}".encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(DOWNLOAD_DIR, f"{key}.{file_format}")
+
+
+def prepare_download(df, version, file_format, compression="None"):
+    """Path of a file holding the download payload of a dataset version.
+
+    The payload is written straight to a file in ``DOWNLOAD_DIR`` on first use
+    and reused for later requests of the same version, format and compression
+    (version tokens are unique per session, so sessions do not share files);
+    the frame itself is not kept anywhere.
+    """
+    path = _download_path(version, file_format, compression)
+    if os.path.exists(path):
+        # Mark it as recently used
+        os.utime(path)
+        return path
+    return _spool(path, lambda handle: write_dataset(df, handle, file_format, compression))
+
+
+def spool_csv_download(chunks, version):
+    """Write frames to one CSV download file as they are produced and return its path.
+
+    Only one chunk is held at a time; ``version`` must be unique per payload,
+    like the versions of ``prepare_download``.
+    """
+    def write(handle):
+        for position, chunk in enumerate(chunks):
+            chunk.to_csv(handle, header=position == 0, index=False, encoding="utf-8")
+    return _spool(_download_path(version, "csv"), write)
+
+
+def read_download(path):
+    """Bytes of a spooled download file."""
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+def _download_bytes(df, version, file_format, compression):
+    return read_download(prepare_download(df, version, file_format, compression))
+
+
+def lazy_download(df, version, file_format, compression="None"):
+    """Return a callable producing the download bytes for ``st.download_button``.
+
+    Nothing is serialized until the user clicks download; the payload is
+    spooled to a file per dataset version, format and compression, so repeated
+    clicks only read it back. ``st.download_button`` keeps the bytes in its
+    in-memory media storage to serve them; it cannot stream a file.
+    """
+    return lambda: _download_bytes(df, version, file_format, compression)
+
+
+def _working_path(digest, streaming):
+    suffix = "compact" if streaming else "plain"
+    return os.path.join(WORKING_DIR, f"{digest}-{suffix}.arrow")
+
+
+@st.cache_resource(max_entries=MAX_CACHED_DATASETS, show_spinner="Parsing dataset...")
+def _parse_upload(digest, file_name, streaming, _source):
+    """Parse an upload once per content hash; the frame is shared by every session.
+
+    Only ``digest``, ``file_name`` and ``streaming`` take part in the cache key, the
+    file object is passed along (underscore prefix) so Streamlit does not hash it again.
+    Parsed text uploads are also written to an Arrow working copy, so after a server
+    restart the same bytes are memory-mapped back instead of parsed again.
+    """
+    working_path = _working_path(digest, streaming)
+    if os.path.exists(working_path):
+        try:
+            os.utime(working_path)
+            return read_arrow(working_path)
+        except (FileNotFoundError, pa.ArrowException):
+            # Removed by a cleanup in the meantime (or damaged); parse the upload again
+            pass
+
+    _source.seek(0)
+    df = read_dataset(_source, file_name, streaming)
+    if file_name.endswith(('.csv', '.xlsx')):
+        try:
+            write_arrow(df, working_path)
+            evict_files(WORKING_DIR, WORKING_COPY_MAX_BYTES, WORKING_COPY_MAX_AGE, keep=working_path)
+        except (OSError, pa.ArrowException):
+            # The working copy is only an accelerator; parsing again is always possible
+            pass
+    return df
+
+
+def load_uploaded_dataset(uploaded_file, streaming=False):
+    """Return a private copy-on-write view of the parsed upload and its content hash.
+
+    The parsed frame itself is cached and shared, so callers must never mutate it
+    directly; the shallow copy returned here is safe to edit in place. With
+    ``streaming`` set, CSV files are read in chunks with compact dtypes.
+    """
+    digest = content_hash(uploaded_file.getvalue())
+    shared_df = _parse_upload(digest, uploaded_file.name, streaming, uploaded_file)
+    return shared_df.copy(deep=False), digest
+
+
+def session_id():
+    """Identifier of the current browser session, kept in its session state."""
+    return st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+
+def _checkpoint_path(session, name):
+    # Checkpoints of all sessions share one directory (and its eviction); the
+    # session prefix keeps their names apart
+    return os.path.join(CHECKPOINT_DIR, f"{session}-{name}.arrow")
+
+
+def save_checkpoint(df, name, session):
+    """Save the working dataset of ``session`` under ``name`` as an Arrow IPC file."""
+    safe_name = "".join(ch for ch in name if ch.isalnum() or ch in "-_ ").strip()
+    if not safe_name:
+        raise ValueError("Please provide a checkpoint name.")
+    path = _checkpoint_path(session, safe_name)
+    write_arrow(df, path)
+    evict_files(CHECKPOINT_DIR, CHECKPOINT_MAX_BYTES, CHECKPOINT_MAX_AGE, keep=path)
+    return safe_name
+
+
+def list_checkpoints(session):
+    """Return the names of the working dataset checkpoints saved by ``session``."""
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return []
+    prefix = f"{session}-"
+    return sorted(
+        name[len(prefix):-len(".arrow")] for name in os.listdir(CHECKPOINT_DIR)
+        if name.startswith(prefix) and name.endswith(".arrow")
+    )
+
+
+def load_checkpoint(name, session):
+    """Memory-map a saved checkpoint back into a frame, or return ``None`` once it has been removed."""
+    path = _checkpoint_path(session, name)
+    try:
+        os.utime(path)
+        return read_arrow(path)
+    except (FileNotFoundError, pa.ArrowException):
+        # Evicted by a cleanup in the meantime (or damaged)
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a dataset to a columnar format.")
+    parser.add_argument("input", help="Input file (.csv, .xlsx, .parquet, .arrow)")
+    parser.add_argument("output", help="Output file (.csv, .parquet, .arrow)")
+    parser.add_argument("--streaming", action="store_true", help="Read CSV input with compact dtypes")
+    args = parser.parse_args()
+
+    data = read_dataset(args.input, args.input, args.streaming)
+    with open(args.output, "wb") as out:
+        write_dataset(data, out, os.path.splitext(args.output)[1].lstrip("."))
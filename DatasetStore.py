@@ -0,0 +1,342 @@
+import uuid
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pandas.api.types import is_numeric_dtype
+
+from CorrelationEngine import CorrelationMatrix
+from Sketches import profile_column
+
+# Versions kept per session besides the original one, which is never evicted.
+MAX_VERSIONS = 20
+
+# A version either holds all of its columns (``base`` is None), or it is a
+# selection of the rows of a ``base`` version that holds all columns: ``rows``
+# are the positions of its rows in the base, and ``columns`` only holds the
+# columns changed since the rows were selected; its ``index`` is None and taken
+# from the base on request. ``names`` is the column order and ``origin_rows``
+# (versions with all columns only) the positions of the rows in the original
+# version, None when they are not known.
+DatasetVersion = namedtuple(
+    'DatasetVersion', ['number', 'operation', 'index', 'columns', 'changed', 'names', 'base', 'rows', 'origin_rows']
+)
+
+
+def _same_data(old, new):
+    """Cheap check whether two columns hold the same values."""
+    if old is new:
+        return True
+    if old.dtype != new.dtype or len(old) != len(new):
+        return False
+    old_values, new_values = old.array, new.array
+    if isinstance(old_values, pd.arrays.NumpyExtensionArray) and isinstance(new_values, pd.arrays.NumpyExtensionArray):
+        old_np, new_np = old_values.to_numpy(), new_values.to_numpy()
+        # Untouched columns of a copy-on-write view still point at the same buffer
+        if old_np.__array_interface__['data'] == new_np.__array_interface__['data'] and old_np.strides == new_np.strides:
+            return True
+    return old.equals(new)
+
+
+def _take(column, rows, index):
+    """The values of ``column`` at the positions ``rows``, labelled with ``index``."""
+    return column.take(rows).set_axis(index)
+
+
+class DatasetStore:
+    """Versioned working dataset with structural sharing between versions.
+
+    Each version maps column names to column objects; a commit only stores new
+    objects for the columns that changed and reuses the previous ones for all
+    others. Thanks to copy-on-write the unchanged columns share memory with the
+    live frame, so a version costs roughly the size of the data it changed.
+    Commits that only keep some of the rows (deleted rows, dropped duplicates or
+    outliers) store the positions of the kept rows instead of new columns; their
+    columns are taken from the base version when they are materialized.
+    """
+
+    def __init__(self, df, operation="load", max_versions=MAX_VERSIONS):
+        self.store_id = uuid.uuid4().hex
+        self.max_versions = max_versions
+        self._versions = OrderedDict()
+        self._next_number = 0
+        # (version, index, column name -> column object) of the latest version when
+        # it is a row selection; these are the committed frame's own objects
+        self._head = (None, None, {})
+        # Column name -> (column object, profile) for the latest profiled version
+        self._profiles = {}
+        # Correlation method -> CorrelationMatrix of the latest correlated version
+        self._correlations = {}
+        columns = {column: df[column] for column in df.columns}
+        self._add_version(DatasetVersion(None, operation, df.index, columns, list(df.columns), list(df.columns),
+                                         None, None, np.arange(len(df))))
+
+    @property
+    def version(self):
+        """Number of the latest version."""
+        return next(reversed(self._versions))
+
+    @property
+    def token(self):
+        """Identifier of the latest version, unique across sessions."""
+        return f"{self.store_id}-{self.version}"
+
+    @property
+    def original(self):
+        return self._versions[next(iter(self._versions))]
+
+    @property
+    def head(self):
+        return self._versions[self.version]
+
+    def _add_version(self, version):
+        number = self._next_number
+        self._next_number += 1
+        self._versions[number] = version._replace(number=number)
+        self._head = (None, None, {})
+        # Evict the oldest intermediate versions, never the original; row
+        # selections keep their base alive as long as they are retained
+        while len(self._versions) > self.max_versions + 1:
+            intermediate = list(self._versions)[1]
+            del self._versions[intermediate]
+        return number
+
+    def index(self, version=None):
+        """Row index of a version (latest by default)."""
+        version = self.head if version is None else version
+        if version.base is None:
+            return version.index
+        head_version, head_index, _ = self._head
+        return head_index if head_version is version else version.base.index[version.rows]
+
+    def columns(self, version=None):
+        """Column name -> column object of every column of a version (latest by default).
+
+        The columns of a row selection are taken from its base, except for the
+        latest version, whose committed columns are kept.
+        """
+        version = self.head if version is None else version
+        if version.base is None:
+            return version.columns
+        head_version, _, head_columns = self._head
+        if head_version is version:
+            return head_columns
+        index = self.index(version)
+        return {name: version.columns[name] if name in version.columns
+                else _take(version.base.columns[name], version.rows, index) for name in version.names}
+
+    def column(self, version, name):
+        """One column of a version, or ``None`` when the version does not have it."""
+        if name not in version.names:
+            return None
+        if version.base is None or name in version.columns:
+            return version.columns[name]
+        head_version, _, head_columns = self._head
+        if head_version is version:
+            return head_columns[name]
+        return _take(version.base.columns[name], version.rows, self.index(version))
+
+    def _kept_rows(self, head, index):
+        """Positions of the rows of ``index`` in the latest version, or None when they are not all there."""
+        if len(index) == 0:
+            return None
+        head_index = self.index(head)
+        labels, kept = head_index.to_numpy(), index.to_numpy()
+        if labels.dtype.kind in "iuf" and kept.dtype.kind in "iuf" and (labels[1:] > labels[:-1]).all():
+            # Sorted unique labels (the usual case) are found by binary search, which
+            # unlike get_indexer leaves no hash table cached on every version's index
+            positions = np.minimum(np.searchsorted(labels, kept), len(labels) - 1)
+            return positions if (labels[positions] == kept).all() else None
+        if not head_index.is_unique:
+            return None
+        positions = head_index.get_indexer(index)
+        return positions if (positions >= 0).all() else None
+
+    def commit(self, df, operation="update", columns=None):
+        """Record ``df`` as a new version and return its number.
+
+        ``columns`` names the columns the caller changed; when omitted they are
+        detected. Nothing is recorded when ``df`` equals the latest version.
+        """
+        head = self.head
+        head_columns = self.columns(head)
+        head_index = self.index(head)
+        same_rows = df.index is head_index or df.index.equals(head_index)
+        positions = None if same_rows else self._kept_rows(head, df.index)
+        candidates = set(df.columns) if columns is None or (not same_rows and positions is None) else set(columns)
+
+        changed = []
+        for column in df.columns:
+            previous = head_columns.get(column)
+            if previous is None or column in candidates and not (
+                _same_data(previous, df[column]) if same_rows
+                else positions is not None and _same_data(_take(previous, positions, df.index), df[column])
+            ):
+                changed.append(column)
+
+        if same_rows and not changed and list(df.columns) == list(head.names):
+            return self.version
+
+        names = list(df.columns)
+        if positions is None and not same_rows:
+            # Rows that are not a selection of the latest ones: store every column
+            origin = self.original.index.get_indexer(df.index) if self.original.index.is_unique else None
+            return self._add_version(DatasetVersion(None, operation, df.index, {name: df[name] for name in names},
+                                                    changed, names, None, None, origin))
+
+        # Unchanged columns keep their objects as long as the rows stay the same
+        current = {name: head_columns[name] if same_rows and name not in changed else df[name] for name in names}
+        if head.base is None and same_rows:
+            return self._add_version(DatasetVersion(None, operation, df.index, current, changed, names,
+                                                    None, None, head.origin_rows))
+
+        # A row selection: only the columns that differ from the base are stored
+        base = head if head.base is None else head.base
+        if same_rows:
+            rows = head.rows
+        else:
+            rows = positions.astype(np.int32 if len(base.index) < 2 ** 31 else np.int64)
+            rows = rows if head.base is None else head.rows[rows]
+        own = {name: current[name] for name in names
+               if name in changed or name not in base.columns or (head.base is not None and name in head.columns)}
+        number = self._add_version(DatasetVersion(None, operation, None, own, changed, names, base, rows, None))
+        self._head = (self.head, df.index, current)
+        return number
+
+    def _origin_rows(self, version):
+        if version.base is None:
+            return version.origin_rows
+        base_origin = version.base.origin_rows
+        return None if base_origin is None else base_origin[version.rows]
+
+    def materialize(self, number=None, rows=None):
+        """Rebuild the frame of a version (latest by default), or only the rows at positions ``rows``."""
+        version = self.head if number is None else self._versions[number]
+        index = self.index(version)
+        if rows is None:
+            columns = self.columns(version)
+        elif version.base is None or self._head[0] is version:
+            index = index[rows]
+            columns = {name: values.iloc[rows] for name, values in self.columns(version).items()}
+        else:
+            index = index[rows]
+            columns = {name: version.columns[name].iloc[rows] if name in version.columns
+                       else _take(version.base.columns[name], version.rows[rows], index) for name in version.names}
+        if not columns:
+            return pd.DataFrame(index=index)
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def has_version(self, number):
+        return number in self._versions
+
+    def get_version(self, number):
+        """Return a retained version, or ``None`` once it has been evicted."""
+        return self._versions.get(number)
+
+    def previous_version(self, number):
+        """Number of the retained version recorded just before ``number``."""
+        numbers = list(self._versions)
+        position = numbers.index(number)
+        return numbers[position - 1] if position > 0 else None
+
+    def original_column(self, column, index=None):
+        """Return the original values of ``column`` aligned to ``index`` (the latest rows by default).
+
+        Rows are matched by their positions in the original version, so
+        duplicate labels are fine; rows that did not exist originally get
+        missing values. ``None`` is returned when the column did not exist
+        originally or the original positions of the rows are not known.
+        """
+        original = self.original.columns.get(column)
+        if original is None:
+            return None
+        head = self.head
+        head_index = self.index(head)
+        if index is None or index is head_index or index.equals(head_index):
+            origin = self._origin_rows(head)
+            index = head_index
+        elif index.equals(self.original.index):
+            origin = self.original.origin_rows
+        elif self.original.index.is_unique:
+            origin = self.original.index.get_indexer(index)
+        else:
+            return None
+        if origin is None:
+            return None
+        if len(origin) == len(original) and (origin == np.arange(len(original))).all():
+            return original.set_axis(index)
+        if (origin >= 0).all():
+            return _take(original, origin, index)
+        return pd.Series(original.array.take(origin, allow_fill=True), index=index, name=original.name)
+
+    def column_profiles(self):
+        """``Sketches.ColumnProfile`` of every column of the latest version.
+
+        Profiles are kept with the column objects they describe; since commits
+        reuse the objects of unchanged columns, only the columns replaced since
+        the last call are profiled again.
+        """
+        profiles = {}
+        for column, values in self.columns().items():
+            cached = self._profiles.get(column)
+            profiles[column] = cached if cached is not None and cached[0] is values else (values, profile_column(values))
+        self._profiles = profiles
+        return {column: profile for column, (_, profile) in profiles.items()}
+
+    def correlations(self, method="pearson"):
+        """``CorrelationMatrix`` of the numeric and boolean columns of the latest version.
+
+        Like the profiles, the statistics of columns no commit replaced are kept,
+        so only edited columns are correlated again.
+        """
+        columns = {column: values for column, values in self.columns().items() if is_numeric_dtype(values.dtype)}
+        if method not in self._correlations:
+            self._correlations[method] = CorrelationMatrix(method)
+        return self._correlations[method].update(columns, self.index())
+
+    def history(self):
+        """Return (number, operation, changed columns) for every retained version."""
+        return [(version.number, version.operation, version.changed) for version in self._versions.values()]
+
+
+def init_dataset(df, operation="load"):
+    """Start a new versioned store for a freshly loaded dataset."""
+    store = DatasetStore(df, operation)
+    st.session_state["dataset_store"] = store
+    st.session_state["data"] = df.copy(deep=False)
+    # Log entries only claim versions committed after the load
+    st.session_state["change_log_version"] = store.version
+    return store
+
+
+def get_dataset_store():
+    """Return the session's dataset store, creating one from ``data`` if needed."""
+    if "dataset_store" not in st.session_state:
+        return init_dataset(st.session_state["data"])
+    return st.session_state["dataset_store"]
+
+
+def dataset_version():
+    """Return a token identifying the current committed state of the working dataset.
+
+    Tokens are unique across sessions, so they can key process-wide caches.
+    """
+    return get_dataset_store().token
+
+
+def commit_dataset(df, operation="update", columns=None):
+    """Make ``df`` the working dataset and record it as a new version.
+
+    A shallow copy is stored, so later in-place edits of ``df`` do not leak into
+    the session until they are committed again.
+    """
+    get_dataset_store().commit(df, operation, columns)
+    st.session_state["data"] = df.copy(deep=False)
+
+
+def original_column(df, column):
+    """Original values of ``column`` aligned to the rows still present in ``df``."""
+    if "dataset_store" not in st.session_state and "data" not in st.session_state:
+        return None
+    return get_dataset_store().original_column(column, df.index)
@@ -0,0 +1,118 @@
+"""Rendered-figure cache shared by every plot of the app.
+
+Plots are drawn once per key, saved as PNG bytes and shown with ``st.image``;
+the matplotlib figure is closed right after rendering, so no figure objects
+outlive a rerun. Keys start with the dataset version token from
+``DatasetStore.dataset_version()``, followed by the column, plot type and
+plot options, so a committed change naturally invalidates its plots.
+"""
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import matplotlib.pyplot as plt
+import streamlit as st
+
+# Memory budget of the rendered images kept across reruns and sessions.
+FIGURE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+FIGURE_DPI = 100
+
+
+class FigureCache:
+    """Thread-safe LRU cache of PNG images bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes=FIGURE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._images[key] = image
+            self.total_bytes += len(image)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._images)
+
+
+@st.cache_resource
+def get_figure_cache():
+    """The process-wide figure cache."""
+    return FigureCache()
+
+
+# pyplot keeps global state, so figures are drawn one at a time across sessions
+_render_lock = threading.Lock()
+
+
+def _to_png(fig):
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight", dpi=FIGURE_DPI)
+    return buffer.getvalue()
+
+
+def render_figure(key, draw, figsize=None):
+    """Return the PNG of ``draw(ax)`` for ``key``, drawing it only on a cache miss."""
+    cache = get_figure_cache()
+    image = cache.get(key)
+    if image is None:
+        with _render_lock:
+            fig, ax = plt.subplots(figsize=figsize)
+            try:
+                draw(ax)
+                image = _to_png(fig)
+            finally:
+                plt.close(fig)
+        cache.put(key, image)
+    return image
+
+
+def render_figure_grid(key, build):
+    """Like ``render_figure`` for plots that create their own figure (e.g. ``sns.pairplot``).
+
+    ``build()`` returns the figure or seaborn grid it drew.
+    """
+    cache = get_figure_cache()
+    image = cache.get(key)
+    if image is None:
+        with _render_lock:
+            existing = set(plt.get_fignums())
+            try:
+                drawn = build()
+                image = _to_png(getattr(drawn, "figure", drawn))
+            finally:
+                # Also closes the figures of a build() that raised before returning one
+                for number in set(plt.get_fignums()) - existing:
+                    plt.close(number)
+        cache.put(key, image)
+    return image
+
+
+def show_figure(key, draw, figsize=None):
+    """Show the cached rendering of ``draw(ax)`` for ``key``."""
+    st.image(render_figure(key, draw, figsize))
+
+
+def show_figure_grid(key, build):
+    st.image(render_figure_grid(key, build))
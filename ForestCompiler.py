@@ -0,0 +1,158 @@
+"""Flattened random forest inference with vectorized tree traversal.
+
+``CompiledForest`` copies the nodes of every tree of a fitted
+``RandomForestClassifier`` into a single set of flat NumPy arrays (feature,
+threshold, children, missing-value direction and leaf class fractions).
+Prediction then walks all trees for all rows at once, one tree level per step,
+instead of calling every tree separately, which removes most of the per-call
+overhead of scikit-learn for single rows and small batches. Larger batches,
+where scikit-learn's compiled trees are faster, are handed to the forest itself.
+
+Results are bit-for-bit the ones of scikit-learn: inputs are compared as
+float32 like the trees do, and the per-tree probabilities are accumulated in
+tree order before dividing by the number of trees. ``compile_for_inference``
+checks this on sample rows before a compiled forest is used, and falls back to
+the forest itself when the check fails.
+"""
+import logging
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+# Up to this many rows the flattened traversal beats calling the trees.
+COMPILED_MAX_ROWS = 128
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledForest:
+    """Drop-in ``predict``/``predict_proba`` replacement for a fitted random forest."""
+
+    def __init__(self, forest, max_rows=COMPILED_MAX_ROWS):
+        if not isinstance(forest, RandomForestClassifier):
+            raise TypeError("Only RandomForestClassifier models can be compiled.")
+        if forest.n_outputs_ != 1:
+            raise ValueError("Multi-output forests are not supported.")
+
+        self.forest = forest
+        self.max_rows = max_rows
+        self.classes_ = forest.classes_
+        self.n_classes_ = len(forest.classes_)
+        self.n_features_in_ = forest.n_features_in_
+        self.n_trees = len(forest.estimators_)
+
+        features, thresholds, lefts, rights, leaves, missing_left, values, roots = [], [], [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(tree.children_left + offset)
+            rights.append(tree.children_right + offset)
+            leaves.append(is_leaf)
+            missing = getattr(tree, "missing_go_to_left", None)
+            missing_left.append(missing.astype(bool) if missing is not None else np.ones(tree.node_count, dtype=bool))
+            # Classifier trees store the class fractions of each node, which
+            # DecisionTreeClassifier.predict_proba returns as they are
+            values.append(tree.value[:, 0, :self.n_classes_])
+            roots.append(offset)
+            offset += tree.node_count
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.is_leaf = np.concatenate(leaves)
+        self.missing_go_to_left = np.concatenate(missing_left)
+        self.value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.intp)
+
+    def apply(self, X):
+        """Global index of the leaf every row reaches in every tree, shape (rows, trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        nodes = np.tile(self.roots, n_rows)
+        rows = np.repeat(np.arange(n_rows), self.n_trees)
+        flat_X = X.ravel()
+        has_missing = np.isnan(flat_X).any()
+
+        # Only (row, tree) pairs that have not reached a leaf yet move down a level
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while len(active):
+            current = nodes[active]
+            values = flat_X[rows[active] * n_features + self.feature[current]]
+            go_left = values <= self.threshold[current]
+            if has_missing:
+                go_left = np.where(np.isnan(values), self.missing_go_to_left[current], go_left)
+            following = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = following
+            active = active[~self.is_leaf[following]]
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the forest expects {self.n_features_in_}.")
+        if len(X) > self.max_rows:
+            return self.forest.predict_proba(X)
+        # cumsum adds the trees one after another, in the order scikit-learn does
+        proba = np.cumsum(self.value[self.apply(X)], axis=1)[:, -1]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def outputs_match(forest, compiled, X):
+    """True when the compiled forest reproduces the forest's outputs exactly on ``X``."""
+    X = np.asarray(X, dtype=np.float32)
+    expected = forest.predict_proba(X)
+    actual = np.vstack([compiled.predict_proba(X[start:start + compiled.max_rows])
+                        for start in range(0, len(X), compiled.max_rows)])
+    return np.array_equal(expected, actual)
+
+
+def threshold_rows(compiled, n_rows=COMPILED_MAX_ROWS * 4, random_state=0):
+    """Rows whose values sit on, just above and just below the split thresholds.
+
+    Used to check a compiled forest when no data is at hand; every value lands
+    next to a split of its feature, so both branches of many splits are taken.
+    Forests fitted on data with missing values have infinite thresholds (the
+    split only separates the missing rows), which scikit-learn refuses as
+    input, so those are skipped and neighbours that overflow keep the threshold.
+    """
+    rng = np.random.default_rng(random_state)
+    X = np.zeros((n_rows, compiled.n_features_in_), dtype=np.float32)
+    internal = ~compiled.is_leaf
+    for feature in range(compiled.n_features_in_):
+        thresholds = compiled.threshold[internal & (compiled.feature == feature)].astype(np.float32)
+        thresholds = thresholds[np.isfinite(thresholds)]
+        if len(thresholds):
+            values = rng.choice(thresholds, size=n_rows)
+            neighbours = np.nextafter(values, rng.choice([-np.inf, np.inf], size=n_rows).astype(np.float32))
+            X[:, feature] = np.where(np.isfinite(neighbours), neighbours, values)
+            X[::3, feature] = values[::3]
+    return X
+
+
+def compile_for_inference(model, X_check=None):
+    """Return a verified ``CompiledForest`` for a random forest, otherwise ``model`` itself.
+
+    The outputs are compared with the forest on ``X_check``, or on rows around
+    the split thresholds when no data is given. When they differ, or the check
+    itself fails, the reason is logged and the forest is returned unchanged.
+    """
+    if not isinstance(model, RandomForestClassifier) or model.n_outputs_ != 1:
+        return model
+    try:
+        compiled = CompiledForest(model)
+        if X_check is None:
+            X_check = threshold_rows(compiled)
+        if outputs_match(model, compiled, X_check):
+            return compiled
+        logger.warning("The compiled forest does not reproduce the forest's outputs; using the forest itself.")
+    except (TypeError, ValueError) as e:
+        logger.warning("Could not verify the compiled forest (%s); using the forest itself.", e)
+    return model
@@ -1,50 +1,52 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 import seaborn as sns
 import missingno as msno
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.utils.multiclass import type_of_target
-from sklearn.preprocessing import StandardScaler, MinMaxScaler, LabelEncoder
-from sklearn.compose import ColumnTransformer
-from scipy.stats import ttest_ind
-from collections import namedtuple
-from datetime import datetime
-from dataclasses import dataclass
+import json
 from PredictionManager import * 
+from DatasetStore import commit_dataset, original_column, dataset_version, get_dataset_store
+from CorrelationEngine import CORRELATION_METHODS, correlation_columns
+from ChangeLog import log_change, show_change_log
+from FigureCache import show_figure, show_figure_grid
+from Pipeline import make_step, apply_step, uncategorized
+from AnalysisEngine import (
+    AnalysisConfig, CorrelationResult,
+    missing_summary, outlier_bounds, outlier_rows, apply_outliers, compute_correlation, OUTLIER_METHODS,
+    outlier_bounds_table, outlier_mask, apply_outlier_table, outlier_steps,
+    compute_feature_importance, importance_table, run_statistical_test, fill_by_group, transform_column, FILL_METHODS,
+    MISSING_PLOT_MAX_ROWS, evenly_spaced_rows, missing_row_bins,
+    CORRELATION_MATRIX_MAX_COLUMNS, ANNOTATED_HEATMAP_MAX_COLUMNS, strongest_correlations
+)
+
+def restore_original(df, column):
+    """Generic function to restore original data of a column from the dataset store"""
+    original = original_column(df, column)
+    if original is None:
+        st.warning(f"No backup found for {column}.")
+    return original
+
+def _draw_missing_plot(ax, df, viz_type):
+    if viz_type == "Bar Plot":
+        msno.bar(df, ax=ax, color="skyblue")
+    elif viz_type == "Matrix Plot":
+        msno.matrix(evenly_spaced_rows(df), ax=ax, sparkline=False)
+    else:
+        # Fraction missing per row bin instead of one cell per row
+        sns.heatmap(missing_row_bins(df), cbar=True, cmap="YlOrRd", vmin=0, vmax=1, yticklabels=False, ax=ax)
 
-@dataclass
-class AnalysisConfig:
-    features_to_include: list
-    test_type: str
-    significance_level: float = 0.05
-
-def restore_original(df, key):
-    """Generic function to restore original data"""
-    if key in st.session_state:
-        return st.session_state[key].copy()
-    st.warning(f"No backup found for {key}.")
-    return None
+def _draw_value_counts(ax, values, title, color=None):
+    values.value_counts().plot(kind="bar", ax=ax, color=color)
+    ax.set_title(title)
+    ax.set_xlabel("Values")
+    ax.set_ylabel("Frequency")
 
 def missing_value_analysis(df):
     """Enhanced analysis and presentation of missing values using charts"""
     st.subheader("Missing Values Analysis")
     
-    # Calculate missing values
-    missing_values = df.isnull().sum()
-    missing_percentage = (missing_values / len(df)) * 100
-    
-    # Create a summary DataFrame
-    missing_summary = pd.DataFrame({
-        'Missing Values': missing_values,
-        'Percentage': missing_percentage.round(2)
-    })
-    
     # Display summary with improved formatting
     st.write("Missing Values Summary:")
-    st.table(missing_summary.style.background_gradient(cmap='YlOrRd'))
+    st.table(missing_summary(df).style.background_gradient(cmap='YlOrRd'))
 
     # Visualization options
     viz_type = st.selectbox(
@@ -54,37 +56,23 @@ def missing_value_analysis(df):
     
     fig_size = st.slider("Select Plot Size", 5, 15, 10)
     
-    viz_type == "Bar Plot"
-    st.write("### Bar Plot")
-    st.write("A bar plot shows the number of missing values for each column.")
-    fig, ax = plt.subplots(figsize=(fig_size, fig_size//2))
-    msno.bar(df, ax=ax, color="skyblue")
-    st.pyplot(fig)
-        
-    viz_type == "Matrix Plot"
-    st.write("### Matrix Plot")
-    st.write("A matrix plot shows the pattern of missing values in the dataset.")
-    fig, ax = plt.subplots(figsize=(fig_size, fig_size//2))
-    msno.matrix(df, ax=ax)
-    st.pyplot(fig)
-        
-    viz_type == "Heatmap"
-    st.write("### Heatmap")
-    st.write("A heatmap shows the presence of missing values in the dataset, with colors indicating the missingness.")
-    fig, ax = plt.subplots(figsize=(fig_size, fig_size//2))
-    sns.heatmap(df.isnull(), cbar=True, cmap="YlOrRd", ax=ax)
-    st.pyplot(fig)
-
-    log_change("missing_value_analysis", "N/A", "Performed missing value analysis")
+    descriptions = {
+        "Bar Plot": "A bar plot shows the number of missing values for each column.",
+        "Matrix Plot": "A matrix plot shows the pattern of missing values in the dataset.",
+        "Heatmap": "A heatmap shows the presence of missing values in the dataset, with colors indicating the missingness.",
+    }
+    st.write(f"### {viz_type}")
+    st.write(descriptions[viz_type])
+    if viz_type != "Bar Plot" and len(df) > MISSING_PLOT_MAX_ROWS:
+        summary = "row bins" if viz_type == "Heatmap" else "evenly spaced sample rows"
+        st.caption(f"{len(df):,} rows are shown as {MISSING_PLOT_MAX_ROWS:,} {summary}.")
+    show_figure((dataset_version(), None, viz_type, fig_size),
+                lambda ax: _draw_missing_plot(ax, df, viz_type), figsize=(fig_size, fig_size//2))
 
 
 def handle_object_column(df, selected_column):
     st.write(f"### Analysis for Column: {selected_column}")
     
-    # Save original state if not already saved
-    if f"original_{selected_column}" not in st.session_state:
-        st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
-    
     # Enhanced value counts display with search
     with st.expander("View Unique Values"):
         search_term = st.text_input("Search values", key=f"search_{selected_column}")
@@ -97,7 +85,7 @@ def handle_object_column(df, selected_column):
             st.write(f"Unique Values and Frequencies: { value_counts.count() }")   
             st.table(value_counts)
 
-    if df[selected_column].dtype == 'object':
+    if df[selected_column].dtype in ['object', 'category'] or pd.api.types.is_string_dtype(df[selected_column].dtype):
         actions = [
         "Rename Column",
         "Normalize",
@@ -142,7 +130,6 @@ def handle_object_column(df, selected_column):
         DeleteRowsColumns(df, selected_column)
 
 def NormalizeColumn(df, selected_column):
-    st.session_state["data"] = df
     st.subheader(f"Normalize Column: {selected_column}")
     st.write("### Normalization Options")
 
@@ -200,22 +187,22 @@ def NormalizeColumn(df, selected_column):
             help="Specify the character that will replace spaces in the column."
         )
 
+    # The same replayable step drives the preview, the saved change and batch runs
+    normalize_step = make_step(
+        "normalize_text",
+        column=selected_column,
+        strip=apply_strip,
+        lowercase=apply_lowercase,
+        uppercase=apply_uppercase,
+        replace_char=[char_to_replace, replacement_character] if apply_replace_char and char_to_replace and replacement_character else None,
+        replace_spaces=space_replacement if apply_replace_spaces and space_replacement else None,
+        remove_all_spaces=apply_remove_all_spaces
+    )
+
     if st.button("Apply Normalization (Preview Only)", key=f"apply_normalization_{selected_column}"):
         # Create a preview without altering the actual data
-        preview_df = df.copy()
         try:
-            if apply_strip:
-                preview_df[selected_column] = preview_df[selected_column].str.strip()
-            if apply_lowercase:
-                preview_df[selected_column] = preview_df[selected_column].str.lower()
-            if apply_uppercase:
-                preview_df[selected_column] = preview_df[selected_column].str.upper()
-            if apply_replace_char and char_to_replace and replacement_character:
-                preview_df[selected_column] = preview_df[selected_column].str.replace(char_to_replace, replacement_character, regex=False)
-            if apply_replace_spaces and space_replacement:
-                preview_df[selected_column] = preview_df[selected_column].str.replace(" ", space_replacement, regex=False)
-            if apply_remove_all_spaces:
-                preview_df[selected_column] = preview_df[selected_column].str.replace(" ", "", regex=False)
+            preview_df = apply_step(df, normalize_step)
 
             st.write("Unique Values and Frequencies (Preview After Normalization):")
             st.write(preview_df[selected_column].value_counts(dropna=False))
@@ -223,43 +210,28 @@ def NormalizeColumn(df, selected_column):
             st.error(f"An error occurred during normalization: {e}")
 
     if st.button("Save Changes", key=f"save_{selected_column}"):
-        if f"original_{selected_column}" not in st.session_state:
-            st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
-
         # Apply changes and save
         try:
-            if apply_strip:
-                df[selected_column] = df[selected_column].str.strip()
-            if apply_lowercase:
-                df[selected_column] = df[selected_column].str.lower()
-            if apply_uppercase:
-                df[selected_column] = df[selected_column].str.upper()
-            if apply_replace_char and char_to_replace and replacement_character:
-                df[selected_column] = df[selected_column].str.replace(char_to_replace, replacement_character, regex=False)
-            if apply_replace_spaces and space_replacement:
-                df[selected_column] = df[selected_column].str.replace(" ", space_replacement, regex=False)
-            if apply_remove_all_spaces:
-                df[selected_column] = df[selected_column].str.replace(" ", "", regex=False)
-
-            st.session_state["data"] = df
+            df = apply_step(df, normalize_step)
+
+            commit_dataset(df, "NormalizeColumn", [selected_column])
             st.success(f"Normalization changes saved for column '{selected_column}'.")
             st.write("Unique Values and Frequencies (After Saving):")
             st.write(df[selected_column].value_counts(dropna=False))
-            log_change("NormalizeColumn", st.session_state[f"original_{selected_column}"].to_string(), df[selected_column].to_string())
+            log_change("NormalizeColumn", f"Normalized column: {selected_column}", selected_column, step=normalize_step)
 
         except Exception as e:
             st.error(f"An error occurred during saving: {e}")
 
     if st.button("Restore Original Values", key=f"restore_{selected_column}"):
-        if f"original_{selected_column}" in st.session_state:
-            df[selected_column] = st.session_state[f"original_{selected_column}"]
-            st.session_state["data"] = df
+        restored = restore_original(df, selected_column)
+        if restored is not None:
+            df[selected_column] = restored
+            commit_dataset(df, "Restore Original Values", [selected_column])
             st.success(f"Restored original values for column '{selected_column}'.")
             st.write("Unique Values and Frequencies (After Restoration):")
             st.write(df[selected_column].value_counts())
-            log_change("Restore Original Values", df[selected_column].to_string(), st.session_state[f"original_{selected_column}"].to_string())
-        else:
-            st.warning("No original values saved to restore.")
+            log_change("Restore Original Values", f"Restored original values for column: {selected_column}", selected_column, step=make_step("restore", column=selected_column))
 
 def HandleNumericColumn(df, selected_column):
     st.subheader(f"Handling Numeric Column: {selected_column}")
@@ -290,174 +262,177 @@ def HandleNumericColumn(df, selected_column):
     elif selected_action == "Transform":
         handle_transformations(df, selected_column)
 
-    log_change("HandleNumericColumn", df[selected_column].to_string(), f"Handled numeric column: {selected_column}")
-
 def ReplaceSpecificValues(df, selected_column):
-    st.session_state["data"] = df
     unique_values = df[selected_column].unique()
     replace_from = st.selectbox("Select value to replace:", unique_values, key=f"replace_from_{selected_column}")
     replace_to = st.text_input("Replace with:", key=f"replace_to_{selected_column}")
 
     if st.button("Save and Apply Replacement", key=f"save_apply_replace_{selected_column}"):
         if replace_from and replace_to:
-            if f"original_{selected_column}" not in st.session_state:
-                st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
-
             st.write("Value Frequencies (Before Replacement):")
-            fig, ax = plt.subplots()
-            df[selected_column].value_counts().plot(kind="bar", ax=ax)
-            ax.set_title(f"Value Frequencies for Column: {selected_column} (Before Replacement)")
-            ax.set_xlabel("Values")
-            ax.set_ylabel("Frequency")
-            st.pyplot(fig)
+            show_figure((dataset_version(), selected_column, "value_counts", "Before Replacement"),
+                        lambda ax: _draw_value_counts(ax, df[selected_column], f"Value Frequencies for Column: {selected_column} (Before Replacement)"))
 
             # Apply replacement
-            df[selected_column] = df[selected_column].replace(replace_from, replace_to)
-            st.session_state["data"] = df
+            df[selected_column] = uncategorized(df[selected_column]).replace(replace_from, replace_to)
+            commit_dataset(df, "ReplaceSpecificValues", [selected_column])
             st.success(f"Replaced '{replace_from}' with '{replace_to}' in column '{selected_column}'.")
 
             st.write("Value Frequencies (After Replacement):")
-            fig, ax = plt.subplots()
-            df[selected_column].value_counts().plot(kind="bar", ax=ax)
-            ax.set_title(f"Value Frequencies for Column: {selected_column} (After Replacement)")
-            ax.set_xlabel("Values")
-            ax.set_ylabel("Frequency")
-            st.pyplot(fig)
+            show_figure((dataset_version(), selected_column, "value_counts", "After Replacement"),
+                        lambda ax: _draw_value_counts(ax, df[selected_column], f"Value Frequencies for Column: {selected_column} (After Replacement)"))
 
             st.write("Unique Values and Frequencies (After Replacement):")
             st.write(df[selected_column].value_counts())
-            log_change("ReplaceSpecificValues", st.session_state[f"original_{selected_column}"].to_string(), df[selected_column].to_string())
+            log_change("ReplaceSpecificValues", f"Replaced '{replace_from}' with '{replace_to}' in column: {selected_column}", selected_column,
+                       step=make_step("replace_value", column=selected_column, **{"from": replace_from, "to": replace_to}))
         else:
             st.error("Please provide both 'Replace from' and 'Replace with' values.")
 
     if st.button("Restore Original Values", key=f"restore_replace_{selected_column}"):
-        if f"original_{selected_column}" in st.session_state:
-            df[selected_column] = st.session_state[f"original_{selected_column}"]
-            st.session_state["data"] = df
+        restored = restore_original(df, selected_column)
+        if restored is not None:
+            df[selected_column] = restored
+            commit_dataset(df, "Restore Original Values", [selected_column])
             st.success(f"Restored original values in column '{selected_column}'.")
             st.write("Unique Values and Frequencies (After Restoration):")
             st.write(df[selected_column].value_counts())
-            log_change("Restore Original Values", df[selected_column].to_string(), st.session_state[f"original_{selected_column}"].to_string())
-        else:
-            st.warning("No original values saved to restore.")
+            log_change("Restore Original Values", f"Restored original values for column: {selected_column}", selected_column, step=make_step("restore", column=selected_column))
 
 def ConvertToNumeric(df, selected_column):
-    st.session_state["data"] = df
-
     if st.button("Save and Convert to Numeric", key=f"save_convert_numeric_{selected_column}"):
-        if f"original_{selected_column}" not in st.session_state:
-            st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
-
         try:
-            df[selected_column] = pd.to_numeric(df[selected_column].replace(r'[^\d.]', '', regex=True), errors="coerce")
-            st.session_state["data"] = df
+            df[selected_column] = pd.to_numeric(uncategorized(df[selected_column]).replace(r'[^\d.]', '', regex=True), errors="coerce")
+            commit_dataset(df, "ConvertToNumeric", [selected_column])
             st.success(f"Converted column '{selected_column}' to numeric.")
             st.write("Column Statistics (After Conversion):")
             st.table(df[selected_column].describe())
-            log_change("ConvertToNumeric", st.session_state[f"original_{selected_column}"].to_string(), df[selected_column].to_string())
+            log_change("ConvertToNumeric", f"Converted column to numeric: {selected_column}", selected_column, step=make_step("to_numeric", column=selected_column))
 
         except Exception as e:
             st.error(f"Error converting to numeric: {e}")
 
     if st.button("Restore Original Values", key=f"restore_numeric_{selected_column}"):
-        if f"original_{selected_column}" in st.session_state:
-            df[selected_column] = st.session_state[f"original_{selected_column}"]
-            st.session_state["data"] = df
+        restored = restore_original(df, selected_column)
+        if restored is not None:
+            df[selected_column] = restored
+            commit_dataset(df, "Restore Original Values", [selected_column])
             st.success(f"Restored original values in column '{selected_column}'.")
-            log_change("Restore Original Values", df[selected_column].to_string(), st.session_state[f"original_{selected_column}"].to_string())
-        else:
-            st.warning("No original values saved to restore.")
+            log_change("Restore Original Values", f"Restored original values for column: {selected_column}", selected_column, step=make_step("restore", column=selected_column))
 
 def RenameColumn(df, selected_column):
     new_column_name = st.text_input(f"Enter new name for column '{selected_column}':", key=f"rename_{selected_column}")
     if st.button("Rename Column", key=f"apply_rename_{selected_column}"):
         if new_column_name:
             df.rename(columns={selected_column: new_column_name}, inplace=True)
-            st.session_state["data"] = df
+            commit_dataset(df, "RenameColumn", [new_column_name])
             st.success(f"Column '{selected_column}' has been renamed to '{new_column_name}'.")
-            log_change("RenameColumn", selected_column, new_column_name)
+            log_change("RenameColumn", f"Renamed column '{selected_column}' to '{new_column_name}'", new_column_name,
+                       step=make_step("rename", old_name=selected_column, new_name=new_column_name))
         else:
             st.error("Please provide a new column name.")
 
 def outlier_analysis(df, column):
     """Identifies and displays outliers using the IQR method."""
-    q1 = df[column].quantile(0.25)
-    q3 = df[column].quantile(0.75)
-    iqr = q3 - q1
-    lower_bound = q1 - 1.5 * iqr
-    upper_bound = q3 + 1.5 * iqr
-    outliers = df[(df[column] < lower_bound) | (df[column] > upper_bound)]
-    st.write(f"Number of outliers in {column}: {len(outliers)}")
-    if not outliers.empty:
+    bounds = outlier_bounds(df, column)
+    lower_bound, upper_bound = bounds.lower_bound, bounds.upper_bound
+    st.write(f"Number of outliers in {column}: {bounds.n_outliers}")
+    if bounds.n_outliers:
+        outliers = outlier_rows(df, column, lower_bound, upper_bound)
         st.write(outliers)
         show_outliers_vis = st.checkbox("Show outliers visualization", key='show_outliers_vis')
         if show_outliers_vis:
-            fig, ax = plt.subplots()
-            sns.boxplot(x=df[column], ax=ax)
-            sns.scatterplot(x=outliers[column], y=[0]*len(outliers), color='red', marker='o', ax=ax)
-            plt.title(f"Box Plot of {column} with Outliers highlighted")
-            st.pyplot(fig)
-    log_change("outlier_analysis", "N/A", f"Performed outlier analysis on column: {column}")
+            def draw(ax):
+                sns.boxplot(x=df[column], ax=ax)
+                sns.scatterplot(x=outliers[column], y=[0]*len(outliers), color='red', marker='o', ax=ax)
+                ax.set_title(f"Box Plot of {column} with Outliers highlighted")
+            show_figure((dataset_version(), column, "outlier_box", lower_bound, upper_bound), draw)
     return lower_bound, upper_bound
 
 def handle_outliers(df, column, lower_bound, upper_bound, method):
     """Handles outliers based on the selected method."""
+    try:
+        df = apply_outliers(df, column, lower_bound, upper_bound, method)
+    except ValueError as e:
+        st.error(str(e))
+        return df
     if method == 'clip':
-        df[column] = df[column].clip(lower=lower_bound, upper=upper_bound)
         st.success(f"Outliers in {column} have been clipped to the defined bounds.")
-    elif method == 'drop':
-        df.drop(df[(df[column] < lower_bound) | (df[column] > upper_bound)].index, inplace=True)
-        st.success(f"Outliers in {column} have been removed.")
     else:
-        st.error("Invalid method for handling outliers.")
-
-    log_change("handle_outliers", "N/A", f"Handled outliers in column: {column} using method: {method}")
+        st.success(f"Outliers in {column} have been removed.")
     return df
 
 
 def HandleOutliers(df, selected_column):
     st.subheader("Handle Outliers")
-    st.session_state["data"] = df
-
-    # Save original data if not already saved
-    if f"original_{selected_column}" not in st.session_state:
-        st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
 
     # Initial Visualization
     st.write("Data Distribution Before Filtering:")
-    fig_before, ax_before = plt.subplots()
-    df[selected_column].plot(kind='box', ax=ax_before)
-    ax_before.set_title(f"Box Plot Before Filtering for {selected_column}")
-    st.pyplot(fig_before)
+    def draw_before(ax):
+        df[selected_column].plot(kind='box', ax=ax)
+        ax.set_title(f"Box Plot Before Filtering for {selected_column}")
+    show_figure((dataset_version(), selected_column, "box"), draw_before)
 
     lower_bound, upper_bound = outlier_analysis(df, selected_column)
     if lower_bound is not None and upper_bound is not None:
         outlier_method = st.selectbox("Select Outlier Handling Method", ['clip', 'drop'])
 
     if st.button(f"Preview Filtered Data for {selected_column}"):
-        df = handle_outliers(df, selected_column, lower_bound, upper_bound, outlier_method)
-        st.session_state[f"preview_filtered_{selected_column}"] = df[selected_column].copy()
+        # Preview on the committed version; the working dataset only changes on save
+        preview_df = handle_outliers(get_dataset_store().materialize(), selected_column, lower_bound, upper_bound, outlier_method)
 
         st.success("Preview of filtered data based on custom range!")
         st.write("Data Statistics After Filtering:")
-        st.write(df.describe())
+        st.write(preview_df.describe())
 
         st.write("Filtered Data Preview:")
-        st.dataframe(df)
+        st.dataframe(preview_df)
 
         # Visualization After Filtering
         st.write("Data Distribution After Filtering:")
-        fig_after, ax_after = plt.subplots()
-        df[selected_column].plot(kind='box', ax=ax_after)
-        ax_after.set_title(f"Box Plot After Filtering for {selected_column}")
-        st.pyplot(fig_after)
+        def draw_after(ax):
+            preview_df[selected_column].plot(kind='box', ax=ax)
+            ax.set_title(f"Box Plot After Filtering for {selected_column}")
+        show_figure((dataset_version(), selected_column, "box_filtered", outlier_method, lower_bound, upper_bound), draw_after)
 
     if st.button(f"Save Filtered Data for {selected_column}"):
-        if f"preview_filtered_{selected_column}" in st.session_state:
-            st.session_state[f"filtered_data_{selected_column}"] = st.session_state[f"preview_filtered_{selected_column}"].copy()
-            st.success(f"Filtered data for column '{selected_column}' has been saved.")
-            st.session_state["data"] = df
-            log_change("HandleOutliers", df[selected_column].to_string(), f"Handled outliers for column: {selected_column}")
+        df = handle_outliers(df, selected_column, lower_bound, upper_bound, outlier_method)
+        st.success(f"Filtered data for column '{selected_column}' has been saved.")
+        commit_dataset(df, "HandleOutliers", [selected_column])
+        log_change("HandleOutliers", f"Handled outliers for column: {selected_column}", selected_column,
+                   step=make_step("clip" if outlier_method == "clip" else "drop_outliers", column=selected_column, lower=lower_bound, upper=upper_bound))
+
+    several_columns_outliers(df, selected_column)
+
+
+def several_columns_outliers(df, selected_column):
+    """Bounds of many numeric columns from one pass, then clip or drop them in one operation."""
+    with st.expander("Outliers in Several Columns"):
+        numeric_columns = list(df.select_dtypes(include='number').columns)
+        columns = st.multiselect(
+            "Columns to Check", numeric_columns,
+            default=[selected_column] if selected_column in numeric_columns else [],
+            key=f"outlier_columns_{selected_column}"
+        )
+        if not columns:
+            st.info("Select the numeric columns to check for outliers.")
+            return
+        table = outlier_bounds_table(df, columns)
+        st.dataframe(table)
+
+        method = st.selectbox("Select Outlier Handling Method", list(OUTLIER_METHODS), key=f"outlier_table_method_{selected_column}")
+        affected_rows = int(outlier_mask(df, table).to_numpy().any(axis=1).sum())
+        if method == 'clip':
+            st.write(f"{int(table['n_outliers'].sum())} values in {affected_rows} rows will be clipped.")
+        else:
+            st.write(f"{affected_rows} rows with an outlier in any selected column will be removed.")
+
+        if st.button("Apply to Selected Columns", key=f"apply_outlier_table_{selected_column}"):
+            df = apply_outlier_table(df, table, method)
+            commit_dataset(df, "HandleOutliers", columns)
+            st.success(f"Handled outliers in {', '.join(columns)} using {method}.")
+            for column, step in zip(columns, outlier_steps(table, method)):
+                log_change("HandleOutliers", f"Handled outliers for column: {column} using method: {method}", column, step=step)
 
     
             
@@ -479,32 +454,22 @@ def DeleteRowsColumns(df, selected_column):
                 st.dataframe(rows_to_delete)
 
                 with st.expander("Visualization Before Deletion"):
-                    fig, ax = plt.subplots()
-                    df[selected_column].value_counts().plot(kind="bar", ax=ax, color="skyblue")
-                    ax.set_title(f"Value Frequencies for Column: {selected_column} (Before Deletion)")
-                    ax.set_xlabel("Values")
-                    ax.set_ylabel("Frequency")
-                    st.pyplot(fig)
+                    show_figure((dataset_version(), selected_column, "value_counts", "Before Deletion"),
+                                lambda ax: _draw_value_counts(ax, df[selected_column], f"Value Frequencies for Column: {selected_column} (Before Deletion)", "skyblue"))
             except Exception as e:
                 st.warning(f"Error finding rows with value: {e}")
 
         if st.button("Delete Rows", key=f"delete_rows_{selected_column}"):
             try:
-                if "original_data" not in st.session_state:
-                    st.session_state["original_data"] = df.copy()
-
                 df = df[df[selected_column] != value_to_delete]
-                st.session_state["data"] = df
+                commit_dataset(df, "DeleteRows", [])
                 st.success(f"Rows where {selected_column} equals '{value_to_delete}' have been deleted.")
-                log_change("DeleteRowsColumns", df[selected_column].to_string(), f"Deleted rows/columns for column: {selected_column}")
+                log_change("DeleteRowsColumns", f"Deleted rows where {selected_column} equals '{value_to_delete}'", selected_column,
+                           step=make_step("drop_rows_equal", column=selected_column, value=value_to_delete))
                 
                 with st.expander("Visualization After Deletion"):
-                    fig, ax = plt.subplots()
-                    df[selected_column].value_counts().plot(kind="bar", ax=ax, color="orange")
-                    ax.set_title(f"Value Frequencies for Column: {selected_column} (After Deletion)")
-                    ax.set_xlabel("Values")
-                    ax.set_ylabel("Frequency")
-                    st.pyplot(fig)
+                    show_figure((dataset_version(), selected_column, "value_counts", "After Deletion"),
+                                lambda ax: _draw_value_counts(ax, df[selected_column], f"Value Frequencies for Column: {selected_column} (After Deletion)", "orange"))
             except Exception as e:
                 st.error(f"Error deleting rows: {e}")
 
@@ -513,23 +478,21 @@ def DeleteRowsColumns(df, selected_column):
         st.dataframe(df[selected_column].head(10))
 
         if st.button("Delete Column", key=f"delete_column_{selected_column}"):
-            if "original_data" not in st.session_state:
-                st.session_state["original_data"] = df.copy()
-
             df.drop(columns=[selected_column], inplace=True)
-            st.session_state["data"] = df
+            commit_dataset(df, "DeleteColumn", [])
             st.success(f"Column '{selected_column}' has been deleted.")
-            log_change("DeleteRowsColumns", df[selected_column].to_string(), f"Deleted rows/columns for column: {selected_column}")
+            log_change("DeleteRowsColumns", f"Deleted column: {selected_column}", selected_column, step=make_step("drop_column", column=selected_column))
 
     if st.button("Restore Original Data"):
         restore_column(df, selected_column)
 
 def restore_column(df, selected_column):
-    if f"original_{selected_column}" in st.session_state:
-        df[selected_column] = st.session_state[f"original_{selected_column}"].copy()
-        st.session_state["data"] = df
+    restored = original_column(df, selected_column)
+    if restored is not None:
+        df[selected_column] = restored
+        commit_dataset(df, "restore_column", [selected_column])
         st.success(f"Restored original data for column '{selected_column}'.")
-        log_change("restore_column", "N/A", f"Restored original data for column: {selected_column}")
+        log_change("restore_column", f"Restored original data for column: {selected_column}", selected_column, step=make_step("restore", column=selected_column))
     else:
         st.warning(f"No backup found for column '{selected_column}'. Make sure the column was modified.")
 
@@ -537,7 +500,7 @@ def Visualization(df, selected_column):
     col_type = df[selected_column].dtype
 
     # Determine visualization options based on column type
-    if col_type in ['object' , 'bool' ]:
+    if col_type in ['object' , 'bool', 'category' ]:
         visualizations = [
             "Bar Plot (Frequency)",
             "Pie Chart"
@@ -562,44 +525,44 @@ def Visualization(df, selected_column):
     show_grid = st.checkbox("Show Gridlines", value=True)
 
     if st.button("Show Visualization"):
+        # Rendered images are cached per dataset version, column, plot type and options
+        figure_key = (dataset_version(), selected_column, selected_visualization, selected_palette_name, show_grid)
+
         if selected_visualization == "Bar Plot (Frequency)":
             st.write("### Bar Plot (Frequency)")
-            fig, ax = plt.subplots()
-            df[selected_column].value_counts().plot(kind="bar", ax=ax, color=color_palette)
-            ax.set_title(f"Bar Plot for Column: {selected_column}")
-            ax.set_xlabel("Values")
-            ax.set_ylabel("Frequency")
-            if show_grid:
-                ax.grid(True)
-            st.pyplot(fig)
+            def draw(ax):
+                _draw_value_counts(ax, df[selected_column], f"Bar Plot for Column: {selected_column}", color_palette)
+                if show_grid:
+                    ax.grid(True)
+            show_figure(figure_key, draw)
 
         elif selected_visualization == "Pie Chart":
             st.write("### Pie Chart")
-            fig, ax = plt.subplots()
-            df[selected_column].value_counts().plot(kind="pie", ax=ax, autopct='%1.1f%%', startangle=90, colors=sns.color_palette(color_palette))
-            ax.set_title(f"Pie Chart for Column: {selected_column}")
-            ax.set_ylabel("") 
-            st.pyplot(fig)
+            def draw(ax):
+                df[selected_column].value_counts().plot(kind="pie", ax=ax, autopct='%1.1f%%', startangle=90, colors=sns.color_palette(color_palette))
+                ax.set_title(f"Pie Chart for Column: {selected_column}")
+                ax.set_ylabel("") 
+            show_figure(figure_key, draw)
 
         elif selected_visualization == "Histogram":
             st.write("### Histogram")
-            fig, ax = plt.subplots()
-            df[selected_column].plot(kind="hist", bins=20, ax=ax, color=color_palette, edgecolor="black")
-            ax.set_title(f"Histogram for Column: {selected_column}")
-            ax.set_xlabel("Values")
-            ax.set_ylabel("Frequency")
-            if show_grid:
-                ax.grid(True)
-            st.pyplot(fig)
+            def draw(ax):
+                df[selected_column].plot(kind="hist", bins=20, ax=ax, color=color_palette, edgecolor="black")
+                ax.set_title(f"Histogram for Column: {selected_column}")
+                ax.set_xlabel("Values")
+                ax.set_ylabel("Frequency")
+                if show_grid:
+                    ax.grid(True)
+            show_figure(figure_key, draw)
 
         elif selected_visualization == "Box Plot":
             st.write("### Box Plot")
-            fig, ax = plt.subplots()
-            sns.boxplot(data=df, y=selected_column, ax=ax, color=color_palette)
-            ax.set_title(f"Box Plot for Column: {selected_column}")
-            if show_grid:
-                ax.grid(True)
-            st.pyplot(fig)
+            def draw(ax):
+                sns.boxplot(data=df, y=selected_column, ax=ax, color=color_palette)
+                ax.set_title(f"Box Plot for Column: {selected_column}")
+                if show_grid:
+                    ax.grid(True)
+            show_figure(figure_key, draw)
 
         elif selected_visualization == "Scatter Plot (Choose X-Axis)":
             st.write("### Scatter Plot")
@@ -607,44 +570,44 @@ def Visualization(df, selected_column):
             x_axis_column = st.selectbox("Select X-Axis Column", other_columns)
 
             if x_axis_column:
-                fig, ax = plt.subplots()
-                sns.scatterplot(data=df, x=x_axis_column, y=selected_column, ax=ax, color=color_palette)
-                ax.set_title(f"Scatter Plot: {selected_column} vs {x_axis_column}")
-                if show_grid:
-                    ax.grid(True)
-                st.pyplot(fig)
+                def draw(ax):
+                    sns.scatterplot(data=df, x=x_axis_column, y=selected_column, ax=ax, color=color_palette)
+                    ax.set_title(f"Scatter Plot: {selected_column} vs {x_axis_column}")
+                    if show_grid:
+                        ax.grid(True)
+                show_figure(figure_key + (x_axis_column,), draw)
 
         elif selected_visualization == "Line Chart":
             st.write("### Line Chart")
-            fig, ax = plt.subplots()
-            df[selected_column].plot(kind="line", ax=ax, color=color_palette)
-            ax.set_title(f"Line Chart for Column: {selected_column}")
-            ax.set_xlabel("Index")
-            ax.set_ylabel("Values")
-            if show_grid:
-                ax.grid(True)
-            st.pyplot(fig)
+            def draw(ax):
+                df[selected_column].plot(kind="line", ax=ax, color=color_palette)
+                ax.set_title(f"Line Chart for Column: {selected_column}")
+                ax.set_xlabel("Index")
+                ax.set_ylabel("Values")
+                if show_grid:
+                    ax.grid(True)
+            show_figure(figure_key, draw)
 
         elif selected_visualization == "Area Chart":
             st.write("### Area Chart")
-            fig, ax = plt.subplots()
-            df[selected_column].plot(kind="area", ax=ax, color=color_palette)
-            ax.set_title(f"Area Chart for Column: {selected_column}")
-            ax.set_xlabel("Index")
-            ax.set_ylabel("Values")
-            if show_grid:
-                ax.grid(True)
-            st.pyplot(fig)
+            def draw(ax):
+                df[selected_column].plot(kind="area", ax=ax, color=color_palette)
+                ax.set_title(f"Area Chart for Column: {selected_column}")
+                ax.set_xlabel("Index")
+                ax.set_ylabel("Values")
+                if show_grid:
+                    ax.grid(True)
+            show_figure(figure_key, draw)
 
         elif selected_visualization == "Pair Plot":
             st.write("### Pair Plot")
             numerical_cols = df.select_dtypes(include=['number']).columns
             if len(numerical_cols) > 1:
-                fig = sns.pairplot(df[numerical_cols], palette=color_palette)
-                st.pyplot(fig)
+                show_figure_grid((dataset_version(), None, "Pair Plot", selected_palette_name, tuple(numerical_cols)),
+                                 lambda: sns.pairplot(df[numerical_cols], palette=color_palette))
             else:
                 st.error("Not enough numerical columns for a pair plot.")
-        log_change("Visualization", "N/A", f"Visualized column: {selected_column} using {selected_visualization}")
+        log_change("Visualization", f"Visualized column: {selected_column} using {selected_visualization}")
 
 def GroupByTwoColumns(df, selected_column):
     """
@@ -668,186 +631,133 @@ def GroupByTwoColumns(df, selected_column):
         # Display grouped data
         st.write("### Grouped Data")
         st.write(grouped_df)
-        log_change("GroupByTwoColumns", "N/A", f"Grouped by column: {selected_column} and {groupby_column}")
+        log_change("GroupByTwoColumns", f"Grouped by column: {selected_column} and {groupby_column}")
 
-# Use namedtuple to provide structured and easy-to-read analysis results.
-CorrelationResult = namedtuple('CorrelationResult', ['correlation_matrix', 'features'])
 def correlation_analysis(df, target_column):
     """Perform correlation analysis on all columns and user-selected features."""
     st.subheader("Correlation Analysis")
+    method = st.selectbox("Correlation Method", list(CORRELATION_METHODS), format_func=str.capitalize, key="correlation_method")
+    # Statistics are kept with the dataset versions, so only edited columns are correlated again
+    correlations = get_dataset_store().correlations(method)
     
     # All Columns Correlation
     st.write("### Correlation Matrix for All Columns")
-    correlation_matrix_all = df.corr()  # Calculate correlation for all numerical columns
-    st.table(correlation_matrix_all)
-    fig_all, ax_all = plt.subplots(figsize=(10, 8))
-    sns.heatmap(correlation_matrix_all, annot=True, cmap='coolwarm', ax=ax_all)
-    st.pyplot(fig_all)
+    numerical_columns = correlation_columns(df)
+    if len(numerical_columns) <= CORRELATION_MATRIX_MAX_COLUMNS:
+        correlation_matrix_all = compute_correlation(df, correlations=correlations).correlation_matrix  # Numeric and boolean columns
+        st.table(correlation_matrix_all)
+        annotate = len(numerical_columns) <= ANNOTATED_HEATMAP_MAX_COLUMNS
+        show_figure((dataset_version(), None, "correlation_heatmap", method, "all"),
+                    lambda ax: sns.heatmap(correlation_matrix_all, annot=annotate, cmap='coolwarm', ax=ax), figsize=(10, 8))
+    else:
+        st.info(f"{len(numerical_columns)} columns are too many for a readable matrix; "
+                "the strongest pairs are listed below, and selected features get their own matrix.")
+
+    # Strongest pairs straight from the cached statistics, without the dense matrix
+    st.write("### Strongest Correlated Pairs")
+    n_pairs = st.slider("Number of pairs", 5, 100, 20, key="correlation_pairs")
+    st.dataframe(strongest_correlations(df, n_pairs, numerical_columns, correlations=correlations))
     
     # Custom Features Correlation
     st.write("### Custom Correlation Analysis")
-    numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns
     selected_features = st.multiselect("Select Features for Correlation Analysis", numerical_columns)
     
     if selected_features:
         st.write("Correlation Matrix for Selected Features")
-        correlation_matrix_custom = df[selected_features].corr()
+        correlation_matrix_custom = compute_correlation(df, selected_features, correlations=correlations).correlation_matrix
         st.table(correlation_matrix_custom)
-        fig_custom, ax_custom = plt.subplots(figsize=(10, 8))
-        sns.heatmap(correlation_matrix_custom, annot=True, cmap='coolwarm', ax=ax_custom)
-        st.pyplot(fig_custom)
-        log_change("correlation_analysis", "N/A", f"Performed correlation analysis on target column: {target_column}")
+        show_figure((dataset_version(), None, "correlation_heatmap", method, tuple(selected_features)),
+                    lambda ax: sns.heatmap(correlation_matrix_custom, annot=len(selected_features) <= ANNOTATED_HEATMAP_MAX_COLUMNS,
+                                           cmap='coolwarm', ax=ax), figsize=(10, 8))
         return CorrelationResult(correlation_matrix=correlation_matrix_custom, features=selected_features)
     else:
         st.warning("Please select at least one feature for custom correlation analysis.")
         return None
 
-FeatureImportanceResult = namedtuple('FeatureImportanceResult', ['importance_scores', 'model_name'])
-
 def feature_importance(df, target_column):
     """Calculate feature importance using RandomForestClassifier or RandomForestRegressor"""
     st.subheader("Feature Importance Analysis")
-    
-    X = df.drop(columns=[target_column])
-    y = df[target_column]
-    
-    # Check the type of target
-    target_type = type_of_target(y)
-    
-    if target_type in ["binary", "multiclass"]:
-        model = RandomForestClassifier()
-        model_name = "RandomForestClassifier"
-    elif target_type in ["continuous", "continuous-multioutput"]:
-        model = RandomForestRegressor()
-        model_name = "RandomForestRegressor"
-    else:
-        st.error(f"Unsupported target type: {target_type}")
-        return None
 
-    # Fit the model
-    model.fit(X, y)
-    importance_scores = model.feature_importances_
+    try:
+        result = compute_feature_importance(df, target_column, random_state=42)
+    except ValueError as e:
+        st.error(str(e))
+        return None
 
     # Prepare feature importance dataframe
-    feature_importance_df = pd.DataFrame({
-        'Feature': X.columns,
-        'Importance': importance_scores
-    }).sort_values(by='Importance', ascending=False)
+    feature_importance_df = importance_table(result)
     
     st.write("Feature Importance Scores:")
     st.table(feature_importance_df)
 
     # Plot feature importance
-    fig, ax = plt.subplots(figsize=(10, 8))
-    sns.barplot(x='Importance', y='Feature', data=feature_importance_df, ax=ax)
-    ax.set_title(f"Feature Importance - {model_name}")
-    st.pyplot(fig)
-    log_change("feature_importance", "N/A", f"Calculated feature importance for target column: {target_column}")
-    return FeatureImportanceResult(importance_scores=dict(zip(X.columns, importance_scores)), model_name=model_name)
-
-StatisticalTestResult = namedtuple('StatisticalTestResult', ['test_statistic', 'p_value', 'null_hypothesis', 'alternative_hypothesis', 'significant'])
+    def draw(ax):
+        sns.barplot(x='Importance', y='Feature', data=feature_importance_df, ax=ax)
+        ax.set_title(f"Feature Importance - {result.model_name}")
+    show_figure((dataset_version(), target_column, "feature_importance", tuple(result.importance_scores.items())),
+                draw, figsize=(10, 8))
+    return result
+
 def statistical_tests(df, config: AnalysisConfig):
     """Perform statistical tests on selected features"""
     st.subheader("Statistical Tests")
-    features = config.features_to_include
-    if len(features) != 2:
-        st.error("Please select exactly two features for the statistical test.")
-        return None
-    feature1, feature2 = features
-    if config.test_type == "t-test":
-        test_statistic, p_value = ttest_ind(df[feature1].dropna(), df[feature2].dropna())
-        significant = p_value < config.significance_level
-        result = StatisticalTestResult(
-            test_statistic=test_statistic,
-            p_value=p_value,
-            null_hypothesis=f"There is no significant difference between {feature1} and {feature2}.",
-            alternative_hypothesis=f"There is a significant difference between {feature1} and {feature2}.",
-            significant=significant
-        )
-        
-        # Create a DataFrame for better table display
-        results_df = pd.DataFrame({
-            'Metric': ['Test Statistic', 'P-Value', 'Significance Level', 'Significant?', 'Null Hypothesis', 'Alternative Hypothesis'],
-            'Value': [
-                f"{test_statistic:.4f}",
-                f"{p_value:.4f}",
-                f"{config.significance_level}",
-                "Yes" if significant else "No",
-                result.null_hypothesis,
-                result.alternative_hypothesis
-            ]
-        })
-        
-        st.write("Statistical Test Results:")
-        st.table(results_df)
-        log_change("statistical_tests", "N/A", f"Performed statistical tests on features: {config.features_to_include}")
-        return result
-    else:
-        st.error("Unsupported test type.")
+    try:
+        result = run_statistical_test(df, config)
+    except ValueError as e:
+        st.error(str(e))
         return None
 
+    # Create a DataFrame for better table display
+    results_df = pd.DataFrame({
+        'Metric': ['Test Statistic', 'P-Value', 'Significance Level', 'Significant?', 'Null Hypothesis', 'Alternative Hypothesis'],
+        'Value': [
+            f"{result.test_statistic:.4f}",
+            f"{result.p_value:.4f}",
+            f"{config.significance_level}",
+            "Yes" if result.significant else "No",
+            result.null_hypothesis,
+            result.alternative_hypothesis
+        ]
+    })
+
+    st.write("Statistical Test Results:")
+    st.table(results_df)
+    return result
+
 class DataTransformation:
     def __init__(self, df):
         self.df = df
-        self.original_df = df.copy()
+        # Copy-on-write snapshot, costs nothing until a column is modified
+        self.original_df = df.copy(deep=False)
         self.transformers = {}
+        # Replayable pipeline step and written columns of the last transformation, per column
+        self.steps = {}
+        self.written_columns = {}
 
     def transform_column(self, column, transform_type, params=None):
         """Transform a single column based on specified type."""
         try:
+            result = transform_column(self.df, column, transform_type)
+            self.df = result.df
+            self.steps[column] = result.step
+            self.written_columns[column] = result.columns
+            if result.transformer is not None:
+                self.transformers[column] = result.transformer
             if transform_type == "one_hot":
-                # One-hot encoding
-                encoded_cols = pd.get_dummies(self.df[column], prefix=column)
-                self.df = pd.concat([self.df.drop(columns=[column]), encoded_cols], axis=1)
-                st.session_state["data"] = self.df
-                return encoded_cols
-
-            elif transform_type == "label":
-                # Label encoding
-                le = LabelEncoder()
-                self.transformers[column] = le
-                self.df[column] = le.fit_transform(self.df[column])
-                st.session_state["data"] = self.df
-                return self.df[column]
-
-            elif transform_type == "minmax":
-                # Min-Max scaling
-                scaler = MinMaxScaler()
-                self.transformers[column] = scaler
-                scaled_values = scaler.fit_transform(self.df[[column]]).flatten()
-                self.df[column] = scaled_values
-                st.session_state["data"] = self.df
-                return pd.Series(scaled_values, name=column)
-
-            elif transform_type == "standard":
-                # Standard scaling
-                scaler = StandardScaler()
-                self.transformers[column] = scaler
-                scaled_values = scaler.fit_transform(self.df[[column]]).flatten()
-                self.df[column] = scaled_values
-                st.session_state["data"] = self.df
-                return pd.Series(scaled_values, name=column)
-
-            elif transform_type == "log":
-                # Log transformation
-                log_values = np.log1p(self.df[column])
-                self.df[column] = log_values
-                st.session_state["data"] = self.df
-                return pd.Series(log_values, name=column)
+                return self.df[result.columns]
+            return self.df[column]
 
         except Exception as e:
             st.error(f"Transformation error: {str(e)}")
             return None
             
+
 def handle_transformations(df, selected_column):
     """Handle transformations for selected column"""
     st.subheader(f"Transform Column: {selected_column}")
     
-    # Initialize transformer
-    transformer = DataTransformation(df)
-    
     # Select transformation type based on data type
-    if df[selected_column].dtype == 'object':
+    if not pd.api.types.is_numeric_dtype(df[selected_column].dtype):
         transform_options = ["one_hot", "label"]
     else:
         transform_options = ["minmax", "standard", "log"]
@@ -858,14 +768,10 @@ def handle_transformations(df, selected_column):
         help="Choose the type of transformation to apply"
     )
     
-    # Preview button
+    # Preview button; previews transform a copy and leave the working dataset alone
     if st.button("Preview Transformation"):
         try:
-            # Save original state if not already saved
-            if f"original_{selected_column}" not in st.session_state:
-                st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
-
-            preview = transformer.transform_column(selected_column, transform_type)
+            preview = DataTransformation(df.copy(deep=False)).transform_column(selected_column, transform_type)
             
             if preview is not None:
                 st.write("Preview of transformed data:")
@@ -874,21 +780,26 @@ def handle_transformations(df, selected_column):
                 # Show statistics
                 st.write("Statistics after transformation:")
                 st.table(preview.describe())
-                
-                # Apply transformation button
-                if st.button("Apply Transformation"):
-                    st.success(f"Transformation '{transform_type}' applied to '{selected_column}'.")
-                    st.session_state["data"] = transformer.df
-                    log_change("handle_transformations", st.session_state[f"original_{selected_column}"].to_string(), transformer.df[selected_column].to_string())
         except Exception as e:
             st.error(f"Error during transformation: {str(e)}")
+
+    # Apply transformation button
+    if st.button("Apply Transformation"):
+        transformer = DataTransformation(df)
+        if transformer.transform_column(selected_column, transform_type) is not None:
+            commit_dataset(transformer.df, "handle_transformations", transformer.written_columns[selected_column])
+            st.success(f"Transformation '{transform_type}' applied to '{selected_column}'.")
+            log_change("handle_transformations", f"Applied {transform_type} transformation to column: {selected_column}", selected_column,
+                       step=transformer.steps[selected_column])
     
     # Restore original button
     if st.button("Restore Original"):
-        if f"original_{selected_column}" in st.session_state:
-            df[selected_column] = st.session_state[f"original_{selected_column}"]
+        restored = restore_original(df, selected_column)
+        if restored is not None:
+            df[selected_column] = restored
             st.success(f"Restored original values for {selected_column}")
-            st.session_state["data"] = df
+            commit_dataset(df, "Restore Original", [selected_column])
+            log_change("Restore Original Values", f"Restored original values for column: {selected_column}", selected_column, step=make_step("restore", column=selected_column))
 
 def replace_column_values(df, selected_column):
 
@@ -897,11 +808,11 @@ def replace_column_values(df, selected_column):
         st.table(value_counts)
     
     with st.expander("View Column Density and Statistics"):
-        fig, ax = plt.subplots()
-        sns.kdeplot(df[selected_column].dropna(), ax=ax, fill=True, color="blue")
-        ax.set_title(f"Density Plot for {selected_column}")
-        ax.set_xlabel("Values")
-        st.pyplot(fig)
+        def draw(ax):
+            sns.kdeplot(df[selected_column].dropna(), ax=ax, fill=True, color="blue")
+            ax.set_title(f"Density Plot for {selected_column}")
+            ax.set_xlabel("Values")
+        show_figure((dataset_version(), selected_column, "kde"), draw)
 
         # Calculate Mean, Median, and Mode
         mean_val = df[selected_column].mean()
@@ -927,168 +838,91 @@ def replace_column_values(df, selected_column):
         )
     
     if action == "Fill NaN based on Categorical Target":
-        target_col = st.selectbox(
-            "Select Categorical Target Column",
-            df.columns,
+        group_columns = st.multiselect(
+            "Select Categorical Target Column(s)",
+            [column for column in df.columns if column != selected_column],
             key=f"target_col_{selected_column}"  # مفتاح فريد بناءً على اسم العمود
         )
+        fill_columns = st.multiselect(
+            "Columns to Fill",
+            [selected_column] + [column for column in df.columns
+                                 if column != selected_column and column not in group_columns and df[column].isnull().any()],
+            default=[selected_column],
+            key=f"fill_columns_{selected_column}"
+        )
         fill_action = st.selectbox(
             "Choose fill action:",
-            ["Mean", "Median", "Mode"],
+            list(FILL_METHODS),
             key=f"fill_action_{selected_column}"  # مفتاح فريد بناءً على اسم العمود
         )
 
-        # Ensure the target column is not one of the selected columns
-        if target_col == selected_column:
-            st.warning("The target column cannot be one of the selected columns. Please select a different column.")
+        # Per-group statistics of all selected columns from one pass, with fitted
+        # fill values so the fill can be replayed on new files
+        fill_error = None
+        if group_columns and fill_columns:
+            by = group_columns[0] if len(group_columns) == 1 else group_columns
+            try:
+                preview_df, fill_steps = fill_by_group(df, fill_columns, by, fill_action)
+            except ValueError as e:
+                fill_error = str(e)
+
+        if not group_columns or not fill_columns:
+            st.info("Select the column(s) to group by and the columns to fill.")
+        elif fill_error is not None:
+            st.error(fill_error)
         else:
-            fill_action = st.selectbox("Choose fill action:", ["Mean", "Median", "Mode"])
-            
-            
-            preview_df = df.copy()
-            if fill_action == "Mean":
-                preview_df[selected_column] = preview_df.groupby(target_col)[selected_column].transform(lambda x: x.fillna(x.mean()))
-            elif fill_action == "Median":
-                preview_df[selected_column] = preview_df.groupby(target_col)[selected_column].transform(lambda x: x.fillna(x.median()))
-            elif fill_action == "Mode":
-                preview_df[selected_column] = preview_df.groupby(target_col)[selected_column].transform(lambda x: x.fillna(x.mode()[0]))
-
-            # with st.expander("View Unique Values"):
-            #     value_counts = preview_df[selected_column].value_counts(dropna=False)                    
-            #     st.dataframe(value_counts)
+            group_label = ", ".join(group_columns)
 
             # Show Density after Filling
             with st.expander("View Updated Density Plot"):
-                fig, ax = plt.subplots()
-                sns.kdeplot(preview_df[selected_column].dropna(), ax=ax, fill=True, color="green")
-                ax.set_title(f"Updated Density Plot for {selected_column}")
-                st.pyplot(fig)
+                def draw(ax):
+                    sns.kdeplot(preview_df[selected_column].dropna(), ax=ax, fill=True, color="green")
+                    ax.set_title(f"Updated Density Plot for {selected_column}")
+                show_figure((dataset_version(), selected_column, "kde_filled", json.dumps(fill_steps, default=str)), draw)
 
             if st.button("Apply Fill Action"):
-                df[selected_column] = preview_df[selected_column]
-                st.success(f"Applied {fill_action} based fill action for {selected_column} based on {target_col}.")
+                for column in fill_columns:
+                    df[column] = preview_df[column]
+                st.success(f"Applied {fill_action} based fill action for {', '.join(fill_columns)} based on {group_label}.")
 
-                st.write(f"Filled NaN values in selected columns based on the '{target_col}' column using {fill_action}.")
-                st.session_state["data"] = df
+                st.write(f"Filled NaN values in selected columns based on the '{group_label}' column(s) using {fill_action}.")
+                commit_dataset(df, "replace_column_values", fill_columns)
+                for column, fill_step in zip(fill_columns, fill_steps):
+                    log_change("replace_column_values", f"Filled NaN values in column: {column} using {fill_action} per {group_label}", column, step=fill_step)
 
     else:
-        preview_df = df.copy()
         if action == "Fill with Mean":
-            preview_df[selected_column].fillna(preview_df[selected_column].mean(), inplace=True)
+            fill_value = df[selected_column].mean()
         elif action == "Fill with Median":
-            preview_df[selected_column].fillna(preview_df[selected_column].median(), inplace=True)
-        elif action == "Fill with Mode":
-            preview_df[selected_column].fillna(preview_df[selected_column].mode()[0], inplace=True)
+            fill_value = df[selected_column].median()
+        else:
+            fill_value = df[selected_column].mode()[0]
+        fill_step = make_step("fill_value", column=selected_column, value=fill_value)
+        preview_df = apply_step(df, fill_step)
         
         with st.expander("View Updated Density Plot"):
-            fig, ax = plt.subplots()
-            sns.kdeplot(preview_df[selected_column].dropna(), ax=ax, fill=True, color="green")
-            ax.set_title(f"Updated Density Plot for {selected_column}")
-            st.pyplot(fig)
+            def draw(ax):
+                sns.kdeplot(preview_df[selected_column].dropna(), ax=ax, fill=True, color="green")
+                ax.set_title(f"Updated Density Plot for {selected_column}")
+            show_figure((dataset_version(), selected_column, "kde_filled", json.dumps(fill_step, default=str)), draw)
 
         if st.button("Apply Fill Action"):
             df[selected_column] = preview_df[selected_column]
             st.success(f"Filled NaN values in column '{selected_column}' using {action}.")
             
-            st.session_state["data"] = df
+            commit_dataset(df, "replace_column_values", [selected_column])
+            log_change("replace_column_values", f"Filled NaN values in column: {selected_column} using {action}", selected_column, step=fill_step)
             st.success(f"Filled NaN values in column '{selected_column}' using {action}.")
             st.write(df[selected_column].describe())
 
     if st.button("Restore Original Values", key=f"restore_numeric_{selected_column}"):
-        if f"original_{selected_column}" in st.session_state:
-            df[selected_column] = st.session_state[f"original_{selected_column}"]
-            st.session_state["data"] = df
+        restored = restore_original(df, selected_column)
+        if restored is not None:
+            df[selected_column] = restored
+            commit_dataset(df, "Restore Original Values", [selected_column])
             st.success(f"Restored original values in column '{selected_column}'.")
-            log_change(f"Restore Original Values  {selected_column}" ,preview_df[selected_column], df[selected_column])
-        else:
-            st.warning("No original values saved to restore.")
+            log_change("Restore Original Values", f"Restored original values for column: {selected_column}", selected_column, step=make_step("restore", column=selected_column))
 
-    
-    action = st.selectbox(
-        "Select action to apply:",
-        [
-            "Fill with Mean",
-            "Fill with Median",
-            "Fill with Mode",
-            "Fill NaN based on Categorical Target"
-        ]
-    )
-    st.session_state["data"] = df
-    if action == "Fill NaN based on Categorical Target":
-            target_col = st.selectbox("Select Categorical Target Column", df.columns)
-
-            # Ensure the target column is not one of the selected columns
-            if target_col in selected_column:
-                st.warning("The target column cannot be one of the selected columns. Please select a different column.")
-            else:
-                fill_action = st.selectbox("Choose fill action:", ["Mean", "Median", "Mode"])
-                
-                if fill_action == "Mean":
-                    df[selected_column] = df.groupby(target_col)[selected_column].transform(lambda x: x.fillna(x.mean()))
-                elif fill_action == "Median":
-                    df[selected_column] = df.groupby(target_col)[selected_column].transform(lambda x: x.fillna(x.median()))
-                elif fill_action == "Mode":
-                    df[selected_column] = df.groupby(target_col)[selected_column].transform(lambda x: x.fillna(x.mode()[0]))
-
-            st.write(f"Filled NaN values in selected columns based on the '{target_col}' column using {fill_action}.")
-
-    else:
-        
-        if action == "Fill with Mean":
-            df[selected_column].fillna(df[selected_column].mean(), inplace=True)
-        elif action == "Fill with Median":
-            df[selected_column].fillna(df[selected_column].median(), inplace=True)
-        elif action == "Fill with Mode":
-            df[selected_column].fillna(df[selected_column].mode()[0], inplace=True)
-                
-    if st.button("Save and Convert to Numeric", key=f"save_convert_numeric_{selected_column}"):
-        if f"original_{selected_column}" not in st.session_state:
-            st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
-
-        try:
-            
-            st.session_state["data"] = df
-            st.success(f"Converted column '{selected_column}' to {action}.")
-            st.write("Column Statistics (After Conversion):")
-            st.table(df[selected_column].describe())
-            log_change("replace_column_values", st.session_state[f"original_{selected_column}"].to_string(), df[selected_column].to_string())
-        except Exception as e:
-            st.error(f"Error converting to numeric: {e}")
-
-
-def log_change(operation: str, before: str, details: str):
-    """Log a change operation with timestamp"""
-    if 'change_log' not in st.session_state:
-        st.session_state.change_log = []
-    
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    st.session_state.change_log.append({
-        'timestamp': timestamp,
-        'operation': operation,
-        'Before': before,
-        'details': details
-    })
-
-# Add this function to display changes
-def show_change_log():
-    """Display the change log in the sidebar"""
-    if 'change_log' in st.session_state and st.session_state.change_log:
-        st.subheader("Change Log")
-        view_option = st.radio(
-            "View changes:",
-            ["Latest First", "Oldest First"]
-        )
-        
-        changes = st.session_state.change_log.copy()
-        if view_option == "Latest First":
-            changes.reverse()
-            
-        for change in changes:
-            with st.expander(f"{change['operation']} - {change['timestamp']}"):
-                st.write(change['Before'])
-                st.write(change['details'])
-    else:
-        st.info("No changes logged yet")
 
 def HandleBooleanColumn(df, selected_column):
     st.subheader(f"Handling Boolean Column: {selected_column}")
@@ -1096,30 +930,24 @@ def HandleBooleanColumn(df, selected_column):
     actions = ["Rename Column", "Convert to Numeric", "Visualization"]
     selected_action = st.selectbox("Select Action for Boolean Column", actions, key=f"boolean_action_{selected_column}")
 
-    # Save original state if not already saved
-    if f"original_{selected_column}" not in st.session_state:
-        st.session_state[f"original_{selected_column}"] = df[selected_column].copy()
-
     if selected_action == "Rename Column":
         RenameColumn(df, selected_column)
 
     elif selected_action == "Convert to Numeric":
-        df[selected_column] = df[selected_column].astype(int)
-        st.success(f"Converted boolean column '{selected_column}' to numeric.")
-        st.session_state["data"] = df
-        log_change("ConvertToNumeric", st.session_state[f"original_{selected_column}"].to_string(), df[selected_column].to_string())
+        if st.button("Save and Convert to Numeric", key=f"save_convert_boolean_{selected_column}"):
+            df[selected_column] = df[selected_column].astype(int)
+            st.success(f"Converted boolean column '{selected_column}' to numeric.")
+            commit_dataset(df, "ConvertToNumeric", [selected_column])
+            log_change("ConvertToNumeric", f"Converted boolean column to numeric: {selected_column}", selected_column, step=make_step("to_int", column=selected_column))
 
     elif selected_action == "Visualization":
         Visualization(df, selected_column)
 
-    log_change("HandleBooleanColumn", df[selected_column].to_string(), f"Handled boolean column: {selected_column}")
-
     # Restore original button
     if st.button("Restore Original Values", key=f"restore_{selected_column}"):
-        if f"original_{selected_column}" in st.session_state:
-            df[selected_column] = st.session_state[f"original_{selected_column}"]
-            st.session_state["data"] = df
+        restored = restore_original(df, selected_column)
+        if restored is not None:
+            df[selected_column] = restored
+            commit_dataset(df, "Restore Original Values", [selected_column])
             st.success(f"Restored original values for column '{selected_column}'.")
-            log_change("Restore Original Values", "N/A", f"Restored original values for column: {selected_column}")
-        else:
-            st.warning("No original values saved to restore.")
\ No newline at end of file
+            log_change("Restore Original Values", f"Restored original values for column: {selected_column}", selected_column, step=make_step("restore", column=selected_column))
\ No newline at end of file
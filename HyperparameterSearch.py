@@ -0,0 +1,142 @@
+"""Random-forest hyperparameter search, independent of the UI.
+
+``search_hyperparameters`` samples candidate settings from ``SEARCH_SPACE`` and
+fits them in parallel on the prepared training split of a
+``ModelEngine.PredictionManager`` (the cached, already resampled arrays), scoring
+each on a validation slice held out from that split so the test split stays
+untouched for the final model. Successive halving fits every candidate on a
+small share of the training rows, keeps the best ``1/eta`` and gives the
+survivors ``eta`` times more rows, until the last candidates use all of them.
+Random search fits every candidate once on all rows.
+
+Trials are yielded as they finish, so callers can show a live leaderboard, and
+the search stops early once the time budget is used up.
+"""
+import math
+import time
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.model_selection import train_test_split
+
+from ModelEngine import CV_N_JOBS, RANDOM_STATE, build_random_forest, evaluate_predictions
+
+SEARCH_METHODS = ["Successive halving", "Random search"]
+
+# Candidate values per hyperparameter, matching the ranges of the sidebar sliders.
+SEARCH_SPACE = {
+    "n_estimators": list(range(50, 501, 50)),
+    "max_depth": list(range(3, 21)),
+}
+
+# Share of the remaining candidates dropped per rung is 1 - 1/eta.
+HALVING_ETA = 3
+# Fewest training rows a successive-halving trial is fitted on.
+MIN_TRIAL_ROWS = 200
+# Share of the prepared training split held out to score trials.
+VALIDATION_SIZE = 0.2
+# Metric the candidates are ranked by.
+SEARCH_METRIC = "F1 Score"
+
+SearchTrial = namedtuple('SearchTrial', ['candidate', 'rung', 'n_rows', 'params', 'score', 'metrics', 'fit_time'])
+
+
+def sample_candidates(n_candidates, random_state=None, search_space=SEARCH_SPACE):
+    """Up to ``n_candidates`` distinct settings drawn at random from ``search_space``."""
+    names = list(search_space)
+    grid_size = math.prod(len(search_space[name]) for name in names)
+    rng = np.random.default_rng(random_state)
+    flat = rng.choice(grid_size, size=min(n_candidates, grid_size), replace=False)
+    candidates = []
+    for position in flat:
+        params = {}
+        for name in reversed(names):
+            position, index = divmod(int(position), len(search_space[name]))
+            params[name] = search_space[name][index]
+        candidates.append({name: params[name] for name in names})
+    return candidates
+
+
+def halving_schedule(n_candidates, n_rows, eta=HALVING_ETA, min_rows=MIN_TRIAL_ROWS):
+    """(candidates kept, training rows) for each rung of successive halving."""
+    n_rungs = 1 + int(math.log(max(n_candidates, 1), eta) + 1e-9)
+    schedule = []
+    for rung in range(n_rungs):
+        rows = int(n_rows * eta ** (rung - n_rungs + 1))
+        schedule.append((max(1, n_candidates // eta ** rung), min(n_rows, max(rows, min_rows))))
+    return schedule
+
+
+def _fit_trial(candidate, rung, params, X, y, X_val, y_val, n_rows, class_weight):
+    """Fit and score one candidate on the first ``n_rows`` training rows; runs inside a worker process."""
+    model = build_random_forest(class_weight=class_weight, **params)
+    start = time.perf_counter()
+    model.fit(X[:n_rows], y[:n_rows])
+    fit_time = time.perf_counter() - start
+    metrics = evaluate_predictions(y_val, model.predict(X_val))
+    return SearchTrial(candidate, rung, n_rows, params, metrics[SEARCH_METRIC], metrics, fit_time)
+
+
+def search_hyperparameters(pred_manager, method="Successive halving", n_candidates=27, time_budget=None,
+                           n_jobs=CV_N_JOBS, class_weight=None, random_state=RANDOM_STATE):
+    """Yield a ``SearchTrial`` for every trial as it finishes.
+
+    ``pred_manager`` must have prepared its data. ``time_budget`` is in
+    seconds; once it is used up, the running rung is cancelled and no further
+    rung starts.
+    """
+    if pred_manager.X_train is None:
+        raise ValueError("Prepare the data before searching.")
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Unknown search method: {method}")
+
+    X, X_val, y, y_val = train_test_split(
+        pred_manager.X_train, pred_manager.y_train, test_size=VALIDATION_SIZE, random_state=random_state,
+        stratify=pred_manager.y_train
+    )
+    candidates = sample_candidates(n_candidates, random_state)
+    if method == "Random search":
+        schedule = [(len(candidates), len(X))]
+    else:
+        schedule = halving_schedule(len(candidates), len(X))
+
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    survivors = list(range(len(candidates)))
+    for rung, (n_kept, n_rows) in enumerate(schedule):
+        survivors = survivors[:n_kept]
+        trials = Parallel(n_jobs=n_jobs, return_as="generator_unordered")(
+            delayed(_fit_trial)(candidate, rung, candidates[candidate], X, y, X_val, y_val, n_rows, class_weight)
+            for candidate in survivors
+        )
+        results = []
+        try:
+            for trial in trials:
+                results.append(trial)
+                yield trial
+                if deadline is not None and time.perf_counter() > deadline:
+                    return
+        finally:
+            with warnings.catch_warnings():
+                # Closing the generator cancels the trials still queued
+                warnings.simplefilter("ignore", UserWarning)
+                trials.close()
+        survivors = [trial.candidate for trial in sorted(results, key=lambda trial: trial.score, reverse=True)]
+
+
+def leaderboard(trials):
+    """The latest trial of every candidate, furthest rung and best score first."""
+    if not trials:
+        return pd.DataFrame(columns=["Candidate", "Rung", "Training Rows", SEARCH_METRIC, "Fit Time (s)"])
+    latest = {}
+    for trial in trials:
+        if trial.candidate not in latest or trial.rung > latest[trial.candidate].rung:
+            latest[trial.candidate] = trial
+    rows = [
+        {"Candidate": trial.candidate, **trial.params, "Rung": trial.rung, "Training Rows": trial.n_rows,
+         SEARCH_METRIC: trial.score, "Fit Time (s)": trial.fit_time}
+        for trial in latest.values()
+    ]
+    return pd.DataFrame(rows).sort_values(["Rung", SEARCH_METRIC], ascending=False, ignore_index=True)
@@ -0,0 +1,235 @@
+"""Local HTTP inference server for models from the registry:
+
+    python InferenceServer.py --model random_forest-Status-v1 --port 8502
+
+Endpoints:
+    POST /predict  {"instances": [{"Age": 50, ...}, ...]}  (or a single "instance")
+    GET  /stats    request count, batch sizes and p50/p99 latency in milliseconds
+    GET  /model    metadata of the served model
+    GET  /health
+
+Concurrent requests are coalesced into micro-batches: a batching thread waits at
+most ``--max-wait-ms`` after the first queued request and scores everything
+queued so far with one vectorized ``predict_proba`` call. With ``--compiled`` a
+random forest is scored through its flattened copy (see ForestCompiler.py),
+which is faster for the small batches a lightly loaded server sees.
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from ForestCompiler import CompiledForest, compile_for_inference
+from ModelRegistry import get_record, list_models, load_check_rows, load_model
+
+DEFAULT_PORT = 8502
+MAX_BATCH_ROWS = 512
+MAX_WAIT_MS = 2.0
+# Latencies kept for the percentiles reported by /stats.
+LATENCY_WINDOW = 10_000
+
+
+class _PendingRequest:
+    __slots__ = ("rows", "done", "proba", "error")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.proba = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Scores queued requests together with one ``predict_proba`` call per batch."""
+
+    def __init__(self, model, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.batched_rows = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def predict_proba(self, rows):
+        """Queue ``rows`` (a float32 2-D array) and block until their batch is scored."""
+        pending = _PendingRequest(rows)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.proba
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        n_rows = len(batch[0].rows)
+        deadline = time.perf_counter() + self.max_wait
+        while n_rows < self.max_batch_rows:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            n_rows += len(pending.rows)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                proba = self.model.predict_proba(np.vstack([pending.rows for pending in batch]))
+                offset = 0
+                for pending in batch:
+                    pending.proba = proba[offset:offset + len(pending.rows)]
+                    offset += len(pending.rows)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            self.batches += 1
+            self.batched_rows += sum(len(pending.rows) for pending in batch)
+            for pending in batch:
+                pending.done.set()
+
+
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.count = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self._latencies.append(seconds)
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self._latencies)
+        if len(latencies) == 0:
+            return {"requests": self.count, "p50_ms": None, "p99_ms": None}
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        return {"requests": self.count, "p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3)}
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Per-request logging costs more than a prediction
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/model":
+            self._send_json(200, server.record.metadata)
+        elif self.path == "/stats":
+            batcher = server.batcher
+            stats = server.latency.summary()
+            stats.update(batches=batcher.batches, compiled=isinstance(batcher.model, CompiledForest),
+                         mean_batch_rows=round(batcher.batched_rows / batcher.batches, 2) if batcher.batches else None)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+        start = time.perf_counter()
+        server = self.server
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            instances = payload["instances"] if "instances" in payload else [payload["instance"]]
+            rows = np.array(
+                [[instance[feature] for feature in server.features] if isinstance(instance, dict) else instance
+                 for instance in instances],
+                dtype=np.float32
+            )
+            if rows.ndim != 2 or rows.shape[1] != len(server.features):
+                raise ValueError(f"Expected {len(server.features)} features: {server.features}")
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            proba = server.batcher.predict_proba(rows)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {
+            "predictions": server.classes[proba.argmax(axis=1)].tolist(),
+            "probabilities": proba.tolist(),
+            "classes": server.classes.tolist(),
+        })
+        server.latency.record(time.perf_counter() - start)
+
+
+def make_server(record, host="127.0.0.1", port=DEFAULT_PORT, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS,
+                compiled=False):
+    """Build a threading HTTP server serving the model of a registry record.
+
+    With ``compiled`` a random forest is served through a ``CompiledForest``
+    verified on the feature rows saved with the model (rows around its split
+    thresholds for models saved without them); other models, and forests that
+    fail the check, are served as they are.
+    """
+    model = load_model(record)
+    if compiled:
+        model = compile_for_inference(model, load_check_rows(record))
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    server.daemon_threads = True
+    server.record = record
+    server.features = record.metadata["features"]
+    server.classes = np.asarray(model.classes_)
+    server.batcher = MicroBatcher(model, max_batch_rows, max_wait_ms)
+    server.latency = LatencyTracker()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a model from the registry over HTTP.")
+    parser.add_argument("--model", help="Model id from the registry (default: the newest model)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_ROWS, help="Rows scored per batch at most")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="Time a batch waits for more requests")
+    parser.add_argument("--compiled", action="store_true", help="Score random forests with flattened tree traversal")
+    args = parser.parse_args()
+
+    if args.model:
+        served_record = get_record(args.model)
+    else:
+        saved_models = list_models()
+        if not saved_models:
+            parser.error("The model registry is empty; train a model in the app first.")
+        served_record = saved_models[0]
+
+    httpd = make_server(served_record, args.host, args.port, args.max_batch, args.max_wait_ms, args.compiled)
+    compiled_note = " (compiled)" if isinstance(httpd.batcher.model, CompiledForest) else ""
+    print(f"Serving {served_record.model_id}{compiled_note} on http://{args.host}:{args.port}/predict")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(httpd.latency.summary()))
+        httpd.server_close()
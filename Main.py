@@ -1,32 +1,45 @@
 import streamlit as st
 import pandas as pd
 import ollama
-from io import StringIO
 from HandlingSection import *
+from DatasetStore import init_dataset, commit_dataset, dataset_version, get_dataset_store
+from AnalysisEngine import describe_profiles, describe_categories, profile_info
+from Pipeline import make_step
+from DataLoader import (
+    UPLOAD_TYPES, DOWNLOAD_FORMATS, CSV_COMPRESSIONS, load_uploaded_dataset, lazy_download,
+    save_checkpoint, list_checkpoints, load_checkpoint, session_id
+)
 
 def main():
     # App Title
     st.title("Data Mining Analysis")
     
     # Dataset upload
-    uploaded_file = st.sidebar.file_uploader("Upload your dataset", type=["csv", "xlsx"])
+    uploaded_file = st.sidebar.file_uploader("Upload your dataset", type=UPLOAD_TYPES)
+    streaming = st.sidebar.checkbox(
+        "Streaming ingestion (compact dtypes)",
+        value=False,
+        help="Read CSV files in chunks and store numbers in the smallest fitting type, "
+             "0/1 flags as booleans and low-cardinality text as categories."
+    )
     df = None
     if uploaded_file is not None:
-        if 'data' not in st.session_state :
+        data_source = (uploaded_file.file_id, streaming)
+        if 'data' not in st.session_state or st.session_state.get('data_source') != data_source:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    DataFromCSV = StringIO(uploaded_file.getvalue().decode("utf-8"))
-                    df = pd.read_csv(DataFromCSV)
-                elif uploaded_file.name.endswith('.xlsx'):
-                    df = pd.read_excel(uploaded_file)
+                # Parsed frames are cached by content hash and shared between sessions
+                df, digest = load_uploaded_dataset(uploaded_file, streaming=streaming)
 
-                st.session_state['data'] = df
+                init_dataset(df)
+                st.session_state['data_hash'] = digest
+                st.session_state['data_source'] = data_source
                 st.sidebar.success("Dataset uploaded successfully!")
 
             except Exception as e:
                 st.error("Error reading file: " + str(e))
         else:
-            df = st.session_state['data'].copy()
+            # Copy-on-write view: columns are only copied once they are modified
+            df = st.session_state['data'].copy(deep=False)
 
     # Sidebar for navigation
     with st.sidebar:
@@ -44,16 +57,13 @@ def main():
     # Dataset Info
     def display_dataset_info():
         st.markdown("### Dataset Information")
-        dataset_info = {
-        "Column Name": df.columns,
-        "Non-Null Count": df.notnull().sum(),
-        "Data Type": df.dtypes
-        }
-
-        dataset_info_df = pd.DataFrame(dataset_info).reset_index(drop=True)
+        # Column profiles are cached with the dataset versions; only edited columns are profiled again
+        profiles = get_dataset_store().column_profiles()
+        dataset_info_df = profile_info(profiles)
         
         # Add memory usage
-        memory_usage = df.memory_usage(deep=True).sum() / 1024 ** 2  # Convert to MB
+        memory_bytes = sum(profile.memory_bytes for profile in profiles.values()) + df.index.memory_usage(deep=True)
+        memory_usage = memory_bytes / 1024 ** 2  # Convert to MB
         st.markdown(f"#### Total Memory Usage: {memory_usage:.2f} MB, Shape: { df.shape} .")
         
         styled_info = dataset_info_df.style.background_gradient(cmap="coolwarm")
@@ -62,21 +72,22 @@ def main():
     def describe_dataset():
         """Display descriptive statistics for numeric and object columns separately."""
         st.markdown("### Descriptive Statistics")
+        profiles = get_dataset_store().column_profiles()
 
         # Numeric columns
-        numeric_cols = df.select_dtypes(include=['float64', 'int64'])
+        numeric_cols = df.select_dtypes(include='number').columns
         if not numeric_cols.empty:
             st.markdown("#### Numeric Columns")
-            styled_numeric = numeric_cols.describe().style.background_gradient(cmap="coolwarm")
+            styled_numeric = describe_profiles(profiles, numeric_cols).style.background_gradient(cmap="coolwarm")
             st.table(styled_numeric)
         else:
             st.warning("No numeric columns found in the dataset.")
 
         # Categorical columns
-        object_cols = df.select_dtypes(include=['object'])
+        object_cols = df.select_dtypes(include=['object', 'category']).columns
         if not object_cols.empty:
             st.markdown("#### Categorical Columns")
-            styled_object = object_cols.describe().style.set_properties(**{'text-align': 'center'})
+            styled_object = describe_categories(profiles, object_cols).style.set_properties(**{'text-align': 'center'})
             st.table(styled_object)
         else:
             st.warning("No categorical columns found in the dataset.")
@@ -94,15 +105,15 @@ def main():
             st.write("### Missing Values Analysis for All Columns")
             missing_value_analysis(df)
         else:
-            if df[selected_column].dtype in ['int64', 'float64']:
-                HandleNumericColumn(df,selected_column )
-            elif df[selected_column].dtype == 'bool':
+            if df[selected_column].dtype == 'bool':
                 HandleBooleanColumn(df, selected_column)
+            elif pd.api.types.is_numeric_dtype(df[selected_column].dtype):
+                HandleNumericColumn(df,selected_column )
             else :
                 handle_object_column(df, selected_column)
 
     def AdvancedDataAnalysis():
-        numerical_columns = [col for col in df.select_dtypes(include=[float, int]).columns]
+        numerical_columns = [col for col in df.select_dtypes(include='number').columns]
         analysis_type = st.selectbox("Select Analysis Type", ["Correlation Analysis", "Feature Importance", "Statistical Tests"])
         if analysis_type == "Correlation Analysis":
             features = st.multiselect("Select features for correlation analysis", numerical_columns )
@@ -129,6 +140,8 @@ def main():
         st.write(f"Number of duplicate rows: {duplicates}")
         if duplicates > 0 and st.button("Remove Duplicates"):
             df.drop_duplicates(inplace=True)
+            commit_dataset(df, "Remove Duplicates", [])
+            log_change("handle_duplicates", f"Removed {duplicates} duplicate rows", step=make_step("drop_duplicates"))
             st.success("Duplicates removed!")
             st.write(f"Number of duplicate rows after removal: {df.duplicated().sum()}")
 
@@ -247,13 +260,44 @@ def main():
 
     # Download modified dataset
     if df is not None:
+        download_format = st.sidebar.selectbox("Download format", list(DOWNLOAD_FORMATS))
+        extension, mime = DOWNLOAD_FORMATS[download_format]
+        compression = "None"
+        if extension == "csv":
+            compression = st.sidebar.selectbox("Compression", list(CSV_COMPRESSIONS))
+            suffix, mime = CSV_COMPRESSIONS[compression]
+            extension += suffix
+        # The payload is only built when the button is clicked, and cached per dataset version
         st.sidebar.download_button(
         label="Download Dataset with Modifications",
-        data=df.to_csv(index=False),
-        file_name=st.sidebar.text_input("Enter file name (with .csv extension):", value="modified_dataset.csv"),
-        mime="text/csv"
+        data=lazy_download(st.session_state["data"], dataset_version(), DOWNLOAD_FORMATS[download_format][0], compression),
+        file_name=st.sidebar.text_input(f"Enter file name (with .{extension} extension):", value=f"modified_dataset.{extension}"),
+        mime=mime
     )
 
+        # Arrow checkpoints of the working dataset, memory-mapped back on load
+        with st.sidebar.expander("Working Dataset Checkpoints"):
+            checkpoint_name = st.text_input("Checkpoint name", value="working_dataset")
+            if st.button("Save Checkpoint"):
+                try:
+                    saved_name = save_checkpoint(df, checkpoint_name, session_id())
+                    st.success(f"Saved checkpoint '{saved_name}'.")
+                except (ValueError, OSError) as e:
+                    st.error(f"Error saving checkpoint: {e}")
+
+            checkpoints = list_checkpoints(session_id())
+            if checkpoints:
+                selected_checkpoint = st.selectbox("Saved checkpoints", checkpoints)
+                if st.button("Load Checkpoint"):
+                    checkpoint = load_checkpoint(selected_checkpoint, session_id())
+                    if checkpoint is None:
+                        st.error(f"Checkpoint '{selected_checkpoint}' is no longer available; it was removed by the cleanup of old checkpoints.")
+                    else:
+                        init_dataset(checkpoint, "Load Checkpoint")
+                        log_change("Load Checkpoint", f"Loaded checkpoint '{selected_checkpoint}'")
+                        st.success(f"Loaded checkpoint '{selected_checkpoint}'.")
+                        st.rerun()
+
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
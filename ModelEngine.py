@@ -0,0 +1,245 @@
+"""UI-free model training and evaluation used by ``PredictionManager.py`` and ``AnalysisCLI.py``."""
+import copy
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, f1_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.svm import SVC
+
+from Resampling import make_resampler
+
+RANDOM_STATE = 42
+
+# Cross-validated comparison: default number of folds, and worker processes
+# (-1 uses every core). Each (model, fold) pair is one task of the pool.
+CV_FOLDS = 5
+CV_N_JOBS = -1
+METRIC_NAMES = ["Accuracy", "F1 Score", "Precision", "Recall"]
+
+# Rows scored per predict_proba call in batch prediction.
+BATCH_SCORE_ROWS = 50_000
+
+# Prepared (resampled and split) training data kept across reruns, least
+# recently used first out.
+MAX_PREPARED_SPLITS = 8
+_prepared_splits = OrderedDict()
+_prepared_lock = threading.Lock()
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+def _prepare_splits(X, y, test_size, random_state, strategy):
+    """Resample with ``strategy`` and split; X comes back as contiguous float32 arrays."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    resampler = make_resampler(strategy, random_state)  # Handle class imbalance
+    if resampler is not None:
+        X_resampled, y_resampled = resampler.fit_resample(X, y)
+    else:
+        X_resampled, y_resampled = X, y
+    X_train, X_test, y_train, y_test = train_test_split(
+        X_resampled, y_resampled, test_size=test_size, random_state=random_state, stratify=y_resampled
+    )
+    return (
+        _read_only(np.ascontiguousarray(X_train, dtype=np.float32)),
+        _read_only(np.ascontiguousarray(X_test, dtype=np.float32)),
+        _read_only(np.ascontiguousarray(y_train)),
+        _read_only(np.ascontiguousarray(y_test)),
+    )
+
+
+def clear_prepared_splits():
+    with _prepared_lock:
+        _prepared_splits.clear()
+
+
+class PredictionManager:
+    def __init__(self, df, version=None):
+        self.df = df
+        # Dataset version token; when set, prepared splits are memoized under it
+        self.version = version
+        self.X_train = None
+        self.X_test = None
+        self.y_train = None
+        self.y_test = None
+        # Key of the prepared split; models fitted on the same key saw the same rows
+        self.split_key = None
+
+    def prepare_data(self, target_column, features, test_size=0.2, random_state=RANDOM_STATE, strategy="SMOTE"):
+        """Prepare data for training.
+
+        ``strategy`` is one of ``Resampling.IMBALANCE_STRATEGIES``. The splits are
+        read-only float32 arrays. With a dataset version they are cached by
+        (version, target, features, test_size, random_state, strategy), so reruns
+        that change nothing else skip resampling and the split.
+        """
+        key = None if self.version is None else (self.version, target_column, tuple(features), test_size, random_state, strategy)
+        splits = None
+        if key is not None:
+            with _prepared_lock:
+                splits = _prepared_splits.get(key)
+                if splits is not None:
+                    _prepared_splits.move_to_end(key)
+
+        if splits is None:
+            splits = _prepare_splits(self.df[list(features)], self.df[target_column], test_size, random_state, strategy)
+            if key is not None:
+                with _prepared_lock:
+                    _prepared_splits[key] = splits
+                    while len(_prepared_splits) > MAX_PREPARED_SPLITS:
+                        _prepared_splits.popitem(last=False)
+
+        self.X_train, self.X_test, self.y_train, self.y_test = splits
+        self.split_key = key
+
+
+def build_models(n_estimators=100, max_depth=10, probability=True, class_weight=None):
+    """The candidate models offered by "Compare Models".
+
+    Comparing only needs class predictions, so ``probability=False`` skips the
+    internal 5-fold Platt calibration that ``SVC(probability=True)`` runs on
+    every fit. ``class_weight`` is passed to every model.
+    """
+    svc_params = {"probability": True} if probability else {}
+    return {
+        "Random Forest": build_random_forest(n_estimators, max_depth, class_weight),
+        "SVM": SVC(class_weight=class_weight, random_state=RANDOM_STATE, **svc_params),
+        "Logistic Regression": LogisticRegression(class_weight=class_weight, random_state=RANDOM_STATE)
+    }
+
+
+def build_random_forest(n_estimators=100, max_depth=10, class_weight=None):
+    return RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, class_weight=class_weight,
+                                  random_state=RANDOM_STATE)
+
+
+def evaluate_predictions(y_true, y_pred):
+    """Accuracy and weighted F1/precision/recall of a set of predictions."""
+    return {
+        "Accuracy": accuracy_score(y_true, y_pred),
+        "F1 Score": f1_score(y_true, y_pred, average="weighted"),
+        "Precision": precision_score(y_true, y_pred, average="weighted"),
+        "Recall": recall_score(y_true, y_pred, average="weighted")
+    }
+
+
+def _fit_fold(model_name, model, X, y, train_index, test_index, resampler):
+    """Fit one model on one fold; runs inside a worker process."""
+    start = time.time()
+    X_train, y_train = X[train_index], y[train_index]
+    if resampler is not None:
+        # Resample the training fold only, so synthetic rows never leak into the test fold
+        X_train, y_train = clone(resampler).fit_resample(X_train, y_train)
+    model = clone(model)
+    fit_start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - fit_start
+    y_pred = model.predict(X[test_index])
+    return {"Model": model_name, **evaluate_predictions(y[test_index], y_pred),
+            "fit_time": fit_time, "start": start, "end": time.time()}
+
+
+def cross_validate_models(X, y, models, n_splits=CV_FOLDS, n_jobs=CV_N_JOBS, resampler=None):
+    """Stratified k-fold comparison of ``models`` across a process pool.
+
+    All (model, fold) fits are independent tasks, so models and folds run in
+    parallel together. Returns one row per model with the mean and standard
+    deviation of every metric, the mean fit time per fold and the wall-clock
+    time from the first to the last of its folds.
+    """
+    X = np.ascontiguousarray(X)
+    y = np.asarray(y)
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=RANDOM_STATE).split(X, y))
+    fold_results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(model_name, model, X, y, train_index, test_index, resampler)
+        for model_name, model in models.items()
+        for train_index, test_index in folds
+    )
+
+    per_fold = pd.DataFrame(fold_results)
+    results = []
+    for model_name in models:
+        model_folds = per_fold[per_fold["Model"] == model_name]
+        row = {"Model": model_name}
+        for metric in METRIC_NAMES:
+            row[metric] = model_folds[metric].mean()
+            row[f"{metric} Std"] = model_folds[metric].std(ddof=0)
+        row["Fit Time (s)"] = model_folds["fit_time"].mean()
+        row["Wall Time (s)"] = model_folds["end"].max() - model_folds["start"].min()
+        results.append(row)
+    return pd.DataFrame(results)
+
+
+def warm_start_from(previous, model):
+    """A copy of the fitted ``previous`` set up to continue towards ``model``, or ``model`` itself.
+
+    A random forest whose settings only differ in a larger ``n_estimators``
+    keeps its fitted trees and fits just the new ones. The added trees draw the
+    same seeds as in a fresh fit, so the result is identical to refitting all
+    of them. ``previous`` must have been fitted on the data ``model`` will be
+    fitted on.
+    """
+    if previous is None or type(previous) is not type(model) or not hasattr(previous, "classes_"):
+        return model
+    previous_params = previous.get_params()
+    changed = {name for name, value in model.get_params().items() if previous_params.get(name) != value} - {"warm_start"}
+
+    if isinstance(model, RandomForestClassifier) and changed <= {"n_estimators"} \
+            and model.n_estimators >= previous.n_estimators:
+        continued = copy.deepcopy(previous)
+        continued.set_params(n_estimators=model.n_estimators, warm_start=True)
+        return continued
+    return model
+
+
+def train_model(pred_manager, model, previous=None):
+    """Fit ``model`` on the prepared split; return it with its report, confusion matrix and metrics.
+
+    With a ``previous`` model fitted on the same split, training continues from
+    it where ``warm_start_from`` allows; the returned model is then a new
+    object rather than ``model``.
+    """
+    fitted = warm_start_from(previous, model)
+    with warnings.catch_warnings():
+        # A warm-started forest that did not grow has no trees left to fit
+        warnings.filterwarnings("ignore", message="Warm-start fitting without increasing")
+        fitted.fit(pred_manager.X_train, pred_manager.y_train)
+    if fitted is not model:
+        fitted.set_params(warm_start=False)
+    model = fitted
+    y_pred = model.predict(pred_manager.X_test)
+    report = classification_report(pred_manager.y_test, y_pred)
+    metrics = evaluate_predictions(pred_manager.y_test, y_pred)
+    return model, report, confusion_matrix(pred_manager.y_test, y_pred), metrics
+
+
+def score_chunk(model, chunk, features):
+    """Predictions and class probabilities for ``chunk`` from one ``predict_proba`` pass.
+
+    The predicted class is the most probable one, which is what ``predict``
+    returns for the forest and logistic models.
+    """
+    X = chunk[list(features)].to_numpy(dtype=np.float32)
+    proba = model.predict_proba(X)
+    scored = pd.DataFrame(proba, columns=[f"probability_{label}" for label in model.classes_], index=chunk.index)
+    scored.insert(0, "prediction", model.classes_[proba.argmax(axis=1)])
+    return scored
+
+
+def score_in_chunks(model, df, features, chunk_rows=BATCH_SCORE_ROWS):
+    """Yield ``df`` in chunks of ``chunk_rows`` rows with prediction columns appended."""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield pd.concat([chunk, score_chunk(model, chunk, features)], axis=1)
@@ -0,0 +1,210 @@
+"""File-backed registry of trained models, shared by every session and process.
+
+Each saved model gets its own versioned directory holding the uncompressed
+joblib dump (so its arrays can be memory-mapped on load) and a small
+``metadata.json`` with the feature list, target, hyperparameters, dataset
+fingerprint and metrics, and optionally a few feature rows of the training
+data that servers check a compiled copy of the model against. Listing only
+reads the metadata files; models are loaded lazily and kept in a small
+process-wide cache.
+
+A version is claimed by creating its directory, which succeeds for exactly one
+of several processes saving the same name at once. Only the newest
+``MAX_VERSIONS_PER_NAME`` versions of every name are kept; older ones are
+removed when a new version is saved.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_registry")
+MODEL_FILE = "model.joblib"
+METADATA_FILE = "metadata.json"
+CHECK_ROWS_FILE = "check_rows.npy"
+
+# Loaded models kept in memory per process.
+MAX_LOADED_MODELS = 4
+# Saved versions kept per model name; older ones are removed on save.
+MAX_VERSIONS_PER_NAME = 5
+
+ModelRecord = namedtuple('ModelRecord', ['model_id', 'name', 'version', 'path', 'metadata'])
+
+_loaded_models = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def dataset_fingerprint(df, columns=None):
+    """Content hash of the given columns of ``df`` (all columns by default)."""
+    data = df if columns is None else df[list(columns)]
+    hashed = pd.util.hash_pandas_object(data, index=False).values
+    digest = hashlib.blake2b(hashed.tobytes(), digest_size=16)
+    digest.update(json.dumps([str(column) for column in data.columns]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _safe_name(name):
+    """Directory name of a model name; a short hash of the raw name keeps names that sanitize alike apart."""
+    sanitized = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in name).strip("_") or "model"
+    return f"{sanitized}-{hashlib.blake2b(name.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+def _model_dir(name, version, registry_dir):
+    return os.path.join(registry_dir, _safe_name(name), f"v{version}")
+
+
+def _read_record(path):
+    with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as handle:
+        metadata = json.load(handle)
+    return ModelRecord(metadata["model_id"], metadata["name"], metadata["version"], path, metadata)
+
+
+def list_models(target=None, features=None, registry_dir=REGISTRY_DIR):
+    """Records of the saved models, newest first.
+
+    With ``target`` and/or ``features`` only models trained for that target and
+    exactly that feature set (in any order) are returned.
+    """
+    records = []
+    if not os.path.isdir(registry_dir):
+        return records
+    for name in os.listdir(registry_dir):
+        name_dir = os.path.join(registry_dir, name)
+        if not os.path.isdir(name_dir):
+            continue
+        for version in os.listdir(name_dir):
+            path = os.path.join(name_dir, version)
+            if not os.path.isfile(os.path.join(path, METADATA_FILE)):
+                continue
+            try:
+                record = _read_record(path)
+            except (OSError, ValueError, KeyError):
+                continue
+            if target is not None and record.metadata["target"] != target:
+                continue
+            if features is not None and sorted(record.metadata["features"]) != sorted(features):
+                continue
+            records.append(record)
+    return sorted(records, key=lambda record: (record.metadata["created"], record.version), reverse=True)
+
+
+def _versions(name, registry_dir):
+    name_dir = os.path.join(registry_dir, _safe_name(name))
+    if not os.path.isdir(name_dir):
+        return []
+    return sorted(int(entry[1:]) for entry in os.listdir(name_dir) if entry.startswith("v") and entry[1:].isdigit())
+
+
+def _claim_version(name, registry_dir):
+    """Create the directory of the next free version of ``name`` and return its number.
+
+    ``os.mkdir`` fails when another process created the directory first, so
+    concurrent saves each end up with their own version.
+    """
+    os.makedirs(os.path.join(registry_dir, _safe_name(name)), exist_ok=True)
+    version = max(_versions(name, registry_dir), default=0) + 1
+    while True:
+        try:
+            os.mkdir(_model_dir(name, version, registry_dir))
+            return version
+        except FileExistsError:
+            version += 1
+
+
+def save_model(model, name, features, target, hyperparameters=None, dataset_fingerprint=None, metrics=None,
+               check_rows=None, keep_versions=MAX_VERSIONS_PER_NAME, registry_dir=REGISTRY_DIR):
+    """Persist a fitted model as the next version of ``name`` and return its record.
+
+    ``check_rows`` are feature rows (in the order of ``features``) kept with
+    the model, see ``load_check_rows``. The metadata file is written last and
+    moved into place, so other processes never list a half-written model.
+    Afterwards only the newest ``keep_versions`` versions of ``name`` are kept.
+    """
+    version = _claim_version(name, registry_dir)
+    path = _model_dir(name, version, registry_dir)
+    metadata = {
+        "model_id": f"{_safe_name(name)}-v{version}",
+        "name": name,
+        "version": version,
+        "model_class": type(model).__name__,
+        "features": list(features),
+        "target": target,
+        "classes": [str(label) for label in getattr(model, "classes_", [])],
+        "hyperparameters": hyperparameters or {},
+        "dataset_fingerprint": dataset_fingerprint,
+        "metrics": metrics or {},
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+
+    try:
+        # Uncompressed, so the arrays can be memory-mapped back
+        joblib.dump(model, os.path.join(path, MODEL_FILE))
+        if check_rows is not None:
+            np.save(os.path.join(path, CHECK_ROWS_FILE), np.asarray(check_rows, dtype=np.float32))
+        tmp_metadata = os.path.join(path, f".{METADATA_FILE}.{uuid.uuid4().hex}")
+        with open(tmp_metadata, "w", encoding="utf-8") as handle:
+            json.dump(metadata, handle, indent=2, default=str)
+        os.replace(tmp_metadata, os.path.join(path, METADATA_FILE))
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    prune_versions(name, keep_versions, registry_dir)
+    return ModelRecord(metadata["model_id"], name, version, path, metadata)
+
+
+def prune_versions(name, keep=MAX_VERSIONS_PER_NAME, registry_dir=REGISTRY_DIR):
+    """Delete all but the newest ``keep`` saved versions of ``name``.
+
+    Versions still being written (without a metadata file) are left alone.
+    """
+    saved = [record for record in list_models(registry_dir=registry_dir) if record.name == name]
+    for record in sorted(saved, key=lambda record: record.version, reverse=True)[keep:]:
+        delete_model(record)
+
+
+def get_record(model_id, registry_dir=REGISTRY_DIR):
+    for record in list_models(registry_dir=registry_dir):
+        if record.model_id == model_id:
+            return record
+    raise KeyError(f"No saved model with id {model_id}")
+
+
+def load_model(record):
+    """Load the model of a record, memory-mapping its arrays; repeated loads are cached."""
+    model_path = os.path.join(record.path, MODEL_FILE)
+    key = (model_path, os.path.getmtime(model_path))
+    with _loaded_lock:
+        model = _loaded_models.get(key)
+        if model is not None:
+            _loaded_models.move_to_end(key)
+            return model
+
+    model = joblib.load(model_path, mmap_mode="r")
+    with _loaded_lock:
+        _loaded_models[key] = model
+        while len(_loaded_models) > MAX_LOADED_MODELS:
+            _loaded_models.popitem(last=False)
+    return model
+
+
+def load_check_rows(record):
+    """Feature rows saved with a model as a float32 array, or None for models saved without them."""
+    path = os.path.join(record.path, CHECK_ROWS_FILE)
+    if not os.path.isfile(path):
+        return None
+    return np.load(path)
+
+
+def delete_model(record):
+    with _loaded_lock:
+        for key in [key for key in _loaded_models if key[0].startswith(record.path + os.sep)]:
+            del _loaded_models[key]
+    shutil.rmtree(record.path, ignore_errors=True)
@@ -1,108 +1,157 @@
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.svm import SVC
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, f1_score, precision_score, recall_score
+import os
+import time
+import uuid
+from io import BytesIO
 import streamlit as st
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
-from imblearn.over_sampling import SMOTE
-
-
-class PredictionManager:
-    def __init__(self, df):
-        self.df = df
-        self.X_train = None
-        self.X_test = None
-        self.y_train = None
-        self.y_test = None
-
-    def prepare_data(self, target_column, features, test_size=0.2):
-        """Prepare data for training"""
-        X = self.df[features]
-        y = self.df[target_column]
-        smote = SMOTE(random_state=42)  # Handle class imbalance
-        X_resampled, y_resampled = smote.fit_resample(X, y)
-        from sklearn.model_selection import train_test_split
-        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
-            X_resampled, y_resampled, test_size=test_size, random_state=42, stratify=y_resampled
-        )
+from DataLoader import UPLOAD_TYPES, read_dataset, read_download, spool_csv_download
+from DatasetStore import dataset_version
+from FigureCache import show_figure
+from HyperparameterSearch import SEARCH_METHODS, SEARCH_METRIC, leaderboard, search_hyperparameters
+from ForestCompiler import COMPILED_MAX_ROWS, compile_for_inference
+from ModelEngine import (
+    PredictionManager, RANDOM_STATE, build_models, build_random_forest, cross_validate_models, train_model, score_in_chunks
+)
+from ModelRegistry import MAX_VERSIONS_PER_NAME, dataset_fingerprint, list_models, load_model, save_model
+from Resampling import IMBALANCE_STRATEGIES, make_resampler, strategy_class_weight, estimate_memory
 
 
 def predict_new_use_case(df):
     """Handle predictions and model evaluation"""
     st.subheader("Machine Learning Model Configuration and Testing")
-    pred_manager = PredictionManager(df)
+    pred_manager = PredictionManager(df, dataset_version())
 
     # Sidebar Configuration
     st.sidebar.write("### Model Configuration")
     test_size = st.sidebar.slider("Test Set Size", 0.1, 0.5, 0.2, step=0.1)
-    n_estimators = st.sidebar.slider("Number of Trees (Random Forest)", 50, 500, 100, step=50)
-    max_depth = st.sidebar.slider("Max Tree Depth (Random Forest)", 3, 20, 10, step=1)
+    # Defaults live in the session state, so "Use Best Settings" of the search can move the sliders
+    st.session_state.setdefault("rf_n_estimators", 100)
+    st.session_state.setdefault("rf_max_depth", 10)
+    n_estimators = st.sidebar.slider("Number of Trees (Random Forest)", 50, 500, step=50, key="rf_n_estimators")
+    max_depth = st.sidebar.slider("Max Tree Depth (Random Forest)", 3, 20, step=1, key="rf_max_depth")
+    cv_folds = st.sidebar.slider("Cross-Validation Folds (Compare Models)", 3, 10, 5, step=1)
+    imbalance_strategy = st.sidebar.selectbox(
+        "Class Imbalance Handling", IMBALANCE_STRATEGIES,
+        help="SMOTE oversamples the minority classes; the approximate variant searches neighbours among a sample "
+             "of points in chunks. Undersampling drops majority rows, class weights reweight them without copying data."
+    )
+    class_weight = strategy_class_weight(imbalance_strategy)
+    fast_inference = st.sidebar.checkbox(
+        "Fast Single-Row Inference", value=True,
+        help="Scores new cases with a flattened copy of the random forest, checked to give exactly the same probabilities."
+    )
 
     # Feature and Target Selection
-    numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns
+    numerical_columns = df.select_dtypes(include='number').columns
     target_column = st.selectbox("Select Target Column", df.columns, help="Target column to predict")
     features = st.multiselect("Select Feature Columns", [col for col in numerical_columns if col != target_column])
 
     if target_column and features:
-        pred_manager.prepare_data(target_column, features, test_size)
+        estimated_bytes = estimate_memory(df[target_column], len(features), imbalance_strategy)
+        st.info(f"Estimated memory for the training data with '{imbalance_strategy}': {estimated_bytes / 1024 ** 2:,.1f} MB")
+        pred_manager.prepare_data(target_column, features, test_size, strategy=imbalance_strategy)
 
         # Compare Models
         if st.button("Compare Models"):
-            models = {
-                "Random Forest": RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42),
-                "SVM": SVC(probability=True, random_state=42),
-                "Logistic Regression": LogisticRegression(random_state=42)
-            }
-            results = []
-            for model_name, model in models.items():
-                model.fit(pred_manager.X_train, pred_manager.y_train)
-                y_pred = model.predict(pred_manager.X_test)
-                results.append({
-                    "Model": model_name,
-                    "Accuracy": accuracy_score(pred_manager.y_test, y_pred),
-                    "F1 Score": f1_score(pred_manager.y_test, y_pred, average="weighted"),
-                    "Precision": precision_score(pred_manager.y_test, y_pred, average="weighted"),
-                    "Recall": recall_score(pred_manager.y_test, y_pred, average="weighted")
-                })
+            with st.spinner(f"Cross-validating models on {cv_folds} folds..."):
+                start = time.perf_counter()
+                results_df = cross_validate_models(
+                    df[features], df[target_column], build_models(n_estimators, max_depth, probability=False, class_weight=class_weight),
+                    n_splits=cv_folds, resampler=make_resampler(imbalance_strategy, RANDOM_STATE)
+                )
+                elapsed = time.perf_counter() - start
 
             # Display Model Comparison
-            results_df = pd.DataFrame(results)
             st.write("### Model Performance Comparison")
+            st.caption(f"Mean and standard deviation over {cv_folds} stratified folds; '{imbalance_strategy}' is applied to each training fold. "
+                       f"Total wall-clock time: {elapsed:.1f}s.")
             st.table(results_df)
 
             # Highlight Best Model
             best_model = results_df.loc[results_df['F1 Score'].idxmax()]
             st.success(f"The best model is {best_model['Model']} with F1 Score: {best_model['F1 Score']:.2f}")
 
+        hyperparameter_search(pred_manager, (dataset_version(), target_column, tuple(features), test_size, imbalance_strategy),
+                              class_weight)
+
         # Train Single Model
         if st.button("Train Model"):
             with st.spinner("Training Random Forest Model..."):
                 try:
-                    rf_model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42)
-                    rf_model.fit(pred_manager.X_train, pred_manager.y_train)
+                    # Continue from the last forest trained on this split when only the number of trees grew
+                    last_trained = st.session_state.get('last_trained_model')
+                    previous = None
+                    if last_trained is not None and pred_manager.split_key is not None and last_trained[0] == pred_manager.split_key:
+                        previous = last_trained[1]
+                    candidate = build_random_forest(n_estimators, max_depth, class_weight)
+                    start = time.perf_counter()
+                    rf_model, report, matrix, metrics = train_model(pred_manager, candidate, previous)
+                    elapsed = time.perf_counter() - start
                     st.session_state['trained_model'] = rf_model
+                    st.session_state['trained_model_features'] = list(features)
+                    st.session_state['last_trained_model'] = (pred_manager.split_key, rf_model)
+                    if rf_model is not candidate:
+                        st.caption(f"Reused {len(previous.estimators_)} fitted trees and fitted "
+                                   f"{n_estimators - len(previous.estimators_)} new ones in {elapsed:.1f}s.")
+
+                    # Persist the model so other sessions can reuse it instead of refitting
+                    record = save_model(
+                        rf_model,
+                        name=f"random_forest-{target_column}",
+                        features=features,
+                        target=target_column,
+                        hyperparameters={
+                            "n_estimators": n_estimators, "max_depth": max_depth, "imbalance_strategy": imbalance_strategy,
+                            "class_weight": class_weight, "test_size": test_size, "random_state": RANDOM_STATE
+                        },
+                        dataset_fingerprint=dataset_fingerprint(df, list(features) + [target_column]),
+                        metrics=metrics,
+                        check_rows=df[features].head(COMPILED_MAX_ROWS * 4).to_numpy(dtype=np.float32, na_value=np.nan)
+                    )
+                    st.success(f"Model saved to the registry as '{record.model_id}' "
+                               f"(the newest {MAX_VERSIONS_PER_NAME} versions per target are kept).")
 
                     # Evaluate Performance
-                    y_pred = rf_model.predict(pred_manager.X_test)
                     st.write("### Model Performance")
-                    st.code(classification_report(pred_manager.y_test, y_pred))
+                    st.code(report)
 
                     # Confusion Matrix
                     st.write("### Confusion Matrix")
-                    fig, ax = plt.subplots()
-                    sns.heatmap(confusion_matrix(pred_manager.y_test, y_pred), annot=True, fmt='d', cmap='Blues', ax=ax)
-                    st.pyplot(fig)
+                    show_figure(("confusion_matrix", matrix.shape, matrix.tobytes()),
+                                lambda ax: sns.heatmap(matrix, annot=True, fmt='d', cmap='Blues', ax=ax))
 
                 except Exception as e:
                     st.error(f"An error occurred: {e}")
 
+        # Reuse a saved model trained for the same target and features
+        saved_models = list_models(target=target_column, features=features)
+        if saved_models:
+            with st.expander(f"Saved Models ({len(saved_models)})"):
+                records = {record.model_id: record for record in saved_models}
+                selected_model_id = st.selectbox(
+                    "Select a saved model", list(records),
+                    format_func=lambda model_id: (
+                        f"{model_id} - F1 {records[model_id].metadata['metrics'].get('F1 Score', float('nan')):.3f} "
+                        f"- {records[model_id].metadata['created']}"
+                    )
+                )
+                selected_record = records[selected_model_id]
+                st.json({key: selected_record.metadata[key] for key in ("hyperparameters", "metrics", "dataset_fingerprint")})
+                if st.button("Use Saved Model"):
+                    st.session_state['trained_model'] = load_model(selected_record)
+                    st.session_state['trained_model_features'] = selected_record.metadata["features"]
+                    st.success(f"Loaded '{selected_model_id}' without retraining.")
+                    if selected_record.metadata["dataset_fingerprint"] != dataset_fingerprint(df, list(features) + [target_column]):
+                        st.warning("This model was trained on a different version of the data.")
+
         # Make Predictions
         if "trained_model" in st.session_state:
             st.write("### Make Predictions on New Data")
+            model_features = st.session_state.get('trained_model_features', features)
             new_data = {}
-            for feature in features:
+            for feature in model_features:
                 new_data[feature] = st.number_input(f"Enter value for {feature}", value=float(df[feature].mean()))
             if st.button("Predict"):
                 # try:
@@ -111,25 +160,27 @@ def predict_new_use_case(df):
                 #     st.success(f"The prediction for {target_column} is: {prediction[0]}")
                 
                 try:
-                    # Prepare input data
-                    input_data = pd.DataFrame([new_data])
-                    
-                    # Make prediction
-                    prediction = st.session_state['trained_model'].predict(input_data)
+                    # Prepare input data in the float32 layout the model was trained on
+                    input_data = pd.DataFrame([new_data])[model_features].to_numpy(dtype=np.float32)
                     
+                    # One predict_proba pass gives both the class and its probabilities
+                    model = st.session_state['trained_model']
+                    if fast_inference:
+                        model = inference_model(model, df[model_features].head(COMPILED_MAX_ROWS * 4))
+                    proba = model.predict_proba(input_data)
+                    predicted_class = model.classes_[proba.argmax(axis=1)][0]
+
                     # Show prediction
-                    st.success(f"Predicted {target_column}: {prediction[0]}")
-                    
+                    st.success(f"Predicted {target_column}: {predicted_class}")
+
                     # Show prediction probability
-                    proba = st.session_state['trained_model'].predict_proba(input_data)
                     st.write("### Prediction Probabilities")
                     proba_df = pd.DataFrame(
                         proba,
-                        columns=st.session_state['trained_model'].classes_
+                        columns=model.classes_
                     )
                     #st.dataframe(proba_df)
                     # Display message based on predicted class
-                    predicted_class = st.session_state['trained_model'].predict(input_data)[0]  # Get the predicted class
 
                     if predicted_class == 0:
                         st.write("😢 **Unfortunately, the prediction indicates a negative outcome. Stay strong!**")
@@ -140,3 +191,106 @@ def predict_new_use_case(df):
                     
                 except Exception as e:
                     st.error(f"Error making prediction: {str(e)}")
+
+            batch_prediction(st.session_state['trained_model'], model_features)
+
+
+def _use_search_result(params):
+    # Runs as a button callback, before the sliders are drawn again
+    st.session_state["rf_n_estimators"] = params["n_estimators"]
+    st.session_state["rf_max_depth"] = params["max_depth"]
+
+
+def hyperparameter_search(pred_manager, search_key, class_weight):
+    """Search random forest settings in parallel, showing the leaderboard while trials finish"""
+    with st.expander("Hyperparameter Search"):
+        method = st.selectbox(
+            "Search Method", SEARCH_METHODS,
+            help="Successive halving tries many settings on a few rows and gives more rows only to the best ones; "
+                 "random search fits every setting on all rows."
+        )
+        n_candidates = st.slider("Candidate Settings", 3, 81, 27)
+        time_budget = st.slider("Time Budget (seconds)", 10, 600, 120, step=10)
+
+        if st.button("Run Search"):
+            placeholder = st.empty()
+            trials = []
+            start = time.perf_counter()
+            with st.spinner("Searching..."):
+                for trial in search_hyperparameters(pred_manager, method, n_candidates, time_budget, class_weight=class_weight):
+                    trials.append(trial)
+                    placeholder.dataframe(leaderboard(trials), hide_index=True)
+            elapsed = time.perf_counter() - start
+            placeholder.empty()
+            st.session_state["hyperparameter_search"] = (search_key, leaderboard(trials), len(trials), elapsed)
+
+        search_result = st.session_state.get("hyperparameter_search")
+        if search_result is not None and search_result[0] == search_key:
+            _, board, n_trials, elapsed = search_result
+            st.caption(f"{n_trials} trials in {elapsed:.1f}s, ranked by validation {SEARCH_METRIC} on data held out from the training split.")
+            st.dataframe(board, hide_index=True)
+            if not board.empty:
+                best = {"n_estimators": int(board.loc[0, "n_estimators"]), "max_depth": int(board.loc[0, "max_depth"])}
+                st.success(f"Best settings: {best['n_estimators']} trees, max depth {best['max_depth']} "
+                           f"({SEARCH_METRIC} {board.loc[0, SEARCH_METRIC]:.3f})")
+                st.button("Use Best Settings", on_click=_use_search_result, args=(best,))
+
+
+def inference_model(model, check_data):
+    """The trained model compiled for fast inference, when it is a forest that compiles exactly"""
+    compiled = st.session_state.get('compiled_model')
+    if compiled is None or compiled[0] is not model:
+        compiled = (model, compile_for_inference(model, check_data.to_numpy(dtype=np.float32)))
+        st.session_state['compiled_model'] = compiled
+    return compiled[1]
+
+
+def batch_prediction(model, model_features):
+    """Score an uploaded file of new cases in chunks and offer the results for download"""
+    st.write("### Batch Predictions")
+    batch_file = st.file_uploader("Upload new cases to score", type=UPLOAD_TYPES, key="batch_prediction_file")
+    if batch_file is None:
+        return
+
+    if st.button("Score File"):
+        # The file is only parsed when it is scored, not on every rerun
+        new_cases = read_dataset(BytesIO(batch_file.getvalue()), batch_file.name)
+        missing_features = [feature for feature in model_features if feature not in new_cases.columns]
+        if missing_features:
+            st.error(f"The file is missing the model features: {', '.join(missing_features)}")
+            return
+
+        progress = st.progress(0.0, text="Scoring...")
+        preview = []
+        scored_rows = 0
+
+        def scored_chunks():
+            nonlocal scored_rows
+            for scored in score_in_chunks(model, new_cases, model_features):
+                if not preview:
+                    preview.append(scored.head(20))
+                scored_rows += len(scored)
+                progress.progress(scored_rows / len(new_cases), text=f"Scored {scored_rows:,} of {len(new_cases):,} rows")
+                yield scored
+
+        start = time.perf_counter()
+        # Each chunk is appended to a CSV file in the download cache as soon as it is scored
+        path = spool_csv_download(scored_chunks(), f"predictions-{uuid.uuid4().hex}")
+        elapsed = time.perf_counter() - start
+
+        st.session_state["batch_predictions"] = (batch_file.file_id, path, preview[0] if preview else None, scored_rows, elapsed)
+
+    batch_predictions = st.session_state.get("batch_predictions")
+    if batch_predictions is not None and batch_predictions[0] == batch_file.file_id:
+        _, path, preview, scored_rows, elapsed = batch_predictions
+        if not os.path.exists(path):
+            st.info("The scored file is no longer cached; score the file again to download it.")
+            return
+        st.success(f"Scored {scored_rows:,} rows in {elapsed:.2f}s ({scored_rows / max(elapsed, 1e-9):,.0f} rows/sec).")
+        st.dataframe(preview)
+        st.download_button(
+            label="Download Predictions",
+            data=lambda: read_download(path),
+            file_name=f"{batch_file.name.rsplit('.', 1)[0]}_predictions.csv",
+            mime="text/csv"
+        )
@@ -0,0 +1,136 @@
+"""Class-imbalance strategies for model training, independent of the UI.
+
+A strategy either resamples the training data (``make_resampler``) or leaves
+it untouched and weights the classes inside the estimators
+(``strategy_class_weight``). ``estimate_memory`` gives the size of the
+training data a strategy produces, so it can be shown before anything runs.
+"""
+import numpy as np
+import pandas as pd
+from imblearn.over_sampling import SMOTE
+from imblearn.under_sampling import RandomUnderSampler
+from scipy import sparse
+from sklearn.base import BaseEstimator
+from sklearn.neighbors import NearestNeighbors
+
+IMBALANCE_STRATEGIES = [
+    "SMOTE",
+    "SMOTE (approximate neighbors)",
+    "Random undersampling",
+    "Class weights",
+    "None",
+]
+
+# SMOTE interpolates towards one of this many nearest neighbours of a sample.
+SMOTE_K_NEIGHBORS = 5
+
+# Approximate neighbour search: candidate points sampled per class and queries
+# processed per chunk.
+APPROX_MAX_CANDIDATES = 20_000
+APPROX_CHUNK_ROWS = 10_000
+
+FLOAT32_BYTES = 4
+
+
+class ApproximateNeighbors(BaseEstimator):
+    """Chunked k-NN over a random subset of the fitted points.
+
+    Looks like a scikit-learn neighbours estimator to SMOTE. Neighbours are only
+    searched among at most ``max_candidates`` sampled points, and queries run
+    ``chunk_size`` rows at a time, so the cost grows linearly with the number of
+    samples instead of quadratically. When the fitted points themselves are
+    queried (as SMOTE does), every point is returned as its own first
+    neighbour, matching exact search.
+    """
+
+    def __init__(self, n_neighbors=SMOTE_K_NEIGHBORS + 1, max_candidates=APPROX_MAX_CANDIDATES,
+                 chunk_size=APPROX_CHUNK_ROWS, random_state=None):
+        self.n_neighbors = n_neighbors
+        self.max_candidates = max_candidates
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+    def fit(self, X, y=None):
+        self._fit_input = X
+        self._fit_X = np.asarray(X, dtype=np.float32)
+        n_samples = len(self._fit_X)
+        rng = np.random.default_rng(self.random_state)
+        if n_samples > self.max_candidates:
+            self.candidate_index_ = np.sort(rng.choice(n_samples, size=self.max_candidates, replace=False))
+        else:
+            self.candidate_index_ = np.arange(n_samples)
+        self.nn_ = NearestNeighbors(n_neighbors=min(self.n_neighbors, len(self.candidate_index_)))
+        self.nn_.fit(self._fit_X[self.candidate_index_])
+        return self
+
+    def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+        n_neighbors = n_neighbors or self.n_neighbors
+        self_query = X is None or X is self._fit_input
+        queries = self._fit_X if self_query else np.asarray(X, dtype=np.float32)
+        n_search = min(n_neighbors, len(self.candidate_index_))
+
+        all_distances, all_indices = [], []
+        for start in range(0, len(queries), self.chunk_size):
+            chunk = queries[start:start + self.chunk_size]
+            distances, positions = self.nn_.kneighbors(chunk, n_neighbors=n_search)
+            indices = self.candidate_index_[positions]
+            if self_query:
+                # Put each point first, followed by its nearest other candidates
+                own = np.arange(start, start + len(chunk))
+                order = np.argsort(indices == own[:, None], axis=1, kind="stable")
+                indices = np.take_along_axis(indices, order, axis=1)[:, :n_neighbors - 1]
+                distances = np.take_along_axis(distances, order, axis=1)[:, :n_neighbors - 1]
+                indices = np.hstack([own[:, None], indices])
+                distances = np.hstack([np.zeros((len(chunk), 1)), distances])
+            all_distances.append(distances)
+            all_indices.append(indices)
+
+        indices = np.vstack(all_indices)
+        if return_distance:
+            return np.vstack(all_distances), indices
+        return indices
+
+    def kneighbors_graph(self, X=None, n_neighbors=None, mode="connectivity"):
+        distances, indices = self.kneighbors(X, n_neighbors)
+        n_queries, n_columns = indices.shape
+        values = distances.ravel() if mode == "distance" else np.ones(indices.size)
+        indptr = np.arange(0, n_queries * n_columns + 1, n_columns)
+        return sparse.csr_matrix((values, indices.ravel(), indptr), shape=(n_queries, len(self._fit_X)))
+
+
+def make_resampler(strategy, random_state=None):
+    """The imblearn sampler of a strategy, or ``None`` when the data is used as is."""
+    if strategy == "SMOTE":
+        return SMOTE(k_neighbors=SMOTE_K_NEIGHBORS, random_state=random_state)
+    if strategy == "SMOTE (approximate neighbors)":
+        return SMOTE(k_neighbors=ApproximateNeighbors(random_state=random_state), random_state=random_state)
+    if strategy == "Random undersampling":
+        return RandomUnderSampler(random_state=random_state)
+    if strategy in ("Class weights", "None"):
+        return None
+    raise ValueError(f"Unknown imbalance strategy: {strategy}")
+
+
+def strategy_class_weight(strategy):
+    """``class_weight`` to pass to the estimators for a strategy."""
+    return "balanced" if strategy == "Class weights" else None
+
+
+def estimate_memory(y, n_features, strategy):
+    """Estimated bytes of the float32 training data a strategy produces from ``y``.
+
+    Oversampling grows every class to the size of the largest one, on top of
+    the float32 copy of the input; undersampling shrinks every class to the
+    smallest one; the other strategies only need the input copy.
+    """
+    class_counts = pd.Series(y).value_counts()
+    n_rows = int(class_counts.sum())
+    input_bytes = n_rows * n_features * FLOAT32_BYTES
+    if strategy.startswith("SMOTE"):
+        output_rows = int(class_counts.max()) * len(class_counts)
+        neighbor_bytes = int(class_counts.sum() - class_counts.max()) * (SMOTE_K_NEIGHBORS + 1) * 8
+        return input_bytes + output_rows * n_features * FLOAT32_BYTES + neighbor_bytes
+    if strategy == "Random undersampling":
+        output_rows = int(class_counts.min()) * len(class_counts)
+        return input_bytes + output_rows * n_features * FLOAT32_BYTES
+    return input_bytes
@@ -0,0 +1,275 @@
+"""Small mergeable summaries of large columns, independent of the UI.
+
+``TDigest`` is a merging t-digest: values are kept as at most about
+``compression`` weighted centroids, small at both tails and larger around the
+median, so quantiles are estimated in bounded memory with the best accuracy
+where outlier bounds need it. Digests are fed in chunks and can be merged, so
+they also work on files read piece by piece.
+
+``HyperLogLog`` estimates distinct counts from the hashes of the values and
+``TopK`` keeps the most frequent values. ``profile_column`` feeds a column to
+all of them, plus counts, moments and memory, in one pass over its chunks.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+# Centroids kept per digest; more centroids give more accurate quantiles.
+TDIGEST_COMPRESSION = 200
+# Values added to a digest per merge step.
+TDIGEST_CHUNK_ROWS = 1_000_000
+# log2 of the HyperLogLog registers; 2**14 registers give about 0.8% error.
+HLL_PRECISION = 14
+# Distinct values a TopK keeps counts for.
+TOPK_CAPACITY = 1_000
+# Rows profiled per step of profile_column.
+PROFILE_CHUNK_ROWS = 1_000_000
+# Up to this many rows the quartiles of a profile are exact instead of estimated.
+EXACT_QUANTILE_ROWS = 100_000
+
+
+class TDigest:
+    """Mergeable quantile sketch using the arcsine scale function."""
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def from_values(cls, values, compression=TDIGEST_COMPRESSION, chunk_rows=TDIGEST_CHUNK_ROWS):
+        digest = cls(compression)
+        values = np.asarray(values, dtype=np.float64)
+        for start in range(0, len(values), chunk_rows):
+            digest.update(values[start:start + chunk_rows])
+        return digest
+
+    def update(self, values):
+        """Add the non-missing ``values``."""
+        values = np.asarray(values, dtype=np.float64)
+        values = np.sort(values[~np.isnan(values)])
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.min = min(self.min, values[0])
+        self.max = max(self.max, values[-1])
+        # Slot the few existing centroids into the sorted chunk instead of sorting both
+        positions = np.searchsorted(values, self.means, side="right")
+        self._compress(np.insert(values, positions, self.means), np.insert(np.ones(len(values)), positions, self.weights))
+        return self
+
+    def merge(self, other):
+        """Add the centroids of another digest."""
+        if other.count:
+            self.count += other.count
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            means = np.concatenate([self.means, other.means])
+            order = np.argsort(means, kind="stable")
+            self._compress(means[order], np.concatenate([self.weights, other.weights])[order])
+        return self
+
+    def _compress(self, means, weights):
+        # Centroids whose middle quantile falls into the same unit of the
+        # scale function k(q) = compression * (asin(2q - 1) / pi + 1/2) are
+        # merged; the quantiles where k steps up are found by binary search
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        steps = (np.sin(np.pi * (np.arange(1, self.compression + 1) / self.compression - 0.5)) + 1) / 2
+        starts = np.unique(np.r_[0, np.searchsorted(q, steps)])
+        starts = starts[starts < len(means)]
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        """Estimated quantile(s) ``q`` (between 0 and 1); NaN for an empty digest."""
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        cumulative = np.cumsum(self.weights)
+        positions = np.r_[0.0, (cumulative - self.weights / 2) / cumulative[-1], 1.0]
+        return np.interp(q, positions, np.r_[self.min, self.means, self.max])
+
+
+class HyperLogLog:
+    """Distinct count estimate from the largest run of leading zero bits per register."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        if not 11 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 11 and 18.")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        """Add ``values`` (any array pandas can hash); repeated values do not change the estimate."""
+        return self.update_hashes(pd.util.hash_array(np.asarray(values)))
+
+    def update_hashes(self, hashes):
+        """Add 64-bit hashes: the first bits pick the register, the rest give the rank."""
+        suffix_bits = 64 - self.precision
+        registers = (hashes >> np.uint64(suffix_bits)).astype(np.intp)
+        # Suffixes have at most 53 bits, so their float conversion is exact and
+        # the float exponent is their bit length
+        suffixes = (hashes & np.uint64((1 << suffix_bits) - 1)).astype(np.float64)
+        ranks = suffix_bits + 1 - np.frexp(suffixes)[1]
+        np.maximum.at(self.registers, registers, ranks.astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        empty = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and empty:
+            # Linear counting is more accurate for small counts
+            estimate = m * np.log(m / empty)
+        return float(estimate)
+
+
+class TopK:
+    """Counts of the most frequent values.
+
+    Counts stay exact while at most ``capacity`` distinct values have been
+    seen; after that the rarest values are dropped and ``error`` bounds how
+    much any kept count may be too low.
+    """
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.error = 0
+
+    @property
+    def truncated(self):
+        return self.error > 0
+
+    def update(self, counts):
+        """Add value counts (a Series of counts indexed by value)."""
+        if len(self.counts):
+            counts = pd.concat([self.counts, counts]).groupby(level=0, sort=False).sum()
+        counts = counts.sort_values(ascending=False, kind="stable")
+        if len(counts) > self.capacity:
+            self.error = max(self.error, int(counts.iloc[self.capacity]))
+            counts = counts.iloc[:self.capacity]
+        self.counts = counts
+        return self
+
+    def merge(self, other):
+        self.update(other.counts)
+        self.error = max(self.error, other.error)
+        return self
+
+    def top(self, k=10):
+        return self.counts.head(k)
+
+
+def _object_memory(chunk, counts):
+    """``memory_usage(deep=True)`` of an object Series, with the sizes taken from its distinct values.
+
+    Equal values have equal sizes, so only the distinct values and the
+    missing ones are measured instead of every element.
+    """
+    sizes = np.fromiter(map(sys.getsizeof, counts.index), dtype=np.int64, count=len(counts))
+    missing = chunk[chunk.isna()]
+    return int(chunk.memory_usage(index=False) + sizes @ counts.to_numpy(dtype=np.int64)
+               + missing.memory_usage(deep=True, index=False) - missing.memory_usage(index=False))
+
+
+class ColumnProfile:
+    """Streaming summary of one column: counts, moments, min/max, quantiles, distinct and frequent values.
+
+    Numeric columns get moments, extremes and a ``TDigest``; other columns get
+    a ``TopK``. Every column gets a ``HyperLogLog``.
+    """
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.numeric = is_numeric_dtype(dtype) and not is_bool_dtype(dtype)
+        self.rows = 0
+        self.count = 0
+        self.memory_bytes = 0
+        self.mean = np.nan
+        self._m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.digest = TDigest() if self.numeric else None
+        self.top_values = None if self.numeric else TopK()
+        self.distinct = HyperLogLog()
+        self.exact_quartiles = None
+
+    @property
+    def nulls(self):
+        return self.rows - self.count
+
+    @property
+    def var(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @property
+    def n_distinct(self):
+        """Exact while the top values were never truncated, estimated otherwise."""
+        if self.top_values is not None and not self.top_values.truncated:
+            return len(self.top_values.counts)
+        return min(int(round(self.distinct.estimate())), self.count)
+
+    def quartiles(self):
+        if self.exact_quartiles is not None:
+            return self.exact_quartiles
+        return self.digest.quantile([0.25, 0.5, 0.75])
+
+    def update(self, chunk):
+        """Add a chunk of the column (a Series)."""
+        self.rows += len(chunk)
+        if self.numeric or chunk.dtype != object:
+            self.memory_bytes += int(chunk.memory_usage(deep=True, index=False))
+        if self.numeric:
+            values = chunk.to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            if len(values):
+                self._add_moments(values)
+                self.digest.update(values)
+                self.distinct.update_hashes(pd.util.hash_array(values))
+            self.count += len(values)
+        else:
+            # Distinct values of the chunk feed both sketches, so every value is hashed once
+            counts = chunk.value_counts(sort=False)
+            counts = counts[counts > 0]
+            self.top_values.update(counts)
+            if chunk.dtype == object:
+                self.memory_bytes += _object_memory(chunk, counts)
+            self.distinct.update(counts.index.to_numpy())
+            self.count += int(counts.sum())
+        return self
+
+    def _add_moments(self, values):
+        # Chan et al.'s pairwise update of the mean and the sum of squared deviations
+        n, chunk_n = self.count, len(values)
+        chunk_mean = values.mean()
+        chunk_m2 = np.square(values - chunk_mean).sum()
+        total = n + chunk_n
+        delta = chunk_mean - (self.mean if n else 0.0)
+        self.mean = chunk_mean if n == 0 else self.mean + delta * chunk_n / total
+        self._m2 += chunk_m2 + delta * delta * n * chunk_n / total
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+
+
+def profile_column(series, chunk_rows=PROFILE_CHUNK_ROWS, exact_rows=EXACT_QUANTILE_ROWS):
+    """``ColumnProfile`` of a Series, built in one pass over chunks of ``chunk_rows`` rows."""
+    profile = ColumnProfile(series.dtype)
+    for start in range(0, len(series), chunk_rows):
+        profile.update(series.iloc[start:start + chunk_rows])
+    if profile.numeric and len(series) <= exact_rows:
+        profile.exact_quartiles = series.quantile([0.25, 0.5, 0.75]).to_numpy(dtype=np.float64)
+    return profile